@@ -1,2 +1,4 @@
 """ ___init___ """
 __VERSION__ = '0.3.4'
+
+default_app_config = 'djangosnapshotpublisher.apps.DjangoSnapshotPublisherConfig'
@@ -2,10 +2,107 @@
 .. module:: djangosnapshotpublisher.admin
    :synopsis: djangosnapshotpublisher custom django admin
 """
+from django.conf import settings
 from django.contrib import admin
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+from django.utils.translation import gettext_lazy as _
 
+from . import jobs
 from .models import (ContentRelease, ContentReleaseExtraParameter, ReleaseDocument,
-                     ReleaseDocumentExtraParameter)
+                     ReleaseDocumentExtraParameter, ReleaseJob, RELEASE_JOB_ACTIONS)
+
+
+FACET_CACHE_KEY = 'djangosnapshotpublisher:admin:{}'
+
+
+class EstimatedCountPaginator(Paginator):
+    """ EstimatedCountPaginator, use the PostgreSQL table statistics for an unfiltered list """
+
+    @cached_property
+    def count(self):
+        """ count """
+        query = self.object_list.query
+        connection = connections[self.object_list.db]
+        if connection.vendor == 'postgresql' and not query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [self.object_list.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            threshold = getattr(
+                settings, 'SNAPSHOTPUBLISHER_ADMIN_ESTIMATED_COUNT_THRESHOLD', 100000)
+            if row and row[0] >= threshold:
+                return int(row[0])
+        return super(EstimatedCountPaginator, self).count
+
+
+class CachedContentTypeFilter(admin.SimpleListFilter):
+    """ CachedContentTypeFilter, the content types are cached instead of computed each time """
+    title = _('content type')
+    parameter_name = 'content_type'
+
+    def lookups(self, request, model_admin):
+        """ lookups """
+        key = FACET_CACHE_KEY.format('content_types')
+        content_types = cache.get(key)
+        if content_types is None:
+            content_types = list(ReleaseDocument.objects.order_by('content_type').values_list(
+                'content_type', flat=True).distinct())
+            cache.set(key, content_types, getattr(
+                settings, 'SNAPSHOTPUBLISHER_ADMIN_FACET_TIMEOUT', 300))
+        return [(content_type, content_type) for content_type in content_types]
+
+    def queryset(self, request, queryset):
+        """ queryset """
+        if self.value():
+            return queryset.filter(content_type=self.value())
+        return queryset
+
+
+class ContentReleaseFilter(admin.SimpleListFilter):
+    """ ContentReleaseFilter, a text input suggesting the last releases instead of a list
+    of all the releases """
+    title = _('content release')
+    parameter_name = 'content_release'
+    template = 'admin/djangosnapshotpublisher/input_filter.html'
+    suggestions_count = 100
+
+    def has_output(self):
+        """ has_output """
+        return True
+
+    def lookups(self, request, model_admin):
+        """ lookups """
+        return []
+
+    def choices(self, changelist):
+        """ the current value and the suggestions for the template """
+        yield {
+            'value': self.value() or '',
+            'parameter_name': self.parameter_name,
+            'query_parameters': [
+                (key, value) for key, value in changelist.get_filters_params().items()
+                if key != self.parameter_name
+            ],
+            'suggestions': ContentRelease.objects.order_by('-id').values_list(
+                'uuid', 'site_code', 'title', 'version')[:self.suggestions_count],
+        }
+
+    def queryset(self, request, queryset):
+        """ queryset """
+        if self.value():
+            try:
+                return queryset.filter(content_releases__uuid=self.value())
+            except ValidationError:
+                return queryset.none()
+        return queryset
 
 
 class ContentReleaseExtraParameterInline(admin.TabularInline):
@@ -13,12 +110,38 @@ class ContentReleaseExtraParameterInline(admin.TabularInline):
     model = ContentReleaseExtraParameter
 
 
+def make_job_action(action, description):
+    """ admin action enqueuing a ReleaseJob for each selected ContentRelease """
+    def enqueue_jobs(modeladmin, request, queryset):
+        """ enqueue_jobs """
+        count = 0
+        for site_code, release_uuid in queryset.values_list('site_code', 'uuid'):
+            jobs.enqueue(action, site_code, release_uuid, created_by=request.user.get_username())
+            count += 1
+        modeladmin.message_user(request, format_html(
+            '{} job(s) enqueued, see the <a href="{}">release jobs</a>',
+            count,
+            reverse('admin:djangosnapshotpublisher_releasejob_changelist'),
+        ))
+    enqueue_jobs.__name__ = 'enqueue_{}_jobs'.format(action)
+    enqueue_jobs.short_description = _('{} in the background').format(description)
+    return enqueue_jobs
+
+
 class ContentReleaseAdmin(admin.ModelAdmin):
     """ ContentReleaseAdmin """
     ordering = ['title']
     list_display = ('title', 'version', 'site_code', 'uuid', 'base_release', )
     list_filter = ('site_code', )
+    list_select_related = ('base_release', )
+    search_fields = ('title', 'version', '=uuid', )
     readonly_fields = ['base_release']
+    autocomplete_fields = ['base_release']
+    raw_id_fields = ['release_documents']
+    show_full_result_count = False
+    actions = [
+        make_job_action(action, description) for action, description in RELEASE_JOB_ACTIONS
+    ]
     inlines = [
         ContentReleaseExtraParameterInline,
     ]
@@ -41,10 +164,63 @@ class ReleaseDocumentAdmin(admin.ModelAdmin):
     """ ReleaseDocumentAdmin """
     ordering = ['content_type', 'document_key']
     list_display = ('content_type', 'document_key', )
-    list_filter = ('content_type', 'document_key', 'content_releases', )
+    list_filter = (CachedContentTypeFilter, ContentReleaseFilter, )
+    search_fields = ('=document_key', )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     inlines = [
         ReleaseDocumentExtraParameterInline,
     ]
 
+    def get_queryset(self, request):
+        """ the documents are not needed in the list """
+        queryset = super(ReleaseDocumentAdmin, self).get_queryset(request)
+        if request.resolver_match and request.resolver_match.url_name.endswith('_changelist'):
+            queryset = queryset.defer('document_json', 'document_delta')
+        return queryset
+
 
 admin.site.register(ReleaseDocument, ReleaseDocumentAdmin)
+
+
+class ReleaseJobAdmin(admin.ModelAdmin):
+    """ ReleaseJobAdmin, the progress and the results of the jobs """
+    ordering = ['-id']
+    list_display = ('id', 'action', 'site_code', 'release_uuid', 'status', 'progress',
+                    'created_by', 'created_datetime', 'finished_datetime', )
+    list_filter = ('status', 'action', 'site_code', )
+    search_fields = ('=release_uuid', )
+    fields = ('action', 'site_code', 'release_uuid', 'arguments', 'status', 'progress',
+              'created_by', 'created_datetime', 'started_datetime', 'heartbeat_datetime',
+              'finished_datetime',
+              'formatted_result', 'formatted_error', )
+    readonly_fields = fields
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        """ the results are not needed in the list """
+        queryset = super(ReleaseJobAdmin, self).get_queryset(request)
+        if request.resolver_match and request.resolver_match.url_name.endswith('_changelist'):
+            queryset = queryset.defer('result', 'error')
+        return queryset
+
+    def has_add_permission(self, request):
+        """ the jobs are added by the ContentRelease actions """
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        """ has_change_permission """
+        return False
+
+    def formatted_result(self, obj):
+        """ formatted_result """
+        return format_html('<pre>{}</pre>', obj.result or '')
+    formatted_result.short_description = _('result')
+
+    def formatted_error(self, obj):
+        """ formatted_error """
+        return format_html('<pre>{}</pre>', obj.error or '')
+    formatted_error.short_description = _('error')
+
+
+admin.site.register(ReleaseJob, ReleaseJobAdmin)
@@ -0,0 +1,16 @@
+"""
+.. module:: djangosnapshotpublisher.apps
+"""
+
+from django.apps import AppConfig
+
+
+class DjangoSnapshotPublisherConfig(AppConfig):
+    """ DjangoSnapshotPublisherConfig """
+    name = 'djangosnapshotpublisher'
+
+    def ready(self):
+        """ connect the signal receivers """
+        # pylint: disable=import-outside-toplevel, unused-import
+        from . import (changefeed, compare_cache, document_cache, identity_map, invalidation,
+                       partitioning, static_tree)
@@ -0,0 +1,47 @@
+"""
+.. module:: djangosnapshotpublisher.backfill
+   :synopsis: set the document_hash and document_size of the documents published before
+              they were stored
+"""
+
+import time
+
+from django.db.models import Q
+
+from .delta import set_document_hash_and_size
+from .models import ReleaseDocument
+
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_document_hash_and_size(batch_size=BACKFILL_BATCH_SIZE, sleep=0):
+    """ set the document_hash and document_size of the documents without them, by batches with
+    one UPDATE per batch, a document which JSON can't be read (eg: a missing cold storage
+    bundle) keeps None, return the number of updated documents """
+    count = 0
+    last_id = 0
+    while True:
+        release_documents = list(ReleaseDocument.objects.filter(
+            Q(document_hash__isnull=True) | Q(document_size__isnull=True),
+            id__gt=last_id,
+            deleted=False,
+        ).order_by('id')[:batch_size])
+        if not release_documents:
+            return count
+        last_id = release_documents[-1].id
+        updated_release_documents = []
+        for release_document in release_documents:
+            try:
+                document_json = release_document.get_document_json()
+            except (KeyError, OSError, ValueError):
+                continue
+            if document_json is None:
+                continue
+            set_document_hash_and_size(release_document, document_json)
+            updated_release_documents.append(release_document)
+        ReleaseDocument.objects.bulk_update(
+            updated_release_documents, ['document_hash', 'document_size'])
+        count += len(updated_release_documents)
+        if sleep:
+            time.sleep(sleep)
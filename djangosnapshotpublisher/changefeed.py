@@ -0,0 +1,120 @@
+"""
+.. module:: djangosnapshotpublisher.changefeed
+   :synopsis: append-only feed of the ContentRelease and ReleaseDocument changes
+"""
+
+from django.db import connections, router, transaction
+from django.dispatch import receiver
+
+from .models import ReleaseChangeEvent
+from .signals import content_release_changed, content_release_live
+
+
+RELEASE_ADDED = 'release_added'
+RELEASE_COPIED = 'release_copied'
+RELEASE_UPDATED = 'release_updated'
+RELEASE_PARAMETERS_UPDATED = 'release_parameters_updated'
+RELEASE_REMOVED = 'release_removed'
+RELEASE_STAGED = 'release_staged'
+RELEASE_UNSTAGED = 'release_unstaged'
+RELEASE_LIVE = 'release_live'
+RELEASE_ARCHIVED = 'release_archived'
+RELEASE_DOCUMENTS_INGESTED = 'release_documents_ingested'
+DOCUMENT_PUBLISHED = 'document_published'
+DOCUMENT_UNPUBLISHED = 'document_unpublished'
+DOCUMENT_DELETED = 'document_deleted'
+
+# first key of the PostgreSQL advisory locks taken by the transactions recording changes, the
+# second one is the hash of the site_code
+CHANGES_LOCK_KEY = 7310979
+
+
+def lock_changes(connection, site_codes):
+    """ serialize the transactions recording changes of the same site until their commit
+    (PostgreSQL), so a change of a site can't commit after a change of this site with a higher
+    seq, the sites are locked in order, SQLite already serializes the writes """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            for site_code in sorted(set(site_codes)):
+                cursor.execute('SELECT pg_advisory_xact_lock(%s, hashtext(%s))',
+                               [CHANGES_LOCK_KEY, site_code])
+
+
+def record_changes(changes):
+    """ record a list of dict (site_code, release_uuid, action, content_type, document_key) """
+    using = router.db_for_write(ReleaseChangeEvent)
+    with transaction.atomic(using=using, savepoint=False):
+        lock_changes(connections[using], [change['site_code'] for change in changes])
+        ReleaseChangeEvent.objects.bulk_create(
+            [ReleaseChangeEvent(**change) for change in changes],
+            batch_size=1000,
+        )
+    content_release_changed.send(sender=ReleaseChangeEvent, changes=changes)
+
+
+def record_change(site_code, release_uuid, action, document_key=None, content_type=None):
+    """ record_change """
+    record_changes([{
+        'site_code': site_code,
+        'release_uuid': release_uuid,
+        'action': action,
+        'document_key': document_key,
+        'content_type': content_type,
+    }])
+
+
+def get_changes_since(seq=0, limit=100, site_code=None):
+    """ the changes after seq, ordered by seq """
+    changes = ReleaseChangeEvent.objects.filter(seq__gt=seq)
+    if site_code:
+        changes = changes.filter(site_code=site_code)
+    return changes.order_by('seq')[:limit]
+
+
+def get_last_seq():
+    """ seq of the last change, 0 if there is none """
+    last_change = ReleaseChangeEvent.objects.order_by('seq').only('seq').last()
+    return last_change.seq if last_change else 0
+
+
+def count_changes(release_uuids, seq):
+    """ number of changes of the releases up to seq, it changes if a change with a lower seq
+    is committed later """
+    return ReleaseChangeEvent.objects.filter(
+        release_uuid__in=release_uuids,
+        seq__lte=seq,
+    ).count()
+
+
+def get_changed_documents(release_uuids, seq):
+    """ the (content_type, document_key) changed in the releases after seq, None if the
+    documents of one of the releases were replaced (staged, unstaged, removed or ingested) """
+    changed_documents = set()
+    for action, content_type, document_key in ReleaseChangeEvent.objects.filter(
+            release_uuid__in=release_uuids,
+            seq__gt=seq,
+    ).values_list('action', 'content_type', 'document_key').iterator():
+        if action in [RELEASE_STAGED, RELEASE_UNSTAGED, RELEASE_REMOVED,
+                      RELEASE_DOCUMENTS_INGESTED]:
+            return None
+        if document_key is not None:
+            changed_documents.add((content_type, document_key))
+    return changed_documents
+
+
+@receiver(content_release_live)
+def record_content_release_live(sender, content_release, previous_content_release=None,
+                                **kwargs):
+    """ record the go-live, from set_live_content_release or release_publisher """
+    changes = [{
+        'site_code': content_release.site_code,
+        'release_uuid': content_release.uuid,
+        'action': RELEASE_LIVE,
+    }]
+    if previous_content_release:
+        changes.append({
+            'site_code': previous_content_release.site_code,
+            'release_uuid': previous_content_release.uuid,
+            'action': RELEASE_ARCHIVED,
+        })
+    record_changes(changes)
@@ -0,0 +1,119 @@
+"""
+.. module:: djangosnapshotpublisher.cold_storage
+   :synopsis: compressed bundles storing the document_json of cold ReleaseDocument
+"""
+
+from collections import OrderedDict
+from functools import lru_cache
+import gzip
+import json
+import tempfile
+import threading
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage, get_storage_class
+
+
+BUNDLE_CACHE_SIZE = 16
+DOCUMENT_CACHE_SIZE = 1024
+
+documents_lock = threading.Lock()
+documents = OrderedDict()
+
+
+def get_storage():
+    """ storage of the bundles, SNAPSHOTPUBLISHER_COLD_STORAGE or the default storage """
+    storage_class = getattr(settings, 'SNAPSHOTPUBLISHER_COLD_STORAGE', None)
+    if storage_class is None:
+        return default_storage
+    return get_storage_class(storage_class)()
+
+
+def get_bundle_name(content_release):
+    """ get_bundle_name """
+    return '{}/{}/{}.jsonl.gz'.format(
+        getattr(settings, 'SNAPSHOTPUBLISHER_COLD_STORAGE_PATH', 'snapshotpublisher'),
+        content_release.site_code,
+        content_release.uuid,
+    )
+
+
+def get_index_name(name):
+    """ name of the index of a bundle, document id: (offset, length) of the document """
+    return '{}.index.json'.format(name)
+
+
+def write_bundle(name, documents):
+    """ write the (id, document_json) from documents to a bundle, return the bundle name, each
+    document is a gzip member so it can be read alone """
+    storage = get_storage()
+    index = {}
+    with tempfile.TemporaryFile() as bundle_file:
+        for document_id, document_json in documents:
+            offset = bundle_file.tell()
+            bundle_file.write(gzip.compress(json.dumps({
+                'id': document_id,
+                'document_json': document_json,
+            }).encode('utf-8') + b'\n'))
+            index[document_id] = [offset, bundle_file.tell() - offset]
+        bundle_file.seek(0)
+        name = storage.save(name, File(bundle_file))
+    index_name = get_index_name(name)
+    if storage.exists(index_name):
+        storage.delete(index_name)
+    storage.save(index_name, ContentFile(json.dumps(index).encode('utf-8')))
+    clear_cache()
+    return name
+
+
+def get_document_cache_size():
+    """ maximum number of documents read from the bundles kept in memory,
+    SNAPSHOTPUBLISHER_COLD_DOCUMENT_CACHE_SIZE """
+    return getattr(settings, 'SNAPSHOTPUBLISHER_COLD_DOCUMENT_CACHE_SIZE', DOCUMENT_CACHE_SIZE)
+
+
+@lru_cache(maxsize=BUNDLE_CACHE_SIZE)
+def load_bundle_index(name):
+    """ load the index of a bundle """
+    with get_storage().open(get_index_name(name), 'rb') as index_file:
+        return {
+            int(document_id): position
+            for document_id, position in json.loads(index_file.read()).items()
+        }
+
+
+def get_cold_document_json(release_document):
+    """ get the document_json of a ReleaseDocument from his bundle, only this document is read
+    and decompressed, the least recently read documents are evicted from the memory """
+    name = release_document.cold_storage_bundle
+    key = (name, release_document.pk)
+    with documents_lock:
+        if key in documents:
+            documents.move_to_end(key)
+            return documents[key]
+    offset, length = load_bundle_index(name)[release_document.pk]
+    with get_storage().open(name, 'rb') as bundle_file:
+        bundle_file.seek(offset)
+        document_json = json.loads(gzip.decompress(bundle_file.read(length)))['document_json']
+    with documents_lock:
+        documents[key] = document_json
+        while len(documents) > get_document_cache_size():
+            documents.popitem(last=False)
+    return document_json
+
+
+def clear_cache():
+    """ clear the indexes and the documents kept in memory """
+    load_bundle_index.cache_clear()
+    with documents_lock:
+        documents.clear()
+
+
+def delete_bundle(name):
+    """ delete a bundle and its index """
+    storage = get_storage()
+    storage.delete(name)
+    storage.delete(get_index_name(name))
+    clear_cache()
@@ -0,0 +1,146 @@
+"""
+.. module:: djangosnapshotpublisher.compare_cache
+   :synopsis: in-process cache of compare_content_releases results
+"""
+
+from collections import OrderedDict
+import hashlib
+import pickle
+import threading
+
+from django.conf import settings
+from django.dispatch import receiver
+
+from .invalidation import get_pending_releases
+from .signals import content_release_changed, content_release_invalidated
+
+
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+lock = threading.Lock()
+# key: (pickled comparison, size)
+comparisons = OrderedDict()
+comparisons_bytes = 0
+# release uuid: version of the release in this process, incremented by each change
+versions = {}
+
+
+def get_max_bytes():
+    """ maximum size of the comparisons kept, SNAPSHOTPUBLISHER_COMPARE_CACHE_BYTES """
+    return getattr(settings, 'SNAPSHOTPUBLISHER_COMPARE_CACHE_BYTES', DEFAULT_MAX_BYTES)
+
+
+def is_enabled():
+    """ is_enabled """
+    return get_max_bytes() > 0
+
+
+def get_versions(content_releases):
+    """ the version of each release, it changes when a release is changed by this process and
+    when the change is committed or received from another process """
+    with lock:
+        return [versions.get(str(content_release.uuid), 0) for content_release in content_releases]
+
+
+def get_cache_key(my_releases, compare_to_releases):
+    """ the uuid and version of the compared releases and of their base releases """
+    content_releases = my_releases + compare_to_releases
+    return (len(my_releases),) + tuple(zip(
+        [str(content_release.uuid) for content_release in content_releases],
+        get_versions(content_releases),
+    ))
+
+
+def get(key):
+    """ a copy of the comparison, None if it's not cached """
+    with lock:
+        if key not in comparisons:
+            return None
+        comparisons.move_to_end(key)
+        data, _ = comparisons[key]
+    return pickle.loads(data)
+
+
+def set(key, comparison):  # pylint: disable=redefined-builtin
+    """ set, the least recently used comparisons are evicted, a comparison done while one of
+    the releases was changed, or with the uncommitted changes of this thread, isn't kept """
+    global comparisons_bytes  # pylint: disable=global-statement
+    pending_release_uuids = {
+        str(release_uuid) for site_code, release_uuid in get_pending_releases()}
+    if any(release_uuid in pending_release_uuids for release_uuid, version in key[1:]):
+        return
+    data = pickle.dumps(comparison, pickle.HIGHEST_PROTOCOL)
+    max_bytes = get_max_bytes()
+    if len(data) > max_bytes:
+        return
+    with lock:
+        if any(versions.get(release_uuid, 0) != version for release_uuid, version in key[1:]):
+            return
+        if key in comparisons:
+            comparisons_bytes -= comparisons.pop(key)[1]
+        comparisons[key] = (data, len(data))
+        comparisons_bytes += len(data)
+        while comparisons_bytes > max_bytes:
+            comparisons_bytes -= comparisons.popitem(last=False)[1][1]
+
+
+def clear():
+    """ clear """
+    global comparisons_bytes  # pylint: disable=global-statement
+    with lock:
+        comparisons.clear()
+        comparisons_bytes = 0
+
+
+def invalidate(release_uuid):
+    """ increment the version of a release and drop its comparisons, they can't be hit again """
+    global comparisons_bytes  # pylint: disable=global-statement
+    release_uuid = str(release_uuid)
+    with lock:
+        versions[release_uuid] = versions.get(release_uuid, 0) + 1
+        for key in [
+                key for key in comparisons
+                if any(key_release_uuid == release_uuid for key_release_uuid, version in key[1:])
+        ]:
+            comparisons_bytes -= comparisons.pop(key)[1]
+
+
+def get_releases_digest(my_releases, compare_to_releases):
+    """ get_releases_digest """
+    return hashlib.sha1('{}/{}'.format(
+        ','.join(str(content_release.uuid) for content_release in my_releases),
+        ','.join(str(content_release.uuid) for content_release in compare_to_releases),
+    ).encode('utf-8')).hexdigest()[:16]
+
+
+def make_token(seq, count, my_releases, compare_to_releases):
+    """ token of a comparison done after the change seq, count is the number of changes of the
+    compared releases up to seq """
+    return '{}:{}:{}'.format(seq, count, get_releases_digest(my_releases, compare_to_releases))
+
+
+def parse_token(token, my_releases, compare_to_releases):
+    """ (seq, count) of a token, None if it's invalid or if the compared releases are not the
+    same """
+    try:
+        seq, count, digest = token.split(':')
+        seq = int(seq)
+        count = int(count)
+    except (AttributeError, ValueError):
+        return None
+    if digest != get_releases_digest(my_releases, compare_to_releases):
+        return None
+    return seq, count
+
+
+@receiver(content_release_changed)
+def invalidate_on_change(sender, changes, **kwargs):
+    """ the transaction making the changes doesn't hit the comparisons done before them """
+    for release_uuid in {change['release_uuid'] for change in changes}:
+        invalidate(release_uuid)
+
+
+@receiver(content_release_invalidated)
+def invalidate_on_broadcast(sender, release_uuid, **kwargs):
+    """ changes from this process and the other processes """
+    invalidate(release_uuid)
@@ -0,0 +1,165 @@
+"""
+.. module:: djangosnapshotpublisher.delta
+   :synopsis: store a ReleaseDocument as a json patch against the document of its base release
+"""
+
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+DEFAULT_MAX_CHAIN = 5
+CACHE_KEY = 'djangosnapshotpublisher:delta:{}:{}'
+
+
+def is_delta_storage_enabled():
+    """ is_delta_storage_enabled """
+    return getattr(settings, 'SNAPSHOTPUBLISHER_DELTA_STORAGE', False)
+
+
+def get_cache():
+    """ get the cache used to store the reconstructed documents, None if disabled """
+    alias = getattr(settings, 'SNAPSHOTPUBLISHER_DELTA_CACHE', 'default')
+    if alias is None:
+        return None
+    return caches[alias]
+
+
+def escape_pointer(key):
+    """ escape a key for a json pointer """
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+
+def unescape_pointer(key):
+    """ unescape a key from a json pointer """
+    return key.replace('~1', '/').replace('~0', '~')
+
+
+def make_patch(source, target, path=''):
+    """ return the list of operations (add, remove, replace) transforming source into target """
+    if isinstance(source, dict) and isinstance(target, dict):
+        patch = []
+        for key in source:
+            if key not in target:
+                patch.append({'op': 'remove', 'path': '{}/{}'.format(path, escape_pointer(key))})
+        for key, value in target.items():
+            key_path = '{}/{}'.format(path, escape_pointer(key))
+            if key not in source:
+                patch.append({'op': 'add', 'path': key_path, 'value': value})
+            else:
+                patch.extend(make_patch(source[key], value, key_path))
+        return patch
+    if isinstance(source, list) and isinstance(target, list) and len(source) == len(target):
+        patch = []
+        for index, (source_value, target_value) in enumerate(zip(source, target)):
+            patch.extend(make_patch(source_value, target_value, '{}/{}'.format(path, index)))
+        return patch
+    if type(source) is type(target) and source == target:
+        return []
+    return [{'op': 'replace', 'path': path, 'value': target}]
+
+
+def apply_patch(document, patch):
+    """ apply the operations from make_patch to document, document is modified in place """
+    for operation in patch:
+        if operation['path'] == '':
+            document = operation['value']
+            continue
+        keys = [unescape_pointer(key) for key in operation['path'].split('/')[1:]]
+        parent = document
+        for key in keys[:-1]:
+            parent = parent[int(key)] if isinstance(parent, list) else parent[key]
+        key = int(keys[-1]) if isinstance(parent, list) else keys[-1]
+        if operation['op'] == 'remove':
+            del parent[key]
+        else:
+            parent[key] = operation['value']
+    return document
+
+
+def resolve_document_json(release_document):
+    """ return the full document_json of a ReleaseDocument, rebuilding it from the patches """
+    if release_document.delta_base_id is None:
+        return release_document.document_json
+
+    cache = get_cache()
+    cache_key = CACHE_KEY.format(
+        release_document.pk,
+        hashlib.sha1(release_document.document_delta.encode('utf-8')).hexdigest(),
+    )
+    if cache is not None:
+        document_json = cache.get(cache_key)
+        if document_json is not None:
+            return document_json
+
+    document = json.loads(release_document.delta_base.get_document_json())
+    document_json = json.dumps(apply_patch(document, json.loads(release_document.document_delta)))
+
+    if cache is not None:
+        cache.set(cache_key, document_json)
+    return document_json
+
+
+def set_document_hash_and_size(release_document, document_json):
+    """ set the document_hash and document_size (bytes) of document_json on a ReleaseDocument """
+    if document_json is None:
+        release_document.document_hash = None
+        release_document.document_size = None
+        return
+    document_bytes = document_json.encode('utf-8')
+    release_document.document_hash = hashlib.sha1(document_bytes).hexdigest()
+    release_document.document_size = len(document_bytes)
+
+
+def set_document_json(release_document, document_json, base_document=None):
+    """ set document_json on a ReleaseDocument, as a patch against base_document if it's worth """
+    release_document.document_json = document_json
+    release_document.document_delta = None
+    release_document.delta_base = None
+    release_document.delta_depth = 0
+    release_document.cold_storage_bundle = None
+    set_document_hash_and_size(release_document, document_json)
+
+    if not is_delta_storage_enabled() or base_document is None or document_json is None or \
+            base_document.deleted or base_document.pk == release_document.pk:
+        return
+
+    # periodic full snapshot, a chain can't be longer than SNAPSHOTPUBLISHER_DELTA_MAX_CHAIN
+    delta_depth = base_document.delta_depth + 1
+    if delta_depth > getattr(settings, 'SNAPSHOTPUBLISHER_DELTA_MAX_CHAIN', DEFAULT_MAX_CHAIN):
+        return
+
+    base_document_json = base_document.get_document_json()
+    if base_document_json is None:
+        return
+    try:
+        base = json.loads(base_document_json)
+        target = json.loads(document_json)
+    except ValueError:
+        return
+    patch = make_patch(base, target)
+    document_delta = json.dumps(patch)
+    if len(document_delta) >= len(document_json):
+        return
+
+    # only keep the patch if it gives back exactly the same document_json
+    if json.dumps(apply_patch(json.loads(base_document_json), patch)) != document_json:
+        return
+
+    release_document.document_json = None
+    release_document.document_delta = document_delta
+    release_document.delta_base = base_document
+    release_document.delta_depth = delta_depth
+
+
+def materialize_delta_documents(release_document):
+    """ store the full document_json for all the documents using release_document as base """
+    for delta_document in release_document.delta_documents.all():
+        delta_document.document_json = delta_document.get_document_json()
+        delta_document.document_delta = None
+        delta_document.delta_base = None
+        delta_document.delta_depth = 0
+        delta_document.cold_storage_bundle = None
+        delta_document.save()
@@ -0,0 +1,225 @@
+"""
+.. module:: djangosnapshotpublisher.document_cache
+   :synopsis: cache of the ReleaseDocument read by PublisherAPI, warmed up when a release is staged
+"""
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections
+from django.dispatch import receiver
+
+from .changefeed import RELEASE_STAGED
+from .models import ContentRelease, ReleaseDocument, ReleaseJob
+from .signals import content_release_changed, content_release_invalidated
+
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_CACHE_KEY = 'djangosnapshotpublisher:document:{}'
+ACCESS_CACHE_KEY = 'djangosnapshotpublisher:access:{}'
+ACCESS_FLUSH_INTERVAL = 100
+
+access_lock = threading.Lock()
+access_counters = {}
+
+
+def get_cache():
+    """ cache of the documents, SNAPSHOTPUBLISHER_DOCUMENT_CACHE, None if disabled """
+    alias = getattr(settings, 'SNAPSHOTPUBLISHER_DOCUMENT_CACHE', None)
+    if alias is None:
+        return None
+    return caches[alias]
+
+
+def get_cache_key(site_code, release_uuid, content_type, document_key):
+    """ get_cache_key """
+    return DOCUMENT_CACHE_KEY.format(hashlib.sha1('\n'.join([
+        site_code, str(release_uuid), content_type, document_key,
+    ]).encode('utf-8')).hexdigest())
+
+
+def to_cacheable(release_document):
+    """ copy of release_document with the full document_json, stored without delta or bundle """
+    return ReleaseDocument(
+        id=release_document.id,
+        document_key=release_document.document_key,
+        content_type=release_document.content_type,
+        document_json=release_document.get_document_json(),
+        deleted=release_document.deleted,
+    )
+
+
+def get_document(site_code, release_uuid, content_type, document_key):
+    """ get a ReleaseDocument from the cache, None if it's not cached """
+    cache = get_cache()
+    if cache is None:
+        return None
+    record_access(site_code, content_type, document_key)
+    return cache.get(get_cache_key(site_code, release_uuid, content_type, document_key))
+
+
+def set_document(site_code, release_uuid, release_document):
+    """ set_document """
+    cache = get_cache()
+    if cache is not None:
+        cache.set(
+            get_cache_key(site_code, release_uuid, release_document.content_type,
+                          release_document.document_key),
+            to_cacheable(release_document),
+        )
+
+
+def invalidate_release_document(release_document):
+    """ remove a ReleaseDocument from the cache of all the releases it belongs to """
+    cache = get_cache()
+    if cache is not None and release_document.pk is not None:
+        cache.delete_many([
+            get_cache_key(site_code, release_uuid, release_document.content_type,
+                          release_document.document_key)
+            for site_code, release_uuid in release_document.content_releases.values_list(
+                'site_code', 'uuid')
+        ])
+
+
+def invalidate_content_release(content_release):
+    """ remove all the documents of a ContentRelease from the cache """
+    cache = get_cache()
+    if cache is not None:
+        cache.delete_many([
+            get_cache_key(content_release.site_code, content_release.uuid, content_type,
+                          document_key)
+            for content_type, document_key in content_release.release_documents.values_list(
+                'content_type', 'document_key')
+        ])
+
+
+def record_access(site_code, content_type, document_key):
+    """ count the reads by document, the counts are merged in the cache every 100 reads """
+    with access_lock:
+        counter = access_counters.setdefault(site_code, Counter())
+        counter[(content_type, document_key)] += 1
+        if sum(counter.values()) < ACCESS_FLUSH_INTERVAL:
+            return
+        access_counters[site_code] = Counter()
+    merge_access_counter(site_code, counter)
+
+
+def merge_access_counter(site_code, counter):
+    """ merge_access_counter, concurrent merges can lose counts, they are only a ranking """
+    cache = get_cache()
+    key = ACCESS_CACHE_KEY.format(site_code)
+    access_counter = cache.get(key) or Counter()
+    access_counter.update(counter)
+    cache.set(key, access_counter, None)
+
+
+def get_most_accessed_documents(site_code, top):
+    """ the (content_type, document_key) of the top most read documents of a site """
+    with access_lock:
+        counter = access_counters.pop(site_code, Counter())
+    if counter:
+        merge_access_counter(site_code, counter)
+    access_counter = get_cache().get(ACCESS_CACHE_KEY.format(site_code)) or Counter()
+    return [document for document, count in access_counter.most_common(top)]
+
+
+def warm_up_documents(site_code, release_uuid, document_ids):
+    """ read a batch of documents and write them to the cache, run by a worker thread with its
+    own database and cache connections """
+    try:
+        get_cache().set_many({
+            get_cache_key(site_code, release_uuid, release_document.content_type,
+                          release_document.document_key): to_cacheable(release_document)
+            for release_document in ReleaseDocument.objects.filter(id__in=document_ids)
+        })
+    finally:
+        connections.close_all()
+
+
+def warm_up_content_release(content_release, top=None, workers=4, batch_size=500):
+    """ load the documents of content_release, or the <top> most read, in the cache, the
+    workers read the documents with their own connection so it must be called outside of the
+    transaction that wrote them """
+    start = time.monotonic()
+    release_documents = list(content_release.release_documents.values_list(
+        'id', 'content_type', 'document_key').order_by('id'))
+    document_ids = [document_id for document_id, content_type, document_key in release_documents]
+    if top is not None:
+        most_accessed_documents = set(get_most_accessed_documents(content_release.site_code, top))
+        document_ids = [
+            document_id for document_id, content_type, document_key in release_documents
+            if (content_type, document_key) in most_accessed_documents
+        ]
+
+    # the workers read the documents by batches and write them to the cache
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                warm_up_documents,
+                content_release.site_code,
+                content_release.uuid,
+                document_ids[index:index + batch_size],
+            )
+            for index in range(0, len(document_ids), batch_size)
+        ]
+        for future in futures:
+            future.result()
+
+    return {
+        'release_documents': len(release_documents),
+        'warmed': len(document_ids),
+        'coverage': len(document_ids) / len(release_documents) if release_documents else 1.0,
+        'seconds': time.monotonic() - start,
+    }
+
+
+def warm_up_release(content_release):
+    """ warm up the cache with the settings, run by the warm_up ReleaseJob """
+    report = warm_up_content_release(
+        content_release,
+        top=getattr(settings, 'SNAPSHOTPUBLISHER_DOCUMENT_CACHE_WARM_UP_TOP', None),
+        workers=getattr(settings, 'SNAPSHOTPUBLISHER_DOCUMENT_CACHE_WARM_UP_WORKERS', 4),
+    )
+    logger.info(
+        'Cache warm up %s: %s/%s documents in %.3fs',
+        content_release.uuid, report['warmed'], report['release_documents'], report['seconds'],
+    )
+    return report
+
+
+@receiver(content_release_changed)
+def warm_up_on_stage(sender, changes, **kwargs):
+    """ add a warm_up ReleaseJob for the staged releases, the documents are cached by the
+    release_jobs worker before the release goes live (the keys are the same once it's live),
+    the job is rolled back with the staging """
+    if get_cache() is None or \
+            not getattr(settings, 'SNAPSHOTPUBLISHER_DOCUMENT_CACHE_WARM_UP', True):
+        return
+    for change in changes:
+        if change['action'] == RELEASE_STAGED:
+            ReleaseJob.objects.create(
+                action='warm_up',
+                site_code=change['site_code'],
+                release_uuid=change['release_uuid'],
+            )
+
+
+@receiver(content_release_invalidated)
+def invalidate_on_broadcast(sender, site_code, release_uuid, remote, **kwargs):
+    """ changes from the other processes, a shared cache is invalidated by the process making
+    the change, a cache local to each process is invalidated by each process """
+    cache = get_cache()
+    if not remote or not isinstance(cache, LocMemCache):
+        return
+    content_release = ContentRelease.objects.filter(
+        site_code=site_code, uuid=release_uuid).first()
+    if content_release is not None:
+        invalidate_content_release(content_release)
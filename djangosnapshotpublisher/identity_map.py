@@ -0,0 +1,90 @@
+"""
+.. module:: djangosnapshotpublisher.identity_map
+   :synopsis: memoize the ContentRelease lookups for the duration of a request
+"""
+
+from contextlib import contextmanager
+import threading
+
+from django.dispatch import receiver
+
+from .models import ContentRelease
+from .signals import content_release_changed, content_release_invalidated
+from .tracing import span
+
+
+local = threading.local()
+
+
+def get_scope():
+    """ the dict of the current scope, None outside of a scope """
+    return getattr(local, 'scope', None)
+
+
+@contextmanager
+def release_scope():
+    """ memoize the ContentRelease lookups in the block, a nested scope uses the outer one """
+    if get_scope() is not None:
+        yield get_scope()
+        return
+    local.scope = {}
+    try:
+        yield local.scope
+    finally:
+        local.scope = None
+
+
+def memoize(key, lookup):
+    """ return lookup() memoized in the current scope under key, DoesNotExist is memoized too """
+    scope = get_scope()
+    if scope is None:
+        with span('release_lookup', lookup=key[0]):
+            return lookup()
+    if key not in scope:
+        try:
+            with span('release_lookup', lookup=key[0]):
+                scope[key] = lookup()
+        except ContentRelease.DoesNotExist as exception:
+            scope[key] = exception
+    if isinstance(scope[key], ContentRelease.DoesNotExist):
+        raise scope[key]
+    return scope[key]
+
+
+def get_content_release(site_code, release_uuid):
+    """ get_content_release """
+    return memoize(
+        ('release', site_code, str(release_uuid)),
+        lambda: ContentRelease.objects.get(site_code=site_code, uuid=release_uuid),
+    )
+
+
+def get_live_content_release(site_code):
+    """ get_live_content_release """
+    return memoize(('live', site_code), lambda: ContentRelease.objects.live(site_code))
+
+
+def get_stage_content_release(site_code):
+    """ get_stage_content_release """
+    return memoize(('stage', site_code), lambda: ContentRelease.objects.stage(site_code))
+
+
+def invalidate(site_code):
+    """ drop the lookups of a site from the current scope """
+    scope = get_scope()
+    if scope:
+        for key in [key for key in scope if key[1] == site_code]:
+            del scope[key]
+
+
+@receiver(content_release_changed)
+def invalidate_on_change(sender, changes, **kwargs):
+    """ writes in the scope """
+    for site_code in {change['site_code'] for change in changes}:
+        invalidate(site_code)
+
+
+@receiver(content_release_invalidated)
+def invalidate_on_broadcast(sender, site_code, **kwargs):
+    """ changes from the other processes """
+    invalidate(site_code)
@@ -0,0 +1,25 @@
+"""
+.. module:: djangosnapshotpublisher.indexes
+   :synopsis: indexes used by the migrations, without the runtime modules
+"""
+
+from django.db import models
+
+
+class BinaryOrderIndex(models.Index):
+    """ index on the columns COLLATE "C" on PostgreSQL, the order of streaming_compare.BinaryOrder,
+    a plain index on the other backends """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        """ create_sql """
+        if schema_editor.connection.vendor != 'postgresql':
+            return super(BinaryOrderIndex, self).create_sql(model, schema_editor, using, **kwargs)
+        fields = [model._meta.get_field(field_name) for field_name, _ in self.fields_orders]
+        col_suffixes = [
+            ' '.join(filter(None, ['COLLATE "C"', order])) for _, order in self.fields_orders
+        ]
+        return schema_editor._create_index_sql(
+            model, fields, name=self.name, using=using, db_tablespace=self.db_tablespace,
+            col_suffixes=col_suffixes, opclasses=self.opclasses,
+            condition=self._get_condition_sql(model, schema_editor), **kwargs,
+        )
@@ -0,0 +1,281 @@
+"""
+.. module:: djangosnapshotpublisher.ingest
+   :synopsis: bulk ingest of documents in a release, with COPY on PostgreSQL
+"""
+
+import hashlib
+import tempfile
+import time
+import uuid
+
+from django.db import connections, router
+
+from .models import ContentRelease, ReleaseDocument, ReleaseDocumentExtraParameter
+
+
+INGEST_BATCH_SIZE = 5000
+METHODS = ['copy', 'bulk_create']
+STAGING_DOCUMENT_TABLE = 'snapshotpublisher_ingest_document'
+STAGING_PARAMETER_TABLE = 'snapshotpublisher_ingest_parameter'
+
+
+def get_document_hash(document_json):
+    """ same hash as set_document_json """
+    if document_json is None:
+        return None
+    return hashlib.sha1(document_json.encode('utf-8')).hexdigest()
+
+
+def get_document_size(document_json):
+    """ same size as set_document_json """
+    if document_json is None:
+        return None
+    return len(document_json.encode('utf-8'))
+
+
+def to_copy_line(values):
+    """ a row in the COPY text format """
+    return '\t'.join(
+        '\\N' if value is None else str(value).replace('\\', '\\\\').replace(
+            '\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+        for value in values
+    ) + '\n'
+
+
+class CopyStream:
+    """ CopyStream, file-like object reading the COPY lines of rows as they are generated """
+
+    def __init__(self, rows):
+        self.lines = (to_copy_line(row).encode('utf-8') for row in rows)
+        self.buffer = b''
+
+    def read(self, size=-1):
+        """ read """
+        while size < 0 or len(self.buffer) < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.buffer += line
+        if size < 0:
+            data, self.buffer = self.buffer, b''
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def delete_replaced_documents(release_document_ids, batch_size=INGEST_BATCH_SIZE):
+    """ delete the replaced documents which are not in another release, like
+    unpublish_document_from_content_release, return the number of deleted documents """
+    count = 0
+    for index in range(0, len(release_document_ids), batch_size):
+        _, deleted = ReleaseDocument.objects.filter(
+            id__in=release_document_ids[index:index + batch_size],
+            content_releases__isnull=True,
+        ).delete()
+        count += deleted.get(ReleaseDocument._meta.label, 0)
+    return count
+
+
+def get_default_method(connection):
+    """ get_default_method """
+    return 'copy' if connection.vendor == 'postgresql' else 'bulk_create'
+
+
+def ingest_with_copy(connection, content_release, documents):
+    """ COPY the documents and parameters to staging tables, then merge them with one
+    statement per table, return the number of documents and parameters """
+    quote_name = connection.ops.quote_name
+    # the staging tables of each call have their own name, several ingests can be done in the
+    # same transaction
+    suffix = uuid.uuid4().hex[:12]
+    tables = {
+        'document': quote_name(ReleaseDocument._meta.db_table),
+        'parameter': quote_name(ReleaseDocumentExtraParameter._meta.db_table),
+        'link': quote_name(ContentRelease.release_documents.through._meta.db_table),
+        'staging_document': quote_name('{}_{}'.format(STAGING_DOCUMENT_TABLE, suffix)),
+        'staging_parameter': quote_name('{}_{}'.format(STAGING_PARAMETER_TABLE, suffix)),
+    }
+    report = {'documents': 0, 'parameters': 0}
+
+    with connection.cursor() as cursor, tempfile.TemporaryFile() as parameter_file:
+        cursor.execute(
+            'CREATE TEMPORARY TABLE {staging_document} (row_number bigint, content_type text, '
+            'document_key text, document_json text, document_hash text, document_size integer) '
+            'ON COMMIT DROP'.format(**tables))
+        cursor.execute(
+            'CREATE TEMPORARY TABLE {staging_parameter} (row_number bigint, key text, '
+            'content text) ON COMMIT DROP'.format(**tables))
+
+        def document_rows():
+            """ the staging rows of the documents, the parameters are written to a file """
+            for row_number, document in enumerate(documents):
+                report['documents'] += 1
+                yield (
+                    row_number,
+                    document.get('content_type', 'content'),
+                    document['document_key'],
+                    document['document_json'],
+                    get_document_hash(document['document_json']),
+                    get_document_size(document['document_json']),
+                )
+                for key, content in (document.get('parameters') or {}).items():
+                    parameter_file.write(
+                        to_copy_line([row_number, key, content]).encode('utf-8'))
+
+        cursor.copy_expert(
+            'COPY {staging_document} (row_number, content_type, document_key, document_json, '
+            'document_hash, document_size) FROM STDIN'.format(**tables),
+            CopyStream(document_rows()),
+        )
+        parameter_file.seek(0)
+        cursor.copy_expert(
+            'COPY {staging_parameter} (row_number, key, content) FROM STDIN'.format(**tables),
+            parameter_file,
+        )
+        cursor.execute(
+            'CREATE INDEX ON {staging_document} (content_type, document_key)'.format(**tables))
+        cursor.execute('ANALYZE {staging_document}'.format(**tables))
+
+        # the last document wins when a document is ingested twice
+        cursor.execute(
+            'DELETE FROM {staging_document} staging USING {staging_document} newer '
+            'WHERE staging.content_type = newer.content_type '
+            'AND staging.document_key = newer.document_key '
+            'AND staging.row_number < newer.row_number'.format(**tables))
+        report['documents'] -= cursor.rowcount
+        # the documents replaced in the release
+        cursor.execute(
+            'DELETE FROM {link} link USING {document} document, {staging_document} staging '
+            'WHERE link.contentrelease_id = %s AND link.releasedocument_id = document.id '
+            'AND document.content_type = staging.content_type '
+            'AND document.document_key = staging.document_key '
+            'RETURNING link.releasedocument_id'.format(**tables),
+            [content_release.id],
+        )
+        replaced_document_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            'WITH inserted AS ('
+            'INSERT INTO {document} (document_key, content_type, document_json, deleted, '
+            'delta_depth, document_hash, document_size, site_code) '
+            'SELECT document_key, content_type, document_json, false, 0, document_hash, '
+            'document_size, %s '
+            'FROM {staging_document} RETURNING id) '
+            'INSERT INTO {link} (contentrelease_id, releasedocument_id) '
+            'SELECT %s, id FROM inserted'.format(**tables),
+            [content_release.site_code, content_release.id],
+        )
+        cursor.execute(
+            'INSERT INTO {parameter} (key, content, release_document_id) '
+            'SELECT parameter.key, parameter.content, document.id '
+            'FROM {staging_parameter} parameter '
+            'JOIN {staging_document} staging ON staging.row_number = parameter.row_number '
+            'JOIN {document} document ON document.content_type = staging.content_type '
+            'AND document.document_key = staging.document_key '
+            'JOIN {link} link ON link.releasedocument_id = document.id '
+            'AND link.contentrelease_id = %s'.format(**tables),
+            [content_release.id],
+        )
+        report['parameters'] = cursor.rowcount
+        cursor.execute('DROP TABLE {staging_document}, {staging_parameter}'.format(**tables))
+    delete_replaced_documents(replaced_document_ids)
+    return report
+
+
+def ingest_chunk(content_release, chunk):
+    """ bulk_create a chunk of documents, return the number of documents and parameters """
+    # the last document wins when a document is ingested twice
+    chunk = list({
+        (document.get('content_type', 'content'), document['document_key']): document
+        for document in chunk
+    }.values())
+    through = ContentRelease.release_documents.through
+    replaced_document_ids = []
+    for content_type in {document.get('content_type', 'content') for document in chunk}:
+        links = through.objects.filter(
+            contentrelease_id=content_release.id,
+            releasedocument__content_type=content_type,
+            releasedocument__document_key__in=[
+                document['document_key'] for document in chunk
+                if document.get('content_type', 'content') == content_type
+            ],
+        )
+        replaced_document_ids += links.values_list('releasedocument_id', flat=True)
+        links.delete()
+
+    release_documents = [
+        ReleaseDocument(
+            document_key=document['document_key'],
+            content_type=document.get('content_type', 'content'),
+            document_json=document['document_json'],
+            document_hash=get_document_hash(document['document_json']),
+            document_size=get_document_size(document['document_json']),
+            site_code=content_release.site_code,
+        ) for document in chunk
+    ]
+    connection = connections[router.db_for_write(ReleaseDocument)]
+    if connection.features.can_return_rows_from_bulk_insert:
+        release_documents = ReleaseDocument.objects.bulk_create(release_documents)
+    else:
+        # the ids are only set by bulk_create when they are returned by the INSERT
+        for release_document in release_documents:
+            release_document.save()
+    release_document_ids = {
+        (release_document.content_type, release_document.document_key): release_document.id
+        for release_document in release_documents
+    }
+    through.objects.bulk_create([
+        through(contentrelease_id=content_release.id, releasedocument_id=release_document_id)
+        for release_document_id in release_document_ids.values()
+    ])
+    parameters = [
+        ReleaseDocumentExtraParameter(
+            key=key,
+            content=content,
+            release_document_id=release_document_ids[
+                (document.get('content_type', 'content'), document['document_key'])],
+        )
+        for document in chunk
+        for key, content in (document.get('parameters') or {}).items()
+    ]
+    ReleaseDocumentExtraParameter.objects.bulk_create(parameters)
+    delete_replaced_documents(replaced_document_ids)
+    return len(chunk), len(parameters)
+
+
+def ingest_with_bulk_create(content_release, documents, batch_size=INGEST_BATCH_SIZE):
+    """ bulk_create the documents by chunks, return the number of documents and parameters """
+    report = {'documents': 0, 'parameters': 0}
+    chunk = []
+    for document in documents:
+        chunk.append(document)
+        if len(chunk) == batch_size:
+            count, parameter_count = ingest_chunk(content_release, chunk)
+            report['documents'] += count
+            report['parameters'] += parameter_count
+            chunk = []
+    if chunk:
+        count, parameter_count = ingest_chunk(content_release, chunk)
+        report['documents'] += count
+        report['parameters'] += parameter_count
+    return report
+
+
+def ingest_documents(content_release, documents, method=None, batch_size=INGEST_BATCH_SIZE):
+    """ add the documents (iterable of dict with document_key, document_json and optionally
+    content_type and parameters) to content_release, replacing the documents with the same
+    key, must be called in a transaction """
+    connection = connections[router.db_for_write(ReleaseDocument)]
+    method = method or get_default_method(connection)
+    if method not in METHODS:
+        raise ValueError('Unknown ingest method {}'.format(method))
+    if method == 'copy' and connection.vendor != 'postgresql':
+        raise ValueError('COPY is only available on PostgreSQL')
+
+    start = time.time()
+    if method == 'copy':
+        report = ingest_with_copy(connection, content_release, documents)
+    else:
+        report = ingest_with_bulk_create(content_release, documents, batch_size)
+    report['method'] = method
+    report['seconds'] = time.time() - start
+    return report
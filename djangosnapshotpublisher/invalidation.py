@@ -0,0 +1,168 @@
+"""
+.. module:: djangosnapshotpublisher.invalidation
+   :synopsis: broadcast the changed releases to the caches of all the processes
+"""
+
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .models import ReleaseCacheVersion
+from .signals import content_release_changed, content_release_invalidated
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRANSPORT = 'djangosnapshotpublisher.invalidation.InMemoryTransport'
+
+local = threading.local()
+transports = {}
+transports_lock = threading.Lock()
+
+
+class BaseTransport:
+    """ BaseTransport, subclass it to use an external pub/sub """
+
+    def publish(self, releases):
+        """ send the (site_code, release_uuid) changed to the other processes """
+        raise NotImplementedError
+
+    def poll(self):
+        """ return the (site_code, release_uuid) changed by the other processes """
+        return []
+
+
+class InMemoryTransport(BaseTransport):
+    """ InMemoryTransport, only the current process is invalidated """
+
+    def publish(self, releases):
+        """ publish, the current process already received its changes """
+
+
+class DatabaseTransport(BaseTransport):
+    """ DatabaseTransport, the processes poll the ReleaseCacheVersion table """
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex
+        self.last_version = None
+        # versions above last_version already received, with the time they were received
+        self.received_versions = {}
+        self.last_poll = None
+        self.lock = threading.Lock()
+
+    def publish(self, releases):
+        """ publish, a new row gives a new version """
+        for site_code, release_uuid in releases:
+            try:
+                with transaction.atomic():
+                    ReleaseCacheVersion.objects.filter(
+                        site_code=site_code, release_uuid=release_uuid).delete()
+                    ReleaseCacheVersion.objects.create(
+                        site_code=site_code, release_uuid=release_uuid, origin=self.origin)
+            except IntegrityError:
+                # published at the same time by another process
+                pass
+
+    def poll(self):
+        """ poll, at most every SNAPSHOTPUBLISHER_INVALIDATION_POLL_INTERVAL seconds, the ids
+        are not committed in order: the versions received in the last
+        SNAPSHOTPUBLISHER_INVALIDATION_LAG seconds are read again, so a lower version committed
+        in the meantime isn't skipped """
+        interval = getattr(settings, 'SNAPSHOTPUBLISHER_INVALIDATION_POLL_INTERVAL', 1)
+        lag = getattr(settings, 'SNAPSHOTPUBLISHER_INVALIDATION_LAG', 10)
+        with self.lock:
+            now = time.monotonic()
+            if self.last_poll is not None and now - self.last_poll < interval:
+                return []
+            self.last_poll = now
+            versions = ReleaseCacheVersion.objects.order_by('id')
+            if self.last_version is None:
+                # nothing is cached before the first poll
+                last_version = versions.last()
+                self.last_version = last_version.id if last_version else 0
+                return []
+            releases = []
+            for version, site_code, release_uuid, origin in versions.filter(
+                    id__gt=self.last_version,
+            ).values_list('id', 'site_code', 'release_uuid', 'origin'):
+                if version in self.received_versions:
+                    continue
+                self.received_versions[version] = now
+                # this process received its own changes when they were committed
+                if origin != self.origin:
+                    releases.append((site_code, release_uuid))
+
+            # the transactions of the lower versions, short ones, are committed after the lag
+            settled_versions = [
+                version for version, received in self.received_versions.items()
+                if now - received >= lag
+            ]
+            if settled_versions:
+                self.last_version = max(settled_versions)
+                self.received_versions = {
+                    version: received for version, received in self.received_versions.items()
+                    if version > self.last_version
+                }
+            return releases
+
+
+def get_transport():
+    """ the transport from SNAPSHOTPUBLISHER_INVALIDATION_TRANSPORT, one instance per process """
+    path = getattr(settings, 'SNAPSHOTPUBLISHER_INVALIDATION_TRANSPORT', DEFAULT_TRANSPORT)
+    with transports_lock:
+        if path not in transports:
+            transports[path] = import_string(path)()
+        return transports[path]
+
+
+def receive(releases, remote=True):
+    """ invalidate the (site_code, release_uuid) in this process, called by the transports """
+    for site_code, release_uuid in releases:
+        content_release_invalidated.send(
+            sender=ReleaseCacheVersion,
+            site_code=site_code,
+            release_uuid=release_uuid,
+            remote=remote,
+        )
+
+
+def poll():
+    """ receive the changes from the other processes """
+    receive(get_transport().poll())
+
+
+def get_pending_releases():
+    """ the (site_code, release_uuid) changed by the transaction of this thread, not broadcast
+    yet """
+    return set(getattr(local, 'releases', set()))
+
+
+def broadcast():
+    """ broadcast the releases changed by the transaction, once per release """
+    releases = sorted(getattr(local, 'releases', set()), key=str)
+    local.releases = set()
+    if not releases:
+        return
+    receive(releases, remote=False)
+    try:
+        get_transport().publish(releases)
+    except Exception:  # pylint: disable=broad-except
+        logger.exception('Invalidation broadcast failed: %s', releases)
+
+
+@receiver(content_release_changed)
+def broadcast_on_commit(sender, changes, **kwargs):
+    """ coalesce the changes of a transaction, broadcast when it's committed """
+    if not hasattr(local, 'releases'):
+        local.releases = set()
+    local.releases.update((change['site_code'], change['release_uuid']) for change in changes)
+    connection = transaction.get_connection()
+    # the hooks are dropped on rollback, register again if it's not there
+    if not any(hook[1] is broadcast for hook in connection.run_on_commit):
+        transaction.on_commit(broadcast)
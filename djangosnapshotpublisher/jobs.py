@@ -0,0 +1,248 @@
+"""
+.. module:: djangosnapshotpublisher.jobs
+   :synopsis: ContentRelease operations run in the background by the release_jobs command
+"""
+
+from datetime import timedelta
+import json
+import logging
+import os
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+
+from . import document_cache
+from .lazy_encoder import LazyEncoder
+from .models import ContentRelease, ReleaseJob
+from .publisher_api import ERROR_STATUS_CODE, PublisherAPI
+from .sqlite_export import export_content_release
+from .static_tree import build_live_static_tree
+
+
+logger = logging.getLogger(__name__)
+
+
+class JobError(Exception):
+    """ JobError, the job failed with this message """
+
+
+class Heartbeat(threading.Thread):
+    """ Heartbeat, save the heartbeat_datetime of a running job every interval seconds """
+
+    def __init__(self, job, interval):
+        super().__init__(daemon=True)
+        self.job = job
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        """ run """
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    ReleaseJob.objects.filter(id=self.job.id, status=1).update(
+                        heartbeat_datetime=timezone.now())
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception('Heartbeat of the job %s failed', self.job.id)
+        finally:
+            connections.close_all()
+
+    def stop(self):
+        """ stop """
+        self.stopped.set()
+        self.join()
+
+
+def enqueue(action, site_code, release_uuid, created_by=None, **arguments):
+    """ add a pending ReleaseJob """
+    return ReleaseJob.objects.create(
+        action=action,
+        site_code=site_code,
+        release_uuid=release_uuid,
+        arguments=json.dumps(arguments, cls=LazyEncoder),
+        created_by=created_by,
+    )
+
+
+def set_progress(job, progress):
+    """ save the progress (0 to 100) of a running job """
+    job.progress = progress
+    ReleaseJob.objects.filter(id=job.id).update(progress=progress)
+
+
+def check_response(response):
+    """ raise JobError if the PublisherAPI response is an error """
+    if response['status'] != 'success':
+        raise JobError(str(ERROR_STATUS_CODE[response['error_code']]))
+    return response.get('content')
+
+
+def run_stage(job, publisher_api, arguments):
+    """ run_stage """
+    check_response(publisher_api.set_stage_content_release(job.site_code, job.release_uuid))
+
+
+def run_unstage(job, publisher_api, arguments):
+    """ run_unstage """
+    check_response(publisher_api.unset_stage_content_release(job.site_code, job.release_uuid))
+
+
+def run_live(job, publisher_api, arguments):
+    """ run_live """
+    check_response(publisher_api.set_live_content_release(job.site_code, job.release_uuid))
+
+
+def run_copy(job, publisher_api, arguments):
+    """ copy the release, without a version argument the version is derived by the copy """
+    content_release = check_response(publisher_api.copy_content_release(
+        job.site_code, job.release_uuid, arguments.get('title'), arguments.get('version')))
+    return {'release_uuid': content_release.uuid, 'version': content_release.version}
+
+
+def run_compare(job, publisher_api, arguments):
+    """ compare the release to compare_to_release_uuid, the live release by default """
+    compare_to_release_uuid = arguments.get('compare_to_release_uuid')
+    if compare_to_release_uuid is None:
+        compare_to_release_uuid = check_response(
+            publisher_api.get_live_content_release(job.site_code)).uuid
+    set_progress(job, 10)
+    comparison = check_response(publisher_api.compare_content_releases(
+        job.site_code, job.release_uuid, compare_to_release_uuid))
+    return {'compare_to_release_uuid': compare_to_release_uuid, 'comparison': comparison}
+
+
+def get_content_release(job):
+    """ the ContentRelease of the job, raise JobError if it doesn't exist """
+    try:
+        return ContentRelease.objects.get(site_code=job.site_code, uuid=job.release_uuid)
+    except ContentRelease.DoesNotExist:
+        raise JobError(str(ERROR_STATUS_CODE['content_release_does_not_exist']))
+
+
+def run_export(job, publisher_api, arguments):
+    """ export the release to <SNAPSHOTPUBLISHER_JOB_EXPORT_ROOT>/<site_code>/<uuid>.sqlite """
+    root = getattr(settings, 'SNAPSHOTPUBLISHER_JOB_EXPORT_ROOT', None)
+    if root is None:
+        raise JobError('SNAPSHOTPUBLISHER_JOB_EXPORT_ROOT is not defined')
+    content_release = get_content_release(job)
+
+    directory = os.path.join(root, job.site_code)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, '{}.sqlite'.format(job.release_uuid))
+    report = export_content_release(
+        content_release, path, path,
+        progress=lambda done, total: set_progress(job, 99 * done // max(total, 1)),
+    )
+    report['path'] = path
+    return report
+
+
+def run_warm_up(job, publisher_api, arguments):
+    """ load the documents of the release in the document cache """
+    if document_cache.get_cache() is None:
+        raise JobError('SNAPSHOTPUBLISHER_DOCUMENT_CACHE is not defined')
+    return document_cache.warm_up_release(get_content_release(job))
+
+
+def run_static_tree(job, publisher_api, arguments):
+    """ build the static tree of the live release of the site, in
+    <SNAPSHOTPUBLISHER_STATIC_TREE_ROOT>/<site_code> """
+    root = getattr(settings, 'SNAPSHOTPUBLISHER_STATIC_TREE_ROOT', None)
+    if root is None:
+        raise JobError('SNAPSHOTPUBLISHER_STATIC_TREE_ROOT is not defined')
+    report = build_live_static_tree(job.site_code, root)
+    if report is None:
+        raise JobError(str(ERROR_STATUS_CODE['no_content_release_live']))
+    return report
+
+
+JOB_RUNNERS = {
+    'stage': run_stage,
+    'unstage': run_unstage,
+    'live': run_live,
+    'copy': run_copy,
+    'compare': run_compare,
+    'export': run_export,
+    'warm_up': run_warm_up,
+    'static_tree': run_static_tree,
+}
+
+
+def reclaim_stale_jobs():
+    """ fail the running jobs without heartbeat for SNAPSHOTPUBLISHER_JOB_TIMEOUT seconds, their
+    worker was stopped or killed, return the number of jobs failed """
+    now = timezone.now()
+    stale_datetime = now - timedelta(
+        seconds=getattr(settings, 'SNAPSHOTPUBLISHER_JOB_TIMEOUT', 300))
+    return ReleaseJob.objects.filter(
+        Q(heartbeat_datetime__lt=stale_datetime) |
+        Q(heartbeat_datetime__isnull=True, started_datetime__lt=stale_datetime),
+        status=1,
+    ).update(status=3, error='The worker stopped before the end of the job',
+             finished_datetime=now)
+
+
+def claim_job():
+    """ set the oldest pending job running and return it, None if there is no pending job """
+    reclaim_stale_jobs()
+    for job in ReleaseJob.objects.filter(status=0).order_by('id')[:10]:
+        # another worker may have claimed the job since it was read
+        started_datetime = timezone.now()
+        if ReleaseJob.objects.filter(id=job.id, status=0).update(
+                status=1, started_datetime=started_datetime,
+                heartbeat_datetime=started_datetime):
+            job.status = 1
+            job.started_datetime = started_datetime
+            job.heartbeat_datetime = started_datetime
+            return job
+    return None
+
+
+def run_job(job):
+    """ run a claimed job and save its result or error, its heartbeat is saved every
+    SNAPSHOTPUBLISHER_JOB_HEARTBEAT_INTERVAL seconds while it's running """
+    heartbeat = Heartbeat(
+        job, getattr(settings, 'SNAPSHOTPUBLISHER_JOB_HEARTBEAT_INTERVAL', 30))
+    heartbeat.start()
+    try:
+        result = JOB_RUNNERS[job.action](
+            job, PublisherAPI(api_type='django'), json.loads(job.arguments))
+        job.status = 2
+        job.progress = 100
+        job.result = json.dumps(result, cls=LazyEncoder, indent=2)
+    except JobError as error:
+        job.status = 3
+        job.error = str(error)
+    except ValidationError as error:
+        job.status = 3
+        job.error = ' '.join(error.messages)
+    except Exception:  # pylint: disable=broad-except
+        job.status = 3
+        job.error = traceback.format_exc()
+    finally:
+        heartbeat.stop()
+    job.finished_datetime = timezone.now()
+    job.save(update_fields=['status', 'progress', 'result', 'error', 'finished_datetime'])
+    return job
+
+
+def run_worker(max_jobs=None, once=False, sleep=1):
+    """ run the pending jobs one by one, waiting SLEEP seconds for new jobs unless once,
+    return the number of jobs run """
+    count = 0
+    while max_jobs is None or count < max_jobs:
+        job = claim_job()
+        if job is None:
+            if once:
+                break
+            time.sleep(sleep)
+            continue
+        run_job(job)
+        count += 1
+    return count
@@ -0,0 +1,92 @@
+"""
+.. module:: djangosnapshotpublisher.json_path
+   :synopsis: extract fragments of a document_json with dotted JSON paths
+"""
+
+import json
+
+from django.db.models import Func, TextField
+
+
+DATABASE_VENDORS = ['sqlite', 'postgresql']
+
+
+def parse_json_path(path):
+    """ parse a dotted path (eg: 'seo.title' or 'items.0.name') into a list of keys/indexes """
+    if not isinstance(path, str) or not path:
+        raise ValueError(path)
+    parts = []
+    for part in path.split('.'):
+        if not part:
+            raise ValueError(path)
+        parts.append(int(part) if part.isdigit() else part)
+    return parts
+
+
+def extract_json_path(document, parts):
+    """ python fallback, return the fragment at parts or None if it doesn't exist, an index
+    matches the position in an array or the key in an object (like PostgreSQL #>) """
+    value = document
+    for part in parts:
+        if isinstance(value, dict):
+            value = value.get(str(part))
+        elif isinstance(value, list) and isinstance(part, int) and part < len(value):
+            value = value[part]
+        else:
+            return None
+        if value is None:
+            return None
+    return value
+
+
+def get_sqlite_paths(parts):
+    """ the SQLite paths of parts, an index is either a position or a key, at most one of the
+    paths exists in a document """
+    paths = ['$']
+    for part in parts:
+        if isinstance(part, int):
+            paths = [
+                path + suffix for path in paths
+                for suffix in ['[{}]'.format(part), '.{}'.format(json.dumps(str(part)))]
+            ]
+        else:
+            paths = [path + '.{}'.format(json.dumps(part)) for path in paths]
+    return paths
+
+
+def supports_json_path(connection):
+    """ check if JSONPathExtract can be evaluated by the database """
+    return connection.vendor in DATABASE_VENDORS and connection.features.supports_json_field
+
+
+class JSONPathExtract(Func):
+    """ JSONPathExtract, return the fragment at a path as a json encoded string """
+    output_field = TextField()
+
+    def __init__(self, expression, parts, **extra):
+        self.parts = parts
+        super(JSONPathExtract, self).__init__(expression, **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotImplementedError(
+            'JSONPathExtract is only available on {}'.format(', '.join(DATABASE_VENDORS)))
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        """ as_sqlite, the first path which exists in the document """
+        sql, params = compiler.compile(self.source_expressions[0])
+        paths = get_sqlite_paths(self.parts)
+        if len(paths) == 1:
+            return 'JSON_QUOTE(JSON_EXTRACT({}, %s))'.format(sql), list(params) + paths
+        cases = []
+        case_params = []
+        for path in paths:
+            cases.append('WHEN JSON_TYPE({sql}, %s) IS NOT NULL '
+                         'THEN JSON_QUOTE(JSON_EXTRACT({sql}, %s))'.format(sql=sql))
+            case_params += list(params) + [path] + list(params) + [path]
+        return 'CASE {} END'.format(' '.join(cases)), case_params
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        """ as_postgresql, #> looks up an index in an array or as a key in an object """
+        sql, params = compiler.compile(self.source_expressions[0])
+        return '((({})::jsonb #> %s)::text)'.format(sql), \
+            list(params) + [[str(part) for part in self.parts]]
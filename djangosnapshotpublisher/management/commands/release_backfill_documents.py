@@ -0,0 +1,26 @@
+"""
+.. module:: djangosnapshotpublisher.management.commands.release_backfill_documents
+"""
+
+from django.core.management.base import BaseCommand
+
+from djangosnapshotpublisher.backfill import (BACKFILL_BATCH_SIZE,
+                                              backfill_document_hash_and_size)
+
+
+class Command(BaseCommand):
+    """ Command """
+    help = 'Set the document_hash and document_size of the ReleaseDocument without them'
+
+    def add_arguments(self, parser):
+        """ add_arguments """
+        parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE,
+                            help='Number of documents updated per statement')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to wait between two batches')
+
+    def handle(self, *args, **options):
+        """ handle """
+        count = backfill_document_hash_and_size(options['batch_size'], options['sleep'])
+        self.stdout.write('Set the document_hash and document_size of {} ReleaseDocument'.format(
+            count))
@@ -0,0 +1,44 @@
+"""
+.. module:: djangosnapshotpublisher.management.commands.release_build_static_tree
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangosnapshotpublisher.models import ContentRelease
+from djangosnapshotpublisher.static_tree import build_static_tree
+
+
+class Command(BaseCommand):
+    """ Command """
+    help = 'Write the documents of the live ContentRelease to a directory tree'
+
+    def add_arguments(self, parser):
+        """ add_arguments """
+        parser.add_argument('site_code')
+        parser.add_argument('root', help='Directory of the tree, ROOT/current is the live tree')
+        parser.add_argument('--gzip', action='store_true', help='Also write .json.gz files')
+        parser.add_argument('--workers', type=int, default=4, help='Number of writer threads')
+
+    def handle(self, *args, **options):
+        """ handle """
+        try:
+            content_release = ContentRelease.objects.get(
+                site_code=options['site_code'],
+                status=2,
+                is_live=True,
+            )
+        except ContentRelease.DoesNotExist:
+            raise CommandError('There is no live ContentRelease')
+
+        report = build_static_tree(
+            content_release,
+            options['root'],
+            compress=options['gzip'],
+            workers=options['workers'],
+        )
+        self.stdout.write('Built {}: {} ReleaseDocument, {} written, {} skipped'.format(
+            report['path'],
+            report['release_documents'],
+            report['written'],
+            report['skipped'],
+        ))
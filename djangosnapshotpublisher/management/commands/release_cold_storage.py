@@ -0,0 +1,36 @@
+"""
+.. module:: djangosnapshotpublisher.management.commands.release_cold_storage
+"""
+
+from django.core.management.base import BaseCommand
+
+from djangosnapshotpublisher.tiering import archive_content_releases
+
+
+class Command(BaseCommand):
+    """ Command """
+    help = 'Move the documents of old archived ContentRelease to cold storage bundles'
+
+    def add_arguments(self, parser):
+        """ add_arguments """
+        parser.add_argument(
+            '--days', type=int, default=90,
+            help='Move the releases archived for more than DAYS days',
+        )
+        parser.add_argument('--site-code', default=None, help='Only apply to this site')
+        parser.add_argument(
+            '--dry-run', action='store_true', help='Only report what would be moved',
+        )
+
+    def handle(self, *args, **options):
+        """ handle """
+        report = archive_content_releases(
+            options['days'],
+            site_code=options['site_code'],
+            dry_run=options['dry_run'],
+        )
+        self.stdout.write('{}{} ReleaseDocument from {} ContentRelease'.format(
+            'Dry run: ' if options['dry_run'] else 'Moved ',
+            report['release_documents'],
+            report['content_releases'],
+        ))
@@ -0,0 +1,54 @@
+"""
+.. module:: djangosnapshotpublisher.management.commands.release_export_sqlite
+"""
+
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangosnapshotpublisher.models import ContentRelease
+from djangosnapshotpublisher.sqlite_export import export_content_release
+
+
+class Command(BaseCommand):
+    """ Command """
+    help = 'Export a ContentRelease (the live one by default) to a SQLite bundle'
+
+    def add_arguments(self, parser):
+        """ add_arguments """
+        parser.add_argument('site_code')
+        parser.add_argument('output', help='Path of the SQLite bundle')
+        parser.add_argument('--release-uuid', default=None, help='Release to export')
+        parser.add_argument(
+            '--previous', default=None,
+            help='Bundle to start from, only the changed documents are written '
+                 '(default: the output if it exists)',
+        )
+
+    def handle(self, *args, **options):
+        """ handle """
+        try:
+            if options['release_uuid']:
+                content_release = ContentRelease.objects.get(
+                    site_code=options['site_code'],
+                    uuid=options['release_uuid'],
+                )
+            else:
+                content_release = ContentRelease.objects.get(
+                    site_code=options['site_code'],
+                    status=2,
+                    is_live=True,
+                )
+        except ContentRelease.DoesNotExist:
+            raise CommandError('ContentRelease doesn\'t exists')
+
+        previous = options['previous']
+        if previous is None and os.path.exists(options['output']):
+            previous = options['output']
+
+        report = export_content_release(content_release, options['output'], previous)
+        self.stdout.write('Exported {} ReleaseDocument ({} changed, {} removed)'.format(
+            report['release_documents'],
+            report['changed'],
+            report['removed'],
+        ))
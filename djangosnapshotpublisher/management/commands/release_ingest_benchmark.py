@@ -0,0 +1,72 @@
+"""
+.. module:: djangosnapshotpublisher.management.commands.release_ingest_benchmark
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+
+from djangosnapshotpublisher.ingest import (INGEST_BATCH_SIZE, METHODS, get_default_method,
+                                            ingest_documents)
+from djangosnapshotpublisher.models import ContentRelease, ReleaseDocument
+
+
+class Rollback(Exception):
+    """ Rollback, the benchmark data is not kept """
+
+
+def generate_documents(count, parameters):
+    """ generate_documents """
+    for index in range(count):
+        yield {
+            'document_key': 'benchmark-{}'.format(index),
+            'content_type': 'benchmark',
+            'document_json': json.dumps({'index': index, 'body': 'x' * 500}),
+            'parameters': {
+                'p{}'.format(parameter): str(index) for parameter in range(parameters)
+            },
+        }
+
+
+class Command(BaseCommand):
+    """ Command """
+    help = 'Compare the documents per second of the ingest methods, nothing is kept'
+
+    def add_arguments(self, parser):
+        """ add_arguments """
+        parser.add_argument('--documents', type=int, default=100000)
+        parser.add_argument('--parameters', type=int, default=2,
+                            help='Number of extra parameters per document')
+        parser.add_argument('--method', action='append', dest='methods', choices=METHODS,
+                            help='Method to benchmark (repeatable, default: all available)')
+        parser.add_argument('--batch-size', type=int, default=INGEST_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        """ handle """
+        connection = connections[router.db_for_write(ReleaseDocument)]
+        methods = options['methods'] or (
+            METHODS if get_default_method(connection) == 'copy' else ['bulk_create'])
+        for method in methods:
+            try:
+                with transaction.atomic():
+                    content_release = ContentRelease.objects.create(
+                        site_code='benchmark', title='ingest benchmark')
+                    report = ingest_documents(
+                        content_release,
+                        generate_documents(options['documents'], options['parameters']),
+                        method=method,
+                        batch_size=options['batch_size'],
+                    )
+                    raise Rollback
+            except Rollback:
+                pass
+            except ValueError as error:
+                raise CommandError(str(error))
+            self.stdout.write('{}: {} documents, {} parameters in {:.3f}s, {:.0f} rows/s'.format(
+                method,
+                report['documents'],
+                report['parameters'],
+                report['seconds'],
+                (report['documents'] * 2 + report['parameters']) / max(report['seconds'], 1e-6),
+            ))
@@ -0,0 +1,50 @@
+"""
+.. module:: djangosnapshotpublisher.management.commands.release_jobs
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangosnapshotpublisher.jobs import run_worker
+
+
+def set_resource_limits(memory=None, cpu=None):
+    """ limit the memory (MB) and the cpu time (seconds) of the worker process, for all the
+    jobs it runs """
+    try:
+        import resource  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        raise CommandError('--memory-limit and --cpu-limit are not available on this platform')
+    if memory:
+        resource.setrlimit(resource.RLIMIT_AS, (memory * 1024 * 1024, memory * 1024 * 1024))
+    if cpu:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))
+
+
+class Command(BaseCommand):
+    """ Command """
+    help = 'Run the ReleaseJob enqueued from the admin'
+
+    def add_arguments(self, parser):
+        """ add_arguments """
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when there is no pending job instead of waiting')
+        parser.add_argument('--max-jobs', type=int, default=None,
+                            help='Exit after MAX_JOBS jobs, eg: to restart the worker')
+        parser.add_argument('--sleep', type=float, default=1,
+                            help='Seconds between two checks for new jobs')
+        parser.add_argument('--memory-limit', type=int, default=None,
+                            help='Maximum memory of the worker process in MB')
+        parser.add_argument('--cpu-limit', type=int, default=None,
+                            help='Maximum cpu time of the worker process in seconds, for all '
+                                 'its jobs')
+
+    def handle(self, *args, **options):
+        """ handle """
+        if options['memory_limit'] or options['cpu_limit']:
+            set_resource_limits(options['memory_limit'], options['cpu_limit'])
+        count = run_worker(
+            max_jobs=options['max_jobs'],
+            once=options['once'],
+            sleep=options['sleep'],
+        )
+        self.stdout.write('Ran {} ReleaseJob'.format(count))
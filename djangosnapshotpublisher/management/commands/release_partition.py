@@ -0,0 +1,41 @@
+"""
+.. module:: djangosnapshotpublisher.management.commands.release_partition
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangosnapshotpublisher.models import ContentRelease
+from djangosnapshotpublisher.partitioning import (BACKFILL_BATCH_SIZE, backfill_site_code,
+                                                  partition_table)
+
+
+class Command(BaseCommand):
+    """ Command """
+    help = 'Partition the ReleaseDocument table by site_code (PostgreSQL)'
+
+    def add_arguments(self, parser):
+        """ add_arguments """
+        parser.add_argument('--site-code', action='append', dest='site_codes',
+                            help='Only create the partition of this site (repeatable)')
+        parser.add_argument('--backfill-only', action='store_true',
+                            help='Only set the site_code of the existing documents')
+        parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE,
+                            help='Number of documents updated per transaction')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to wait between two batches')
+
+    def handle(self, *args, **options):
+        """ handle """
+        count = backfill_site_code(options['batch_size'], options['sleep'])
+        self.stdout.write('Set the site_code of {} ReleaseDocument'.format(count))
+        if options['backfill_only']:
+            return
+
+        site_codes = options['site_codes'] or list(ContentRelease.objects.order_by(
+            'site_code').values_list('site_code', flat=True).distinct())
+        try:
+            site_codes = partition_table(site_codes)
+        except ValueError as error:
+            raise CommandError(str(error))
+        self.stdout.write('Created {} partition(s): {}'.format(
+            len(site_codes), ', '.join(site_codes)))
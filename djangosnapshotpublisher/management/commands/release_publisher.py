@@ -3,6 +3,7 @@
 """
 
 from django.core.management.base import BaseCommand
+from django.utils import timezone
 
 from djangosnapshotpublisher.models import ContentRelease
 from djangosnapshotpublisher.publisher_api import PublisherAPI
@@ -14,7 +15,9 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         """ handle """
-        site_codes = ContentRelease.objects.values_list('site_code', flat=True).distinct()
+        site_codes = ContentRelease.objects.scheduled().filter(
+            publish_datetime__lt=timezone.now(),
+        ).order_by().values_list('site_code', flat=True).distinct()
         for site_code in site_codes:
             publisher_api = PublisherAPI(api_type='django')
             publisher_api.get_live_content_release(site_code)
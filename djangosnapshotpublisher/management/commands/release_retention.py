@@ -0,0 +1,58 @@
+"""
+.. module:: djangosnapshotpublisher.management.commands.release_retention
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangosnapshotpublisher.retention import apply_retention
+
+
+class Command(BaseCommand):
+    """ Command """
+    help = 'Remove archived ContentRelease out of the retention policy and orphan ReleaseDocument'
+
+    def add_arguments(self, parser):
+        """ add_arguments """
+        parser.add_argument(
+            '--keep', type=int, default=None,
+            help='Keep the last KEEP archived releases for each site',
+        )
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help='Keep the archived releases published in the last DAYS days',
+        )
+        parser.add_argument('--site-code', default=None, help='Only apply to this site')
+        parser.add_argument(
+            '--batch-size', type=int, default=500, help='Number of rows deleted per transaction',
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0.1, help='Seconds to wait between two batches',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true', help='Only report what would be removed',
+        )
+
+    def handle(self, *args, **options):
+        """ handle """
+        if options['keep'] is None and options['days'] is None:
+            raise CommandError('--keep and/or --days must be defined')
+
+        report = apply_retention(
+            keep=options['keep'],
+            days=options['days'],
+            site_code=options['site_code'],
+            batch_size=options['batch_size'],
+            sleep=options['sleep'],
+            dry_run=options['dry_run'],
+        )
+        self.stdout.write(
+            '{}{} ContentRelease, {} ReleaseDocument, {} bytes reclaimable'.format(
+                'Dry run: ' if options['dry_run'] else 'Removed ',
+                report['content_releases'],
+                report['release_documents'],
+                report['reclaimable_bytes'],
+            )
+        )
+        if report['bundles']:
+            self.stdout.write('{}{} cold storage bundle(s)'.format(
+                'Dry run: ' if options['dry_run'] else 'Removed ', report['bundles']))
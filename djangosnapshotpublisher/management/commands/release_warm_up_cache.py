@@ -0,0 +1,52 @@
+"""
+.. module:: djangosnapshotpublisher.management.commands.release_warm_up_cache
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangosnapshotpublisher.document_cache import get_cache, warm_up_content_release
+from djangosnapshotpublisher.models import ContentRelease
+
+
+class Command(BaseCommand):
+    """ Command """
+    help = 'Load the documents of the staged or live ContentRelease in the document cache'
+
+    def add_arguments(self, parser):
+        """ add_arguments """
+        parser.add_argument('site_code')
+        parser.add_argument('--stage', action='store_true',
+                            help='Warm up the staged release before it goes live')
+        parser.add_argument('--top', type=int, help='Only the TOP most read documents')
+        parser.add_argument('--workers', type=int, default=4, help='Number of writer threads')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        """ handle """
+        if get_cache() is None:
+            raise CommandError('SNAPSHOTPUBLISHER_DOCUMENT_CACHE is not defined')
+        try:
+            if options['stage']:
+                content_release = ContentRelease.objects.stage(options['site_code'])
+            else:
+                content_release = ContentRelease.objects.get(
+                    site_code=options['site_code'],
+                    status=2,
+                    is_live=True,
+                )
+        except ContentRelease.DoesNotExist:
+            raise CommandError('There is no {} ContentRelease'.format(
+                'stage' if options['stage'] else 'live'))
+
+        report = warm_up_content_release(
+            content_release,
+            top=options['top'],
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write('Warmed up {}/{} ReleaseDocument ({:.0%}) in {:.3f}s'.format(
+            report['warmed'],
+            report['release_documents'],
+            report['coverage'],
+            report['seconds'],
+        ))
@@ -2,16 +2,20 @@
 .. module:: djangosnapshotpublisher.manager
    :synopsis: djangosnapshotpublisher manager
 """
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
+from .signals import content_release_live
+from .tracing import traced
+
 
 class ContentReleaseManager(models.Manager):
     """ ContentReleaseManager """
 
+    @traced('ContentReleaseManager.stage')
     def stage(self, site_code):
         """ stage """
-        return self.get_queryset().get(is_stage=True)
+        return self.get_queryset().get(site_code=site_code, is_stage=True)
 
     #     self.model.copy_document_stage_releases(site_code)
     #     stage_content_release = self.get_queryset().filter(
@@ -38,6 +42,7 @@ class ContentReleaseManager(models.Manager):
             
     #     ).exists()
 
+    @traced('ContentReleaseManager.live')
     def live(self, site_code):
         """ live """
         # current_live_release = None
@@ -51,26 +56,31 @@ class ContentReleaseManager(models.Manager):
         #     pass
 
         try:
-            stage_content_release_ready = self.get_queryset().get(
-                site_code=site_code,
-                status=1,
-                is_stage=True,
-                publish_datetime__lt=timezone.now(),
-            )
-            stage_content_release_ready.is_live = True
-            stage_content_release_ready.is_stage = False
-            stage_content_release_ready.status = 2
-            stage_content_release_ready.save()
-            current_live_release = self.get_queryset().filter(
-                site_code=site_code,
-                status=2,
-                is_live=True,
-            )
-            if current_live_release.exists():
-                current_live_release.is_live = False
-                current_live_release.status = 3
-                current_live_release.save()
-            current_live_release = stage_content_release_ready
+            with transaction.atomic():
+                stage_content_release_ready = self.get_queryset().get(
+                    site_code=site_code,
+                    status=1,
+                    is_stage=True,
+                    publish_datetime__lt=timezone.now(),
+                )
+                current_live_release = self.get_queryset().filter(
+                    site_code=site_code,
+                    status=2,
+                    is_live=True,
+                ).first()
+                stage_content_release_ready.is_live = True
+                stage_content_release_ready.is_stage = False
+                stage_content_release_ready.status = 2
+                stage_content_release_ready.save()
+                if current_live_release:
+                    current_live_release.is_live = False
+                    current_live_release.status = 3
+                    current_live_release.save()
+                content_release_live.send(
+                    sender=self.model,
+                    content_release=stage_content_release_ready,
+                    previous_content_release=current_live_release,
+                )
         except self.model.DoesNotExist:
             pass
 
@@ -81,6 +91,15 @@ class ContentReleaseManager(models.Manager):
         )
 
 
+    def scheduled(self, site_code=None):
+        """ staged releases with a publish_datetime, set live by live() once it's passed, the
+        next to go live first """
+        queryset = self.get_queryset().filter(
+            status=1, is_stage=True, publish_datetime__isnull=False)
+        if site_code is not None:
+            queryset = queryset.filter(site_code=site_code)
+        return queryset.order_by('publish_datetime')
+
     def archived(self, site_code):
         """ archived """
         # self.model.copy_document_live_releases(site_code)
@@ -115,3 +134,32 @@ class ContentReleaseManager(models.Manager):
     #         uuid=uuid,
     #         publish_datetime__lt=timezone.now(),
     #     ).exists()
+
+
+class ReleaseDocumentQuerySet(models.QuerySet):
+    """ ReleaseDocumentQuerySet """
+
+    def __init__(self, *args, **kwargs):
+        super(ReleaseDocumentQuerySet, self).__init__(*args, **kwargs)
+        self._load_document_json = False
+
+    def _clone(self):
+        clone = super(ReleaseDocumentQuerySet, self)._clone()
+        clone._load_document_json = self._load_document_json
+        return clone
+
+    def _fetch_all(self):
+        loaded = self._result_cache is not None
+        super(ReleaseDocumentQuerySet, self)._fetch_all()
+        if self._load_document_json and not loaded:
+            for release_document in self._result_cache:
+                if isinstance(release_document, self.model):
+                    release_document.load_document_json()
+
+    def load_document_json(self):
+        """ the documents stored as a patch or in cold storage are fetched with their full
+        document_json """
+        clone = self._chain()
+        clone._load_document_json = True
+        return clone
+
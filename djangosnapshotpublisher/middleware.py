@@ -0,0 +1,29 @@
+"""
+.. module:: djangosnapshotpublisher.middleware
+   :synopsis: djangosnapshotpublisher middleware
+"""
+
+from .identity_map import release_scope
+from .invalidation import poll
+
+
+class InvalidationMiddleware:
+    """ InvalidationMiddleware, receive the changes from the other processes before a request """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        poll()
+        return self.get_response(request)
+
+
+class IdentityMapMiddleware:
+    """ IdentityMapMiddleware, memoize the ContentRelease lookups during a request """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with release_scope():
+            return self.get_response(request)
@@ -0,0 +1,29 @@
+# Generated by Django 3.1.14 on 2026-10-19 10:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangosnapshotpublisher', '0009_auto_20201019_0929'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='releasedocument',
+            name='delta_base',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='delta_documents', to='djangosnapshotpublisher.releasedocument'),
+        ),
+        migrations.AddField(
+            model_name='releasedocument',
+            name='delta_depth',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='releasedocument',
+            name='document_delta',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-19 10:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangosnapshotpublisher', '0010_releasedocument_delta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='releasedocument',
+            name='cold_storage_bundle',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.1.14 on 2026-10-19 10:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangosnapshotpublisher', '0011_releasedocument_cold_storage_bundle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReleaseChangeEvent',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('site_code', models.SlugField(db_index=False, max_length=100)),
+                ('release_uuid', models.UUIDField()),
+                ('action', models.CharField(max_length=50)),
+                ('content_type', models.CharField(blank=True, max_length=100, null=True)),
+                ('document_key', models.CharField(blank=True, max_length=250, null=True)),
+                ('created_datetime', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='releasechangeevent',
+            index=models.Index(fields=['site_code', 'seq'], name='release_change_site_seq'),
+        ),
+    ]
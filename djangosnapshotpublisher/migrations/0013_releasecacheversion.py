@@ -0,0 +1,24 @@
+# Generated by Django 3.1.14 on 2026-10-19 10:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangosnapshotpublisher', '0012_releasechangeevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReleaseCacheVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('site_code', models.SlugField(db_index=False, max_length=100)),
+                ('release_uuid', models.UUIDField()),
+            ],
+            options={
+                'unique_together': {('site_code', 'release_uuid')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-19 10:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangosnapshotpublisher', '0013_releasecacheversion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='releasechangeevent',
+            index=models.Index(fields=['release_uuid', 'seq'], name='release_change_release_seq'),
+        ),
+    ]
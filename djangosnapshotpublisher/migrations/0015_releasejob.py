@@ -0,0 +1,35 @@
+# Generated by Django 3.1.14 on 2026-10-19 10:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangosnapshotpublisher', '0014_releasechangeevent_release_seq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReleaseJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('stage', 'Stage'), ('unstage', 'Unstage'), ('live', 'Go live'), ('copy', 'Copy'), ('compare', 'Compare to live'), ('export', 'Export to SQLite')], max_length=50)),
+                ('site_code', models.SlugField(db_index=False, max_length=100)),
+                ('release_uuid', models.UUIDField()),
+                ('arguments', models.TextField(default='{}')),
+                ('status', models.IntegerField(choices=[(0, 'PENDING'), (1, 'RUNNING'), (2, 'DONE'), (3, 'FAILED')], default=0)),
+                ('progress', models.IntegerField(default=0)),
+                ('result', models.TextField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_by', models.CharField(blank=True, max_length=150, null=True)),
+                ('created_datetime', models.DateTimeField(auto_now_add=True)),
+                ('started_datetime', models.DateTimeField(blank=True, null=True)),
+                ('finished_datetime', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='releasejob',
+            index=models.Index(fields=['status', 'id'], name='release_job_status'),
+        ),
+    ]
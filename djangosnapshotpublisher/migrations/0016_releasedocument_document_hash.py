@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-19 10:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangosnapshotpublisher', '0015_releasejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='releasedocument',
+            name='document_hash',
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.1.14 on 2026-10-19 10:33
+
+from django.db import migrations, models
+
+
+def set_version_key(apps, schema_editor):
+    """ set_version_key, same as djangosnapshotpublisher.models.get_version_key """
+    ContentRelease = apps.get_model('djangosnapshotpublisher', 'ContentRelease')
+    for content_release_id, version in ContentRelease.objects.exclude(
+            version=None).values_list('id', 'version').iterator():
+        ContentRelease.objects.filter(id=content_release_id).update(
+            version_key='.'.join(number.zfill(20) for number in version.split('.')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangosnapshotpublisher', '0016_releasedocument_document_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contentrelease',
+            name='version_key',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True),
+        ),
+        migrations.RunPython(set_version_key, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='contentrelease',
+            index=models.Index(fields=['site_code', 'status', 'version_key'], name='content_release_version'),
+        ),
+    ]
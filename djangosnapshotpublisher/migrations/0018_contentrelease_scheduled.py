@@ -0,0 +1,21 @@
+# Generated by Django 3.1.14 on 2026-10-19 10:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangosnapshotpublisher', '0017_contentrelease_version_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contentrelease',
+            index=models.Index(condition=models.Q(status=1), fields=['publish_datetime'], name='content_release_scheduled'),
+        ),
+        migrations.AddIndex(
+            model_name='contentrelease',
+            index=models.Index(condition=models.Q(status=1), fields=['site_code', 'publish_datetime'], name='content_release_site_scheduled'),
+        ),
+    ]
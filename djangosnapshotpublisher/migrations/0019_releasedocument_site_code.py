@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-19 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangosnapshotpublisher', '0018_contentrelease_scheduled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='releasedocument',
+            name='site_code',
+            field=models.SlugField(blank=True, db_index=False, default='', max_length=100),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.1.14 on 2026-10-19 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangosnapshotpublisher', '0019_releasedocument_site_code'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='releasedocument',
+            name='document_size',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='releasedocument',
+            index=models.Index(fields=['content_type', 'document_key'], name='release_document_key', opclasses=['varchar_pattern_ops', 'varchar_pattern_ops']),
+        ),
+    ]
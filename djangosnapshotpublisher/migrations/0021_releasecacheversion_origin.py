@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-19 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangosnapshotpublisher', '0020_releasedocument_document_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='releasecacheversion',
+            name='origin',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
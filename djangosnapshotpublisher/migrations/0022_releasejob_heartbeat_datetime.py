@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-19 10:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangosnapshotpublisher', '0021_releasecacheversion_origin'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='releasejob',
+            name='heartbeat_datetime',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.1.14 on 2026-10-19 11:16
+
+from django.db import migrations, models
+import djangosnapshotpublisher.indexes
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangosnapshotpublisher', '0022_releasejob_heartbeat_datetime'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='releasedocument',
+            name='release_document_key',
+        ),
+        migrations.AddIndex(
+            model_name='releasedocument',
+            index=models.Index(fields=['content_type', 'document_key'], name='release_document_key'),
+        ),
+        migrations.AddIndex(
+            model_name='releasedocument',
+            index=djangosnapshotpublisher.indexes.BinaryOrderIndex(fields=['content_type', 'document_key'], name='release_document_key_c'),
+        ),
+    ]
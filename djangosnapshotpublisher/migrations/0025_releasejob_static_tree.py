@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-19 11:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangosnapshotpublisher', '0024_releasejob_warm_up'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='releasejob',
+            name='action',
+            field=models.CharField(choices=[('stage', 'Stage'), ('unstage', 'Unstage'), ('live', 'Go live'), ('copy', 'Copy'), ('compare', 'Compare to live'), ('export', 'Export to SQLite'), ('warm_up', 'Warm up the document cache'), ('static_tree', 'Build the static tree of the live release')], max_length=50),
+        ),
+    ]
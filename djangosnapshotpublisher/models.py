@@ -6,14 +6,22 @@ import re
 import uuid
 
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
 from django.forms.models import model_to_dict
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
-from .manager import ContentReleaseManager
+from .cold_storage import get_cold_document_json
+from .delta import materialize_delta_documents, resolve_document_json
+from .indexes import BinaryOrderIndex
+from .manager import ContentReleaseManager, ReleaseDocumentQuerySet
+from .tracing import span, traced
 
 
+COPY_BATCH_SIZE = 1000
+
 CONTENT_RELEASE_STATUS = (
     (0, 'PREVIEW'),
     (1, 'STAGED'),
@@ -21,6 +29,27 @@ CONTENT_RELEASE_STATUS = (
     (3, 'ARCHIVED'),
 )
 
+VERSION_KEY_WIDTH = 20
+
+RELEASE_JOB_STATUS = (
+    (0, 'PENDING'),
+    (1, 'RUNNING'),
+    (2, 'DONE'),
+    (3, 'FAILED'),
+)
+
+RELEASE_JOB_ACTIONS = (
+    ('stage', 'Stage'),
+    ('unstage', 'Unstage'),
+    ('live', 'Go live'),
+    ('copy', 'Copy'),
+    ('compare', 'Compare to live'),
+    ('export', 'Export to SQLite'),
+    ('warm_up', 'Warm up the document cache'),
+    ('static_tree', 'Build the static tree of the live release'),
+)
+
+
 def valide_version(value):
     """ valide_version """
     match_version = re.match(r'^([0-9])+(\.[0-9]+)*$', value)
@@ -41,6 +70,18 @@ def valide_version(value):
     return True
 
 
+def get_version_key(version):
+    """ version sortable as a string, each number zero-padded: 9.0 < 10.0 """
+    return '.'.join(number.zfill(VERSION_KEY_WIDTH) for number in version.split('.'))
+
+
+def get_next_version(version):
+    """ the version with its last number incremented: 1.9 -> 1.10 """
+    numbers = version.split('.')
+    numbers[-1] = str(int(numbers[-1]) + 1)
+    return '.'.join(numbers)
+
+
 class ReleaseDocumentExtraParameter(models.Model):
     """ ReleaseDocumentExtraParameter """
     key = models.SlugField(max_length=255)
@@ -67,17 +108,63 @@ class ReleaseDocument(models.Model):
     content_type = models.CharField(max_length=100, default='content')
     document_json = models.TextField(null=True)
     deleted = models.BooleanField(default=False)
+    document_delta = models.TextField(null=True, blank=True)
+    delta_base = models.ForeignKey(
+        'ReleaseDocument',
+        blank=True,
+        null=True,
+        on_delete=models.DO_NOTHING,
+        related_name='delta_documents',
+    )
+    delta_depth = models.PositiveSmallIntegerField(default=0)
+    cold_storage_bundle = models.CharField(max_length=255, blank=True, null=True)
+    document_hash = models.CharField(max_length=40, blank=True, null=True)
+    document_size = models.PositiveIntegerField(blank=True, null=True)
+    site_code = models.SlugField(max_length=100, blank=True, default='', db_index=False)
+
+    objects = ReleaseDocumentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['content_type', 'document_key'], name='release_document_key'),
+            # the pages of list_documents_in_content_release, ordered by BinaryOrder
+            BinaryOrderIndex(fields=['content_type', 'document_key'],
+                             name='release_document_key_c'),
+        ]
 
     def __str__(self):
         return '{} - {}'.format(self.content_type, self.document_key)
 
+    def get_document_json(self):
+        """ get_document_json """
+        with span('document_resolution'):
+            if self.cold_storage_bundle:
+                return get_cold_document_json(self)
+            return resolve_document_json(self)
+
+    def load_document_json(self):
+        """ set the full document_json of a document stored as a patch or in cold storage,
+        the instance must not be saved afterwards """
+        if self.document_json is None and (self.delta_base_id or self.cold_storage_bundle):
+            self.document_json = self.get_document_json()
+        return self
+
     def to_dict(self):
         """ to_dict """
-        instance_dict = model_to_dict(self)
+        instance_dict = model_to_dict(self, exclude=[
+            'document_delta', 'delta_base', 'delta_depth', 'cold_storage_bundle',
+            'document_hash', 'document_size', 'site_code'])
+        instance_dict['document_json'] = self.get_document_json()
         instance_dict.pop('id')
         return instance_dict
 
 
+@receiver(pre_delete, sender=ReleaseDocument)
+def release_document_pre_delete(sender, instance, **kwargs):
+    """ keep the documents stored as a patch against instance readable """
+    materialize_delta_documents(instance)
+
+
 class ContentReleaseExtraParameter(models.Model):
     """ ContentReleaseExtraParameter """
     key = models.SlugField(max_length=255)
@@ -103,6 +190,7 @@ class ContentRelease(models.Model):
     """ ContentRelease """
     uuid = models.UUIDField(max_length=255, unique=True, default=uuid.uuid4)
     version = models.CharField(max_length=20, blank=True, null=True,)
+    version_key = models.CharField(max_length=255, blank=True, null=True, editable=False)
     title = models.CharField(max_length=100)
     site_code = models.SlugField(max_length=100)
     status = models.IntegerField(choices=CONTENT_RELEASE_STATUS, default=0)
@@ -124,22 +212,27 @@ class ContentRelease(models.Model):
 
     objects = ContentReleaseManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['site_code', 'status', 'version_key'],
+                         name='content_release_version'),
+            models.Index(fields=['publish_datetime'], name='content_release_scheduled',
+                         condition=models.Q(status=1)),
+            models.Index(fields=['site_code', 'publish_datetime'],
+                         name='content_release_site_scheduled', condition=models.Q(status=1)),
+        ]
+
     def __str__(self):
         return self.title
 
     def save(self, *args, **kwargs):
         """ save """
+        self.version_key = get_version_key(self.version) if self.version else None
         if self.version and self.status not in [2, 3] and valide_version(self.version):
             is_version_conflict = self.__class__.objects.filter(
                 site_code=self.site_code,
                 status__in=[1, 2, 3],
-                version__gte=self.version,
-            ).exclude(id=self.id)
-
-            is_version_conflict = self.__class__.objects.filter(
-                site_code=self.site_code,
-                status__in=[1, 2, 3],
-                version__gte=self.version,
+                version_key__gte=self.version_key,
             ).exclude(id=self.id).exists()
 
             if is_version_conflict:
@@ -173,15 +266,26 @@ class ContentRelease(models.Model):
 
     def to_dict(self):
         """ to_dict """
-        instance_dict = model_to_dict(self)
+        # the documents are not loaded
+        instance_dict = model_to_dict(self, exclude=['release_documents'])
         instance_dict['uuid'] = self.uuid
         instance_dict['status'] = self.get_status_display()
-        instance_dict.pop('release_documents')
         instance_dict.pop('is_live')
         instance_dict.pop('is_stage')
         instance_dict.pop('id')
         return instance_dict
 
+    def get_base_release(self):
+        """ get_base_release """
+        if self.use_current_live_as_base_release:
+            return self.__class__.objects.filter(
+                site_code=self.site_code,
+                status=2,
+                is_live=True,
+            ).exclude(id=self.id).first()
+        return self.base_release
+
+    @traced('ContentRelease.copy_document_release_ref_from_baserelease')
     def copy_document_release_ref_from_baserelease(self):
         """ copy_document_release_ref_from_baserelease """
         if self.use_current_live_as_base_release:
@@ -195,7 +299,11 @@ class ContentRelease(models.Model):
                 pass
 
         try:
-            self.base_release = self.__class__.objects.get(is_live=True, status=2)
+            self.base_release = self.__class__.objects.get(
+                site_code=self.site_code,
+                is_live=True,
+                status=2,
+            )
             for release_document in self.base_release.release_documents.all():
                 try:
                     ReleaseDocument.objects.get(
@@ -237,6 +345,7 @@ class ContentRelease(models.Model):
         self.status = 1
         self.save()
 
+    @traced('ContentRelease.remove_document_release_ref_from_baserelease')
     def remove_document_release_ref_from_baserelease(self):
         """ remove_document_release_ref_from_baserelease """
         if self.base_release:
@@ -266,28 +375,123 @@ class ContentRelease(models.Model):
         self.status = 0
         self.save()
 
+    @traced('ContentRelease.copy')
     def copy(self, overide_data=None):
-        """ copy """
-        data = model_to_dict(self, exclude=['id', 'uuid', ])
-        release_documents = data.pop('release_documents')
+        """ copy, without a version in overide_data a conflicting version is replaced by
+        the next version of the biggest staged, live or archived release """
+        data = model_to_dict(self, exclude=['id', 'uuid', 'release_documents'])
+        # the base release of use_current_live_as_base_release is set when staging
+        data['base_release'] = None if self.use_current_live_as_base_release \
+            else self.base_release
 
         # overide_data
         if overide_data and isinstance(overide_data, dict):
             data.update(overide_data)
 
-        new_release = ContentRelease(**data)
-        new_release.save()
-
-        # release_documents
-        for release_document in release_documents:
-            new_release.release_documents.add(release_document)
+        if 'version' not in (overide_data or {}) and data['version'] and \
+                data['status'] not in [2, 3]:
+            last_version = self.__class__.objects.filter(
+                site_code=self.site_code,
+                status__in=[1, 2, 3],
+                version_key__gte=get_version_key(data['version']),
+            ).order_by('-version_key').values_list('version', flat=True).first()
+            if last_version:
+                data['version'] = get_next_version(last_version)
+
+        with transaction.atomic():
+            new_release = ContentRelease(**data)
+            new_release.save()
+
+            # release_documents, copy the m2m rows with a single INSERT ... SELECT
+            through = self.release_documents.through
+            connection = connections[router.db_for_write(through)]
+            release_column = connection.ops.quote_name(
+                through._meta.get_field('contentrelease').column)
+            document_column = connection.ops.quote_name(
+                through._meta.get_field('releasedocument').column)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'INSERT INTO {table} ({release_column}, {document_column}) '
+                    'SELECT %s, {document_column} FROM {table} WHERE {release_column} = %s'.format(
+                        table=connection.ops.quote_name(through._meta.db_table),
+                        release_column=release_column,
+                        document_column=document_column,
+                    ),
+                    [new_release.id, self.id],
+                )
 
-        # extra_parameter
-        extra_parameters = ContentReleaseExtraParameter.objects.filter(content_release=self)
-        for extra_parameter in extra_parameters:
-            extra_parameter_data = model_to_dict(extra_parameter, exclude=['id', 'content_release'])
-            new_extra_parameter = ContentReleaseExtraParameter(**extra_parameter_data)
-            new_extra_parameter.content_release = new_release
-            new_extra_parameter.save()
+            # extra_parameter
+            ContentReleaseExtraParameter.objects.bulk_create([
+                ContentReleaseExtraParameter(
+                    key=extra_parameter['key'],
+                    content=extra_parameter['content'],
+                    content_release=new_release,
+                ) for extra_parameter in ContentReleaseExtraParameter.objects.filter(
+                    content_release=self).values('key', 'content').iterator()
+            ], batch_size=COPY_BATCH_SIZE)
 
         return new_release
+
+
+class ReleaseChangeEvent(models.Model):
+    """ ReleaseChangeEvent """
+    seq = models.BigAutoField(primary_key=True)
+    site_code = models.SlugField(max_length=100, db_index=False)
+    release_uuid = models.UUIDField()
+    action = models.CharField(max_length=50)
+    content_type = models.CharField(max_length=100, blank=True, null=True)
+    document_key = models.CharField(max_length=250, blank=True, null=True)
+    created_datetime = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['site_code', 'seq'], name='release_change_site_seq'),
+            models.Index(fields=['release_uuid', 'seq'], name='release_change_release_seq'),
+        ]
+
+    def to_dict(self):
+        """ to_dict """
+        return {
+            'seq': self.seq,
+            'site_code': self.site_code,
+            'release_uuid': self.release_uuid,
+            'action': self.action,
+            'content_type': self.content_type,
+            'document_key': self.document_key,
+            'created_datetime': self.created_datetime,
+        }
+
+
+class ReleaseCacheVersion(models.Model):
+    """ ReleaseCacheVersion, the id of the row is the version of the release cache """
+    site_code = models.SlugField(max_length=100, db_index=False)
+    release_uuid = models.UUIDField()
+    origin = models.CharField(max_length=32, blank=True, default='')
+
+    class Meta:
+        unique_together = ('site_code', 'release_uuid')
+
+
+class ReleaseJob(models.Model):
+    """ ReleaseJob, an operation on a ContentRelease run by the release_jobs command """
+    action = models.CharField(max_length=50, choices=RELEASE_JOB_ACTIONS)
+    site_code = models.SlugField(max_length=100, db_index=False)
+    release_uuid = models.UUIDField()
+    arguments = models.TextField(default='{}')
+    status = models.IntegerField(choices=RELEASE_JOB_STATUS, default=0)
+    progress = models.IntegerField(default=0)
+    result = models.TextField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    created_by = models.CharField(max_length=150, blank=True, null=True)
+    created_datetime = models.DateTimeField(auto_now_add=True)
+    started_datetime = models.DateTimeField(blank=True, null=True)
+    heartbeat_datetime = models.DateTimeField(blank=True, null=True)
+    finished_datetime = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='release_job_status'),
+        ]
+
+    def __str__(self):
+        return '{} {} {}'.format(self.get_action_display(), self.site_code, self.release_uuid)
@@ -0,0 +1,323 @@
+"""
+.. module:: djangosnapshotpublisher.partitioning
+   :synopsis: optional PostgreSQL partitioning of the ReleaseDocument table by site_code
+"""
+
+import hashlib
+import logging
+import re
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, connections, router, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import ContentRelease, ReleaseDocument
+
+
+BACKFILL_BATCH_SIZE = 5000
+
+logger = logging.getLogger(__name__)
+
+# site codes with a partition, in this process
+partitions = set()
+
+# databases without document to backfill, in this process
+backfilled_databases = set()
+
+
+def is_partitioning_enabled():
+    """ is_partitioning_enabled """
+    return getattr(settings, 'SNAPSHOTPUBLISHER_DOCUMENT_PARTITIONS', False)
+
+
+def check_backfill():
+    """ raise ImproperlyConfigured if documents have no site_code, they would not be found by
+    document_filter, checked once per process """
+    using = router.db_for_read(ReleaseDocument)
+    if using in backfilled_databases:
+        return
+    if ReleaseDocument.objects.using(using).filter(site_code='').exists():
+        raise ImproperlyConfigured(
+            'SNAPSHOTPUBLISHER_DOCUMENT_PARTITIONS is enabled but documents have no site_code, '
+            'run release_partition --backfill-only first')
+    backfilled_databases.add(using)
+
+
+def document_filter(site_code):
+    """ ReleaseDocument filter on the partition key, so the queries only read one partition """
+    if is_partitioning_enabled():
+        check_backfill()
+        return {'site_code': site_code}
+    return {}
+
+
+def get_table():
+    """ get_table """
+    return ReleaseDocument._meta.db_table
+
+
+def get_partition_name(site_code):
+    """ name of the partition of site_code, unique and shorter than 63 characters """
+    return '{}_{}_{}'.format(
+        get_table(),
+        re.sub(r'[^a-z0-9_]', '_', site_code.lower())[:14],
+        hashlib.sha1(site_code.encode('utf-8')).hexdigest()[:8],
+    )
+
+
+def get_create_partition_sql(connection, site_code):
+    """ (sql, params) creating the partition of site_code """
+    return (
+        'CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES IN (%s)'.format(
+            connection.ops.quote_name(get_partition_name(site_code)),
+            connection.ops.quote_name(get_table()),
+        ),
+        [site_code],
+    )
+
+
+def get_foreign_keys(connection):
+    """ (table, column) of the foreign keys to the ReleaseDocument table, the table is quoted """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT conrelid::regclass::text, attname FROM pg_constraint '
+            'JOIN pg_attribute ON attrelid = conrelid AND attnum = conkey[1] '
+            'WHERE contype = \'f\' AND confrelid = %s::regclass ORDER BY 1, 2',
+            [get_table()],
+        )
+        return cursor.fetchall()
+
+
+def get_reference_triggers_sql(connection, foreign_keys):
+    """ list of (sql, params) creating the constraint triggers checking the foreign_keys to the
+    partitioned table at the end of the transaction, like the deferred foreign keys of django """
+    table = connection.ops.quote_name(get_table())
+    check_reference = connection.ops.quote_name('{}_check_reference'.format(get_table()))
+    check_referenced = connection.ops.quote_name('{}_check_referenced'.format(get_table()))
+    statements = [
+        (
+            'CREATE OR REPLACE FUNCTION {}() RETURNS trigger LANGUAGE plpgsql AS $$ '
+            'DECLARE document_id bigint; BEGIN '
+            # the current value, the row may have been updated or deleted since
+            'EXECUTE format(\'SELECT %I FROM %I.%I WHERE id = $1\', '
+            'TG_ARGV[0], TG_TABLE_SCHEMA, TG_TABLE_NAME) INTO document_id USING NEW.id; '
+            'IF document_id IS NOT NULL THEN '
+            'PERFORM 1 FROM {} WHERE id = document_id FOR KEY SHARE; '
+            'IF NOT FOUND THEN RAISE foreign_key_violation USING MESSAGE = format('
+            '\'%s.%s = %s is not in {}\', TG_TABLE_NAME, TG_ARGV[0], document_id); '
+            'END IF; END IF; RETURN NULL; END $$'.format(check_reference, table, get_table()),
+            None,
+        ),
+        (
+            'CREATE OR REPLACE FUNCTION {}() RETURNS trigger LANGUAGE plpgsql AS $$ '
+            'DECLARE argument_index integer; referenced boolean; BEGIN '
+            # moved to another partition
+            'PERFORM 1 FROM {} WHERE id = OLD.id; IF FOUND THEN RETURN NULL; END IF; '
+            'FOR argument_index IN 0 .. TG_NARGS / 2 - 1 LOOP '
+            'EXECUTE format(\'SELECT EXISTS (SELECT 1 FROM %s WHERE %I = $1)\', '
+            'TG_ARGV[argument_index * 2], TG_ARGV[argument_index * 2 + 1]) '
+            'INTO referenced USING OLD.id; '
+            'IF referenced THEN RAISE foreign_key_violation USING MESSAGE = format('
+            '\'{}.id = %s is still referenced by %s.%s\', OLD.id, '
+            'TG_ARGV[argument_index * 2], TG_ARGV[argument_index * 2 + 1]); END IF; '
+            'END LOOP; RETURN NULL; END $$'.format(check_referenced, table, get_table()),
+            None,
+        ),
+    ]
+    for foreign_key_table, column in foreign_keys:
+        statements.append((
+            'CREATE CONSTRAINT TRIGGER {} AFTER INSERT OR UPDATE OF {} ON {} '
+            'DEFERRABLE INITIALLY DEFERRED FOR EACH ROW EXECUTE PROCEDURE {}(\'{}\')'.format(
+                connection.ops.quote_name('{}_{}_fk'.format(get_table(), column)),
+                connection.ops.quote_name(column), foreign_key_table, check_reference, column),
+            None,
+        ))
+    if foreign_keys:
+        statements.append((
+            'CREATE CONSTRAINT TRIGGER {} AFTER DELETE ON {} '
+            'DEFERRABLE INITIALLY DEFERRED FOR EACH ROW EXECUTE PROCEDURE {}({})'.format(
+                connection.ops.quote_name('{}_referenced'.format(get_table())), table,
+                check_referenced, ', '.join(
+                    '\'{}\', \'{}\''.format(foreign_key_table, column)
+                    for foreign_key_table, column in foreign_keys
+                )),
+            None,
+        ))
+    return statements
+
+
+def get_partition_table_sql(connection, site_codes, foreign_keys=()):
+    """ list of (sql, params) replacing the ReleaseDocument table by a table partitioned by
+    site_code, with a partition for each site and a default partition, the foreign_keys to the
+    table are replaced by constraint triggers """
+    table = connection.ops.quote_name(get_table())
+    old_table_name = '{}_unpartitioned'.format(get_table())
+    old_table = connection.ops.quote_name(old_table_name)
+    statements = [
+        ('ALTER TABLE {} RENAME TO {}'.format(table, old_table), None),
+        (
+            'CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            'PARTITION BY LIST (site_code)'.format(table, old_table),
+            None,
+        ),
+        # the partition key must be in the primary key
+        ('ALTER TABLE {} ADD PRIMARY KEY (id, site_code)'.format(table), None),
+        ('CREATE INDEX {} ON {} (delta_base_id)'.format(
+            connection.ops.quote_name('{}_delta_base_part'.format(get_table())), table), None),
+        ('CREATE INDEX {} ON {} (content_type, document_key)'.format(
+            connection.ops.quote_name('{}_document_part'.format(get_table())), table), None),
+        (
+            'CREATE INDEX {} ON {} '
+            '(content_type COLLATE "C", document_key COLLATE "C")'.format(
+                connection.ops.quote_name('{}_document_c_part'.format(get_table())), table),
+            None,
+        ),
+    ]
+    statements += [get_create_partition_sql(connection, site_code) for site_code in site_codes]
+    statements += [
+        ('CREATE TABLE {} PARTITION OF {} DEFAULT'.format(
+            connection.ops.quote_name('{}_default'.format(get_table())), table), None),
+        # the foreign keys to ReleaseDocument can't reference a partitioned table without the
+        # partition key, they are checked by constraint triggers and the cascades are done by
+        # django
+        (
+            'DO $$ DECLARE constraint_row record; BEGIN '
+            'FOR constraint_row IN SELECT conname, conrelid::regclass AS table_name '
+            'FROM pg_constraint WHERE contype = \'f\' AND confrelid = \'{}\'::regclass LOOP '
+            'EXECUTE format(\'ALTER TABLE %s DROP CONSTRAINT %I\', '
+            'constraint_row.table_name, constraint_row.conname); '
+            'END LOOP; END $$'.format(old_table_name),
+            None,
+        ),
+        ('INSERT INTO {} SELECT * FROM {}'.format(table, old_table), None),
+        (
+            'DO $$ BEGIN EXECUTE format(\'ALTER SEQUENCE %s OWNED BY {}.id\', '
+            'pg_get_serial_sequence(\'{}\', \'id\')); END $$'.format(table, old_table_name),
+            None,
+        ),
+        ('DROP TABLE {}'.format(old_table), None),
+    ]
+    statements += get_reference_triggers_sql(connection, foreign_keys)
+    return statements
+
+
+def get_move_to_partition_sql(connection, site_code):
+    """ list of (sql, params) moving the documents of site_code from the default partition
+    to a new partition """
+    table = connection.ops.quote_name(get_table())
+    default_table = connection.ops.quote_name('{}_default'.format(get_table()))
+    return [
+        ('ALTER TABLE {} DETACH PARTITION {}'.format(table, default_table), None),
+        get_create_partition_sql(connection, site_code),
+        ('INSERT INTO {} SELECT * FROM {} WHERE site_code = %s'.format(
+            table, default_table), [site_code]),
+        ('DELETE FROM {} WHERE site_code = %s'.format(default_table), [site_code]),
+        ('ALTER TABLE {} ATTACH PARTITION {} DEFAULT'.format(table, default_table), None),
+    ]
+
+
+def get_partition_names(connection):
+    """ names of the partitions of the ReleaseDocument table """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+            'WHERE parent.relname = %s',
+            [get_table()],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def is_partitioned(connection):
+    """ is the ReleaseDocument table partitioned """
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE relname = %s', [get_table()])
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def backfill_site_code(batch_size=BACKFILL_BATCH_SIZE, sleep=0):
+    """ set the site_code of the ReleaseDocument from their ContentRelease, by batches,
+    return the number of updated documents """
+    through = ContentRelease.release_documents.through
+    count = 0
+    last_id = 0
+    while True:
+        ids = list(ReleaseDocument.objects.filter(
+            id__gt=last_id, site_code='',
+        ).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return count
+        last_id = ids[-1]
+        site_codes = {}
+        for release_document_id, site_code in through.objects.filter(
+                releasedocument_id__in=ids,
+        ).values_list('releasedocument_id', 'contentrelease__site_code').distinct():
+            site_codes.setdefault(site_code, []).append(release_document_id)
+        with transaction.atomic():
+            for site_code, release_document_ids in site_codes.items():
+                count += ReleaseDocument.objects.filter(
+                    id__in=release_document_ids).update(site_code=site_code)
+        if sleep:
+            time.sleep(sleep)
+
+
+def partition_table(site_codes, using=None):
+    """ partition the ReleaseDocument table, or move the documents of the sites without a
+    partition from the default partition (PostgreSQL only), return the new partitions """
+    connection = connections[using or router.db_for_write(ReleaseDocument)]
+    if connection.vendor != 'postgresql':
+        raise ValueError('ReleaseDocument can only be partitioned on PostgreSQL')
+    with transaction.atomic(using=connection.alias):
+        if is_partitioned(connection):
+            partition_names = get_partition_names(connection)
+            site_codes = [
+                site_code for site_code in site_codes
+                if get_partition_name(site_code) not in partition_names
+            ]
+            statements = []
+            for site_code in site_codes:
+                statements += get_move_to_partition_sql(connection, site_code)
+        else:
+            statements = get_partition_table_sql(
+                connection, site_codes, get_foreign_keys(connection))
+        with connection.cursor() as cursor:
+            for sql, params in statements:
+                cursor.execute(sql, params)
+    partitions.update(site_codes)
+    return site_codes
+
+
+def create_partition(site_code, using=None):
+    """ create the partition of site_code if the ReleaseDocument table is partitioned """
+    if site_code in partitions:
+        return False
+    connection = connections[using or router.db_for_write(ReleaseDocument)]
+    if not is_partitioned(connection):
+        return False
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(*get_create_partition_sql(connection, site_code))
+    except DatabaseError:
+        # documents of the site are already in the default partition, see release_partition
+        logger.warning('The partition of %s could not be created', site_code, exc_info=True)
+        return False
+    partitions.add(site_code)
+    return True
+
+
+@receiver(post_save, sender=ContentRelease)
+def create_partition_on_new_site(sender, instance, created, **kwargs):
+    """ the documents of a new site get their own partition, created once the release is
+    committed so the DDL doesn't lock the table in the transaction of the caller """
+    if created and is_partitioning_enabled() and instance.site_code not in partitions:
+        using = kwargs.get('using')
+        transaction.on_commit(
+            lambda: create_partition(instance.site_code, using=using), using=using)
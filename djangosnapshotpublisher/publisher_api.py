@@ -8,18 +8,29 @@ from functools import reduce
 from operator import itemgetter
 import json
 
-from django.db.models import CharField, Case, Q, Count, When, Value as V
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import CharField, Case, F, Q, Count, When, Value as V
 from django.db.models.functions import Concat
 from django.db.models.query import QuerySet
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from . import changefeed, compare_cache, document_cache, identity_map, partitioning
+from .delta import is_delta_storage_enabled, materialize_delta_documents, set_document_json
+from .ingest import ingest_documents
+from .json_path import JSONPathExtract, extract_json_path, parse_json_path, supports_json_path
 from .lazy_encoder import LazyEncoder
 from .models import (ContentRelease, ReleaseDocumentExtraParameter, ReleaseDocument,
                      ContentReleaseExtraParameter)
+from .raw_encoder import RawJSON, dumps_raw
+from .signals import content_release_live
+from .slow_log import record_methods
+from .streaming_compare import BinaryOrder, get_prefix_end, iter_comparison
+from .tracing import span, trace_methods
 
 
-API_TYPES = ['django', 'json']
+API_TYPES = ['django', 'json', 'raw']
 DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S%z'
 ERROR_STATUS_CODE = {
     'wrong_api_type': _('Invalide type, only this api_types are available: {}'.format(
@@ -45,9 +56,30 @@ ERROR_STATUS_CODE = {
     'content_release_already_stage': _('Content Release alredy staged'),
     'content_release_already_live': _('Content Release alredy live'),
     'no_content_release_stage': _('No Stage Content Release'),
+    'json_path_invalid': _('Invalid JSON path'),
+    'site_code_more_than_once': _('More than one ContentRelease for this site'),
+    'batch_not_applied': _('Not applied, another ContentRelease of the batch is invalid'),
+    'limit_invalid': _('Limit must be a positive integer'),
+    'content_release_copy_invalid': _(
+        'Invalid copy, the version must be bigger than the staged, live and archived releases'),
 }
 
 
+def get_batch_outcome(site_code, release_uuid, status_code):
+    """ outcome of a ContentRelease in a batch call """
+    outcome = {
+        'site_code': site_code,
+        'release_uuid': release_uuid,
+        'status': 'success' if status_code == 'success' else 'error',
+    }
+    if status_code != 'success':
+        outcome['error_code'] = status_code
+        outcome['error_msg'] = ERROR_STATUS_CODE[status_code]
+    return outcome
+
+
+@trace_methods(exclude=['send_response', 'item_to_dict'])
+@record_methods(exclude=['send_response', 'item_to_dict'])
 class PublisherAPI:
     """ PublisherAPI """
 
@@ -58,27 +90,45 @@ class PublisherAPI:
 
     def send_response(self, status_code, data=None):
         """ send_response """
-        if status_code == 'success':
-            response = {
-                'status': 'success',
-            }
+        with span('serialization', api_type=self.api_type):
+            if status_code == 'success':
+                response = {
+                    'status': 'success',
+                }
+                if self.api_type in ['json', 'raw']:
+                    if isinstance(data, QuerySet):
+                        data = [self.item_to_dict(item) for item in data]
+                    if isinstance(data, (ContentRelease, ReleaseDocument)):
+                        data = self.item_to_dict(data)
+                elif isinstance(data, ReleaseDocument):
+                    # django api_type, the caller reads document_json directly
+                    data = data.load_document_json()
+                elif isinstance(data, QuerySet) and data.model is ReleaseDocument:
+                    data = data.load_document_json()
+                if data is not None:
+                    response['content'] = data
+            else:
+                response = {
+                    'status': 'error',
+                    'error_code': status_code,
+                    'error_msg': ERROR_STATUS_CODE[status_code],
+                }
             if self.api_type == 'json':
-                if isinstance(data, QuerySet):
-                    data = [item.to_dict() for item in data]
-                if isinstance(data, (ContentRelease, ReleaseDocument)):
-                    data = data.to_dict()
-            if data is not None:
-                response['content'] = data
-        else:
-            response = {
-                'status': 'error',
-                'error_code': status_code,
-                'error_msg': ERROR_STATUS_CODE[status_code],
-            }
-        if self.api_type == 'json':
-            return json.dumps(response, cls=LazyEncoder)
-        return response
+                return json.dumps(response, cls=LazyEncoder)
+            if self.api_type == 'raw':
+                return dumps_raw(response)
+            return response
+
+    def item_to_dict(self, item):
+        """ item_to_dict """
+        item_dict = item.to_dict()
+        if self.api_type == 'raw' and isinstance(item, ReleaseDocument) and \
+                item_dict['document_json'] is not None:
+            # document_json is already json, no need to parse it and encode it again
+            item_dict['document_json'] = RawJSON(item_dict['document_json'])
+        return item_dict
 
+    @transaction.atomic
     def add_content_release(self, site_code, title, version, parameters=None,
                             based_on_release_uuid=None, use_current_live_as_base_release=False):
         """ add_content_release """
@@ -106,9 +156,12 @@ class PublisherAPI:
                 use_current_live_as_base_release=use_current_live_as_base_release,
             )
             content_release.save()
+            changefeed.record_change(
+                site_code, content_release.uuid, changefeed.RELEASE_ADDED)
             self.update_content_release_parameters(site_code, content_release.uuid, parameters)
             return self.send_response('success', content_release)
 
+    @transaction.atomic
     def update_content_release_parameters(self, site_code, release_uuid, parameters,
                                           clear_first=False):
         """ update_content_release_parameters """
@@ -131,7 +184,10 @@ class PublisherAPI:
                             'content': value,
                         }
                     )
-            
+
+            if parameters or clear_first:
+                changefeed.record_change(
+                    site_code, content_release.uuid, changefeed.RELEASE_PARAMETERS_UPDATED)
             return self.send_response('success')
 
         except ContentRelease.DoesNotExist:
@@ -157,14 +213,44 @@ class PublisherAPI:
         )
         return self.send_response('success', extra_parameters)
 
+    @transaction.atomic
     def remove_content_release(self, site_code, release_uuid):
         """ remove_content_release """
         try:
-            ContentRelease.objects.get(site_code=site_code, uuid=release_uuid).delete()
+            content_release = ContentRelease.objects.get(site_code=site_code, uuid=release_uuid)
+            document_cache.invalidate_content_release(content_release)
+            content_release.delete()
+            changefeed.record_change(
+                site_code, content_release.uuid, changefeed.RELEASE_REMOVED)
             return self.send_response('success')
         except ContentRelease.DoesNotExist:
             return self.send_response('content_release_does_not_exist')
 
+    @transaction.atomic
+    def copy_content_release(self, site_code, release_uuid, title=None, version=None):
+        """ copy_content_release """
+        try:
+            content_release = ContentRelease.objects.get(site_code=site_code, uuid=release_uuid)
+            overide_data = {
+                'status': 0,
+                'is_stage': False,
+                'is_live': False,
+                'publish_datetime': None,
+            }
+            if title:
+                overide_data['title'] = title
+            if version:
+                overide_data['version'] = version
+            new_content_release = content_release.copy(overide_data)
+            changefeed.record_change(
+                site_code, new_content_release.uuid, changefeed.RELEASE_COPIED)
+            return self.send_response('success', new_content_release)
+        except ContentRelease.DoesNotExist:
+            return self.send_response('content_release_does_not_exist')
+        except ValidationError:
+            return self.send_response('content_release_copy_invalid')
+
+    @transaction.atomic
     def update_content_release(self, site_code, release_uuid, title=None, version=None,
                                parameters=None):
         """ update_content_release """
@@ -177,6 +263,8 @@ class PublisherAPI:
             if version:
                 content_release.version = version
             content_release.save()
+            changefeed.record_change(
+                site_code, content_release.uuid, changefeed.RELEASE_UPDATED)
             self.update_content_release_parameters(site_code, release_uuid, parameters)
             return self.send_response('success')
         except ContentRelease.DoesNotExist:
@@ -185,7 +273,7 @@ class PublisherAPI:
     def get_content_release_details(self, site_code, release_uuid, parameters=None):
         """ get_content_release_details """
         try:
-            content_release = ContentRelease.objects.get(site_code=site_code, uuid=release_uuid)
+            content_release = identity_map.get_content_release(site_code, release_uuid)
             return self.send_response('success', content_release)
         except ContentRelease.DoesNotExist:
             return self.send_response('content_release_does_not_exist')
@@ -221,7 +309,7 @@ class PublisherAPI:
     def get_stage_content_release(self, site_code, parameters=None):
         """ get_stage_content_release """
         try:
-            stage_content_release = ContentRelease.objects.stage(site_code)
+            stage_content_release = identity_map.get_stage_content_release(site_code)
             return self.send_response('success', stage_content_release)
         except ContentRelease.DoesNotExist:
             return self.send_response('no_content_release_stage')
@@ -229,11 +317,12 @@ class PublisherAPI:
     def get_live_content_release(self, site_code, parameters=None):
         """ get_live_content_release """
         try:
-            live_content_release = ContentRelease.objects.live(site_code)
+            live_content_release = identity_map.get_live_content_release(site_code)
             return self.send_response('success', live_content_release)
         except ContentRelease.DoesNotExist:
             return self.send_response('no_content_release_live')
 
+    @transaction.atomic
     def set_stage_content_release(self, site_code, release_uuid):
         """ set_stage_content_release """
         content_release = None
@@ -265,19 +354,26 @@ class PublisherAPI:
 
         if content_release.status == 0:
             content_release.copy_document_release_ref_from_baserelease()
+            changefeed.record_change(
+                site_code, content_release.uuid, changefeed.RELEASE_STAGED)
             return self.send_response('success')
         else:
             return self.send_response('content_release_not_preview')
 
+    @transaction.atomic
     def unset_stage_content_release(self, site_code, release_uuid):
         # unset_stage_content_release
         try:
             stage_content_release = ContentRelease.objects.stage(site_code)
+            document_cache.invalidate_content_release(stage_content_release)
             stage_content_release.remove_document_release_ref_from_baserelease()
+            changefeed.record_change(
+                site_code, stage_content_release.uuid, changefeed.RELEASE_UNSTAGED)
             return self.send_response('success')
         except ContentRelease.DoesNotExist:
             return self.send_response('no_content_release_stage')
 
+    @transaction.atomic
     def set_live_content_release(self, site_code, release_uuid, publish_datetime=None):
         """ set_live_content_release """
         if publish_datetime is not None and publish_datetime < timezone.now():
@@ -302,11 +398,18 @@ class PublisherAPI:
             return self.send_response('content_release_already_live')
 
         if content_release.status == 1 and content_release.is_stage:
-            if publish_datetime is None:
-                content_release.status = 2
-                content_release.publish_datetime = timezone.now()
-            else:
+            if publish_datetime is not None:
+                # stay staged, set live at publish_datetime by ContentRelease.objects.live
                 content_release.publish_datetime = publish_datetime
+                content_release.save()
+                changefeed.record_changes([{
+                    'site_code': site_code,
+                    'release_uuid': content_release.uuid,
+                    'action': changefeed.RELEASE_UPDATED,
+                }])
+                return self.send_response('success')
+            content_release.status = 2
+            content_release.publish_datetime = timezone.now()
             content_release.is_stage = False
             content_release.is_live = True
             content_release.save()
@@ -314,10 +417,101 @@ class PublisherAPI:
                 live_content_release.status = 3
                 live_content_release.is_live = False
                 live_content_release.save()
+            content_release_live.send(
+                sender=ContentRelease,
+                content_release=content_release,
+                previous_content_release=live_content_release,
+            )
             return self.send_response('success')
         else:
             return self.send_response('content_release_not_stage')
 
+    @transaction.atomic
+    def set_live_content_releases(self, releases, publish_datetime=None, all_or_nothing=True):
+        """ set_live_content_releases, releases is a list of (site_code, release_uuid) """
+        if publish_datetime is not None and publish_datetime < timezone.now():
+            return self.send_response('publishdatetime_in_past')
+
+        content_releases = {
+            str(content_release.uuid): content_release
+            for content_release in ContentRelease.objects.select_for_update().filter(
+                uuid__in=[release_uuid for _, release_uuid in releases])
+        }
+        site_codes = [site_code for site_code, _ in releases]
+        live_content_releases = {
+            content_release.site_code: content_release
+            for content_release in ContentRelease.objects.select_for_update().filter(
+                site_code__in=site_codes, status=2, is_live=True)
+        }
+
+        # validation
+        status_codes = []
+        for site_code, release_uuid in releases:
+            content_release = content_releases.get(str(release_uuid))
+            if content_release is None or content_release.site_code != site_code:
+                status_codes.append('content_release_does_not_exist')
+            elif site_codes.count(site_code) > 1:
+                status_codes.append('site_code_more_than_once')
+            elif content_release == live_content_releases.get(site_code):
+                status_codes.append('content_release_already_live')
+            elif content_release.status != 1 or not content_release.is_stage:
+                status_codes.append('content_release_not_stage')
+            else:
+                status_codes.append('success')
+        if all_or_nothing and any(status_code != 'success' for status_code in status_codes):
+            status_codes = [
+                'batch_not_applied' if status_code == 'success' else status_code
+                for status_code in status_codes
+            ]
+        valid_releases = [
+            (site_code, content_releases[str(release_uuid)])
+            for (site_code, release_uuid), status_code in zip(releases, status_codes)
+            if status_code == 'success'
+        ]
+
+        if valid_releases and publish_datetime is not None:
+            # stay staged, set live at publish_datetime by ContentRelease.objects.live
+            ContentRelease.objects.filter(
+                id__in=[content_release.id for _, content_release in valid_releases],
+            ).update(publish_datetime=publish_datetime)
+            changefeed.record_changes([{
+                'site_code': site_code,
+                'release_uuid': content_release.uuid,
+                'action': changefeed.RELEASE_UPDATED,
+            } for site_code, content_release in valid_releases])
+        elif valid_releases:
+            # all the sites go live at the same time
+            now = timezone.now()
+            previous_content_releases = [
+                live_content_releases.get(site_code) for site_code, _ in valid_releases
+            ]
+            ContentRelease.objects.filter(id__in=[
+                content_release.id for content_release in previous_content_releases
+                if content_release
+            ]).update(status=3, is_live=False)
+            ContentRelease.objects.filter(
+                id__in=[content_release.id for _, content_release in valid_releases],
+            ).update(status=2, publish_datetime=now, is_stage=False, is_live=True)
+            for (_, content_release), previous_content_release in zip(
+                    valid_releases, previous_content_releases):
+                content_release.status = 2
+                content_release.publish_datetime = now
+                content_release.is_stage = False
+                content_release.is_live = True
+                if previous_content_release:
+                    previous_content_release.status = 3
+                    previous_content_release.is_live = False
+                content_release_live.send(
+                    sender=ContentRelease,
+                    content_release=content_release,
+                    previous_content_release=previous_content_release,
+                )
+
+        return self.send_response('success', [
+            get_batch_outcome(site_code, release_uuid, status_code)
+            for (site_code, release_uuid), status_code in zip(releases, status_codes)
+        ])
+
     # def freeze_content_release(self, site_code, release_uuid, publish_datetime):
     #     """ freeze_content_release """
     #     try:
@@ -378,31 +572,167 @@ class PublisherAPI:
             content_releases = content_releases.filter(publish_datetime__gte=after)
         return self.send_response('success', content_releases)
 
+    def list_scheduled_content_releases(self, site_code=None, limit=10):
+        """ list_scheduled_content_releases """
+        return self.send_response(
+            'success', ContentRelease.objects.scheduled(site_code)[:limit])
+
+    def changes_since(self, seq=0, limit=100, site_code=None):
+        """ changes_since """
+        return self.send_response(
+            'success', changefeed.get_changes_since(seq, limit, site_code))
+
     def get_document_from_content_release(self, site_code, release_uuid, document_key,
                                           content_type='content'):
         """get_document_from_content_release """
+        release_document = document_cache.get_document(
+            site_code, release_uuid, content_type, document_key)
+        if release_document is not None:
+            return self.send_response('success', release_document)
         try:
-            content_release = ContentRelease.objects.get(site_code=site_code, uuid=release_uuid)
+            content_release = identity_map.get_content_release(site_code, release_uuid)
             release_document = ReleaseDocument.objects.get(
                 document_key=document_key,
                 content_type=content_type,
                 content_releases=content_release.id,
+                **partitioning.document_filter(site_code),
             )
+            document_cache.set_document(site_code, release_uuid, release_document)
             return self.send_response('success', release_document)
         except ContentRelease.DoesNotExist:
             return self.send_response('content_release_does_not_exist')
         except ReleaseDocument.DoesNotExist:
             return self.send_response('release_document_does_not_exist')
 
+    def get_documents_from_content_release(self, site_code, release_uuid, document_keys,
+                                           content_type='content'):
+        """ get_documents_from_content_release """
+        try:
+            content_release = identity_map.get_content_release(site_code, release_uuid)
+            release_documents = ReleaseDocument.objects.filter(
+                document_key__in=document_keys,
+                content_type=content_type,
+                content_releases=content_release.id,
+                **partitioning.document_filter(site_code),
+            ).order_by('document_key')
+            return self.send_response('success', release_documents)
+        except ContentRelease.DoesNotExist:
+            return self.send_response('content_release_does_not_exist')
+
+    def list_documents_in_content_release(self, site_code, release_uuid, content_type=None,
+                                          key_prefix=None, cursor=None, limit=100):
+        """ list_documents_in_content_release, sorted by (content_type, document_key), next is
+        the cursor of the next page """
+        if not isinstance(limit, int) or limit <= 0:
+            return self.send_response('limit_invalid')
+        try:
+            content_release = identity_map.get_content_release(site_code, release_uuid)
+        except ContentRelease.DoesNotExist:
+            return self.send_response('content_release_does_not_exist')
+
+        release_documents = ReleaseDocument.objects.filter(
+            content_releases=content_release.id,
+            **partitioning.document_filter(site_code),
+        )
+        release_documents = release_documents.annotate(
+            sort_content_type=BinaryOrder(F('content_type')),
+            sort_document_key=BinaryOrder(F('document_key')),
+        )
+        if content_type is not None:
+            release_documents = release_documents.filter(content_type=content_type)
+        if key_prefix:
+            # a range of the sorted keys, it uses the same index as the order
+            release_documents = release_documents.filter(sort_document_key__gte=key_prefix)
+            prefix_end = get_prefix_end(key_prefix)
+            if prefix_end is None:
+                release_documents = release_documents.filter(
+                    document_key__startswith=key_prefix)
+            else:
+                release_documents = release_documents.filter(sort_document_key__lt=prefix_end)
+        if cursor is not None:
+            release_documents = release_documents.filter(
+                Q(sort_content_type__gt=cursor[0]) |
+                Q(sort_content_type=cursor[0], sort_document_key__gt=cursor[1])
+            )
+        documents = list(release_documents.order_by(
+            'sort_content_type', 'sort_document_key',
+        ).values(
+            'document_key', 'content_type', 'deleted', 'document_hash', 'document_size',
+        )[:limit + 1])
+
+        next_cursor = None
+        if len(documents) > limit:
+            documents = documents[:limit]
+            next_cursor = [documents[-1]['content_type'], documents[-1]['document_key']]
+        return self.send_response('success', {
+            'documents': documents,
+            'next': next_cursor,
+        })
+
+    def get_document_fields_from_content_release(self, site_code, release_uuid, document_key,
+                                                 paths, content_type='content'):
+        """ get_document_fields_from_content_release """
+        if not paths:
+            return self.send_response('parameters_missing')
+        if isinstance(paths, str):
+            paths = [paths]
+        try:
+            parsed_paths = [parse_json_path(path) for path in paths]
+        except ValueError:
+            return self.send_response('json_path_invalid')
+
+        try:
+            content_release = identity_map.get_content_release(site_code, release_uuid)
+            release_documents = ReleaseDocument.objects.filter(
+                document_key=document_key,
+                content_type=content_type,
+                content_releases=content_release.id,
+                **partitioning.document_filter(site_code),
+            )
+
+            fragments = None
+            if supports_json_path(connection):
+                # evaluate the paths in the database, only the fragments are transferred
+                fragments = release_documents.annotate(**{
+                    'path_{}'.format(i): JSONPathExtract('document_json', parts)
+                    for i, parts in enumerate(parsed_paths)
+                }).values(
+                    'delta_base',
+                    'cold_storage_bundle',
+                    *['path_{}'.format(i) for i in range(len(paths))]
+                ).get()
+
+            if fragments is not None and fragments['delta_base'] is None and \
+                    not fragments['cold_storage_bundle']:
+                fields = {
+                    path: None if fragments['path_{}'.format(i)] is None else json.loads(
+                        fragments['path_{}'.format(i)])
+                    for i, path in enumerate(paths)
+                }
+            else:
+                # documents stored as a patch or in cold storage are read in python
+                document_json = release_documents.get().get_document_json()
+                document = json.loads(document_json) if document_json else None
+                fields = {
+                    path: extract_json_path(document, parts)
+                    for path, parts in zip(paths, parsed_paths)
+                }
+            return self.send_response('success', fields)
+        except ContentRelease.DoesNotExist:
+            return self.send_response('content_release_does_not_exist')
+        except ReleaseDocument.DoesNotExist:
+            return self.send_response('release_document_does_not_exist')
+
     def get_document_extra_from_content_release(self, site_code, release_uuid, document_key,
                                                 content_type='content'):
         """get_document_extra_from_content_release """
         try:
-            content_release = ContentRelease.objects.get(site_code=site_code, uuid=release_uuid)
+            content_release = identity_map.get_content_release(site_code, release_uuid)
             release_document = ReleaseDocument.objects.get(
                 document_key=document_key,
                 content_type=content_type,
                 content_releases=content_release.id,
+                **partitioning.document_filter(site_code),
             )
             extra_parameters = ReleaseDocumentExtraParameter.objects.filter(
                 release_document=release_document,
@@ -413,20 +743,37 @@ class PublisherAPI:
         except ReleaseDocument.DoesNotExist:
             return self.send_response('release_document_does_not_exist')
 
+    @transaction.atomic
     def publish_document_to_content_release(self, site_code, release_uuid, document_json,
                                             document_key, content_type='content', parameters=None):
         """ publish_document_to_content_release """
         try:
             content_release = ContentRelease.objects.get(site_code=site_code, uuid=release_uuid)
             created = False
+
+            # document from the base release used to store document_json as a patch
+            base_release_document = None
+            if is_delta_storage_enabled():
+                base_release = content_release.get_base_release()
+                if base_release:
+                    base_release_document = ReleaseDocument.objects.filter(
+                        document_key=document_key,
+                        content_type=content_type,
+                        content_releases=base_release.id,
+                        **partitioning.document_filter(site_code),
+                    ).first()
+
             try:
                 release_document = None
                 release_document = ReleaseDocument.objects.get(
                     document_key=document_key,
                     content_releases=content_release.id,
                     content_type=content_type,
+                    **partitioning.document_filter(site_code),
                 )
-                release_document.document_json = document_json
+                document_cache.invalidate_release_document(release_document)
+                materialize_delta_documents(release_document)
+                set_document_json(release_document, document_json, base_release_document)
                 release_document.deleted = False
                 release_document.save()
 
@@ -437,8 +784,9 @@ class PublisherAPI:
                 release_document = ReleaseDocument(
                     document_key=document_key,
                     content_type=content_type,
-                    document_json=document_json,
+                    site_code=site_code,
                 )
+                set_document_json(release_document, document_json, base_release_document)
                 release_document.save()
                 content_release.release_documents.add(release_document)
                 content_release.save()
@@ -454,10 +802,28 @@ class PublisherAPI:
                     )
                     extra_parameter.save()
 
+            changefeed.record_change(
+                site_code, content_release.uuid, changefeed.DOCUMENT_PUBLISHED,
+                document_key, content_type)
             return self.send_response('success', {'created': created})
         except ContentRelease.DoesNotExist:
             return self.send_response('content_release_does_not_exist')
 
+    @transaction.atomic
+    def ingest_documents_to_content_release(self, site_code, release_uuid, documents,
+                                            method=None):
+        """ ingest_documents_to_content_release """
+        try:
+            content_release = ContentRelease.objects.get(site_code=site_code, uuid=release_uuid)
+        except ContentRelease.DoesNotExist:
+            return self.send_response('content_release_does_not_exist')
+        document_cache.invalidate_content_release(content_release)
+        report = ingest_documents(content_release, documents, method)
+        changefeed.record_change(
+            site_code, content_release.uuid, changefeed.RELEASE_DOCUMENTS_INGESTED)
+        return self.send_response('success', report)
+
+    @transaction.atomic
     def unpublish_document_from_content_release(self, site_code, release_uuid, document_key,
                                                 content_type='content'):
         """ unpublish_document_from_content_release """
@@ -467,122 +833,157 @@ class PublisherAPI:
                 document_key=document_key,
                 content_type=content_type,
                 content_releases__id=content_release.id,
+                **partitioning.document_filter(site_code),
             )
+            document_cache.invalidate_release_document(release_document)
             release_document.delete()
+            changefeed.record_change(
+                site_code, content_release.uuid, changefeed.DOCUMENT_UNPUBLISHED,
+                document_key, content_type)
             return self.send_response('success')
         except ContentRelease.DoesNotExist:
             return self.send_response('content_release_does_not_exist')
         except ReleaseDocument.DoesNotExist:
             return self.send_response('release_document_does_not_exist')
 
+    @transaction.atomic
     def delete_document_from_content_release(self, site_code, release_uuid, document_key,
                                              content_type='content'):
         """ delete_document_from_content_release """
         try:
             content_release = ContentRelease.objects.get(site_code=site_code, uuid=release_uuid)
+            for release_document in ReleaseDocument.objects.filter(
+                    document_key=document_key,
+                    content_type=content_type,
+                    content_releases__id=content_release.id,
+                    **partitioning.document_filter(site_code)):
+                document_cache.invalidate_release_document(release_document)
+                materialize_delta_documents(release_document)
             release_document, created = ReleaseDocument.objects.update_or_create(
                 document_key=document_key,
                 content_type=content_type,
                 content_releases__id=content_release.id,
+                **partitioning.document_filter(site_code),
                 defaults={
                     'document_json': None,
+                    'document_delta': None,
+                    'delta_base': None,
+                    'delta_depth': 0,
+                    'cold_storage_bundle': None,
+                    'document_hash': None,
+                    'document_size': None,
+                    'site_code': site_code,
                     'deleted': True,
                 }
             )
             if created:
                 content_release.release_documents.add(release_document)
                 content_release.save()
+            changefeed.record_change(
+                site_code, content_release.uuid, changefeed.DOCUMENT_DELETED,
+                document_key, content_type)
             return self.send_response('success')
         except ContentRelease.DoesNotExist:
             return self.send_response('content_release_does_not_exist')
 
-    def compare_content_releases(self, site_code, my_release_uuid, compare_to_release_uuid):
-        """ compare_content_releases """
-        try:
-            comparison = []
-
-            # get my_content_release documents
-            my_content_release = ContentRelease.objects.get(
-                site_code=site_code, uuid=my_release_uuid)
-            releases = [my_content_release]
-            if my_content_release.use_current_live_as_base_release:
-                releases.append(ContentRelease.objects.live(my_content_release.site_code))
-            elif my_content_release.base_release:
-                releases.append(my_content_release.base_release)
-            my_release_documents = ReleaseDocument.objects.filter(
-                content_releases__in=releases,
-            ).annotate(
-                key_content=Concat(
-                    'document_key', V('__'), 'content_type'),
-            ).values_list('key_content', flat=True)
-
-            # get compare_to_content_release documents
-            compare_to_content_release = ContentRelease.objects.get(
-                site_code=site_code, uuid=compare_to_release_uuid)
-            releases = [compare_to_content_release]
-            if compare_to_content_release.use_current_live_as_base_release:
-                releases.append(ContentRelease.objects.live(my_content_release.site_code))
-            elif compare_to_content_release.base_release:
-                releases.append(compare_to_content_release.base_release)
-            compare_to_release_documents = ReleaseDocument.objects.filter(
-                content_releases__in=releases,
-            ).annotate(
-                key_content=Concat(
-                    'document_key', V('__'), 'content_type'),
-            ).values_list('key_content', flat=True)
-
-            # get added document
-            added_release_document = ReleaseDocument.objects.annotate(
-                key_content=Concat(
-                    'document_key', V('__'), 'content_type'),
-                diff=V('Added', output_field=CharField()),
-            ).exclude(
-                key_content__in=compare_to_release_documents,
-            ).filter(
-                key_content__in=my_release_documents,
-            ).values(
-                'document_key', 'content_type', 'diff'
-            ).distinct()
-
-            # get removed document
-            removed_release_document = ReleaseDocument.objects.annotate(
-                key_content=Concat(
-                    'document_key', V('__'), 'content_type'),
-                diff=V('Removed', output_field=CharField()),
-            ).filter(
-                key_content__in=compare_to_release_documents,
-            ).exclude(
-                key_content__in=my_release_documents,
-            ).values(
-                'document_key', 'content_type', 'diff'
-            ).distinct()
-
-            # get changed document
-            changed_release_document = ReleaseDocument.objects.annotate(
-                key_content=Concat(
-                    'document_key', V('__'), 'content_type'),
-                diff=Case(
-                    When(deleted=True, then=V('Removed')),
-                    default=V('Changed'),
-                    output_field=CharField(),
-                ),
-            ).filter(
-                key_content__in=set(compare_to_release_documents) & set(my_release_documents),
-            ).values(
-                'key_content', 'document_key', 'content_type', 'diff', 'deleted'
-            ).annotate(
-                count_key_content=Count('key_content'),
-            ).filter(
-                Q(count_key_content__gt=1) | Q(deleted=True)
-            ).values(
-                'document_key', 'content_type', 'diff',
-            ).distinct()
-
-            # get extra
-            release_documents = list(added_release_document) + \
-                                list(removed_release_document) + \
-                                list(changed_release_document)
+    def get_compared_releases(self, content_release):
+        """ content_release and the release its documents are based on """
+        releases = [content_release]
+        if content_release.use_current_live_as_base_release:
+            releases.append(identity_map.get_live_content_release(content_release.site_code))
+        elif content_release.base_release:
+            releases.append(content_release.base_release)
+        return releases
+
+    def get_comparison(self, my_releases, compare_to_releases, documents=None):
+        """ get_comparison, only for the (content_type, document_key) in documents if defined """
+        my_content_release = my_releases[0]
+        compare_to_content_release = compare_to_releases[0]
+
+        # only the documents of the compared releases, a document of another release with the
+        # same key isn't a change
+        release_documents = ReleaseDocument.objects.filter(
+            id__in=ContentRelease.release_documents.through.objects.filter(
+                contentrelease_id__in=[
+                    content_release.id for content_release in my_releases + compare_to_releases
+                ],
+            ).values('releasedocument_id'),
+        )
+        if documents is not None:
+            release_documents = release_documents.filter(reduce(lambda x, y: x | y, [
+                Q(content_type=content_type, document_key=document_key)
+                for content_type, document_key in documents
+            ]))
+
+        # get my_content_release documents
+        my_release_documents = release_documents.filter(
+            content_releases__in=my_releases,
+        ).annotate(
+            key_content=Concat(
+                'document_key', V('__'), 'content_type'),
+        ).values_list('key_content', flat=True)
+
+        # get compare_to_content_release documents
+        compare_to_release_documents = release_documents.filter(
+            content_releases__in=compare_to_releases,
+        ).annotate(
+            key_content=Concat(
+                'document_key', V('__'), 'content_type'),
+        ).values_list('key_content', flat=True)
+
+        # get added document
+        added_release_document = release_documents.annotate(
+            key_content=Concat(
+                'document_key', V('__'), 'content_type'),
+            diff=V('Added', output_field=CharField()),
+        ).exclude(
+            key_content__in=compare_to_release_documents,
+        ).filter(
+            key_content__in=my_release_documents,
+        ).values(
+            'document_key', 'content_type', 'diff'
+        ).distinct()
 
+        # get removed document
+        removed_release_document = release_documents.annotate(
+            key_content=Concat(
+                'document_key', V('__'), 'content_type'),
+            diff=V('Removed', output_field=CharField()),
+        ).filter(
+            key_content__in=compare_to_release_documents,
+        ).exclude(
+            key_content__in=my_release_documents,
+        ).values(
+            'document_key', 'content_type', 'diff'
+        ).distinct()
+
+        # get changed document
+        changed_release_document = release_documents.annotate(
+            key_content=Concat(
+                'document_key', V('__'), 'content_type'),
+            diff=Case(
+                When(deleted=True, then=V('Removed')),
+                default=V('Changed'),
+                output_field=CharField(),
+            ),
+        ).filter(
+            key_content__in=set(compare_to_release_documents) & set(my_release_documents),
+        ).values(
+            'key_content', 'document_key', 'content_type', 'diff', 'deleted'
+        ).annotate(
+            count_key_content=Count('key_content'),
+        ).filter(
+            Q(count_key_content__gt=1) | Q(deleted=True)
+        ).values(
+            'document_key', 'content_type', 'diff',
+        ).distinct()
+
+        # get extra
+        release_documents = list(added_release_document) + \
+                            list(removed_release_document) + \
+                            list(changed_release_document)
+
+        with span('parameter_loading'):
             for release_document in release_documents:
                 if release_document['diff'] in ['Added', 'Removed']:
                     extra_parameters = ReleaseDocumentExtraParameter.objects.filter(
@@ -628,9 +1029,106 @@ class PublisherAPI:
                             }
                         })
 
-            # sort comparison dict
-            comparison = sorted(release_documents, key=itemgetter(
-                'diff', 'content_type', 'document_key'))
-            return self.send_response('success', comparison)
+        # sort comparison dict
+        return sorted(release_documents, key=itemgetter(
+            'diff', 'content_type', 'document_key'))
+
+    def get_incremental_comparison(self, my_releases, compare_to_releases, token=None):
+        """ the documents which diff changed since the comparison of token """
+        release_uuids = [
+            content_release.uuid for content_release in my_releases + compare_to_releases]
+        # counted before the comparison, a change committed later makes the next count differ
+        seq = changefeed.get_last_seq()
+        count = changefeed.count_changes(release_uuids, seq)
+        documents = None
+        previous = None
+        if token is not None:
+            previous = compare_cache.parse_token(token, my_releases, compare_to_releases)
+        # a change committed after the previous comparison with a lower seq than its token
+        # can't be found from the seq, the comparison is done again
+        if previous is not None and \
+                changefeed.count_changes(release_uuids, previous[0]) == previous[1]:
+            documents = changefeed.get_changed_documents(release_uuids, previous[0])
+
+        if documents is None:
+            comparison = self.get_comparison(my_releases, compare_to_releases)
+        else:
+            comparison = self.get_comparison(
+                my_releases, compare_to_releases, documents) if documents else []
+            # the documents that don't have a diff anymore
+            compared_documents = {
+                (release_document['content_type'], release_document['document_key'])
+                for release_document in comparison
+            }
+            comparison.extend(sorted([
+                {'document_key': document_key, 'content_type': content_type, 'diff': 'Unchanged'}
+                for content_type, document_key in documents - compared_documents
+            ], key=itemgetter('content_type', 'document_key')))
+        return {
+            'token': compare_cache.make_token(seq, count, my_releases, compare_to_releases),
+            'incremental': documents is not None,
+            'comparison': comparison,
+        }
+
+    def compare_content_releases(self, site_code, my_release_uuid, compare_to_release_uuid,
+                                 use_cache=True, incremental=False, token=None):
+        """ compare_content_releases """
+        try:
+            my_content_release = identity_map.get_content_release(site_code, my_release_uuid)
+            compare_to_content_release = identity_map.get_content_release(
+                site_code, compare_to_release_uuid)
+            my_releases = self.get_compared_releases(my_content_release)
+            compare_to_releases = self.get_compared_releases(compare_to_content_release)
         except ContentRelease.DoesNotExist:
             return self.send_response('content_release_does_not_exist')
+
+        if incremental:
+            return self.send_response('success', self.get_incremental_comparison(
+                my_releases, compare_to_releases, token))
+
+        cache_key = None
+        if use_cache and compare_cache.is_enabled():
+            cache_key = compare_cache.get_cache_key(my_releases, compare_to_releases)
+            comparison = compare_cache.get(cache_key)
+            if comparison is not None:
+                return self.send_response('success', comparison)
+
+        comparison = self.get_comparison(my_releases, compare_to_releases)
+        if cache_key is not None:
+            compare_cache.set(cache_key, comparison)
+        return self.send_response('success', comparison)
+
+    def compare_content_releases_page(self, site_code, my_release_uuid, compare_to_release_uuid,
+                                      after=None, limit=100):
+        """ compare_content_releases_page, sorted by (content_type, document_key), next is the
+        after of the next page """
+        if not isinstance(limit, int) or limit <= 0:
+            return self.send_response('limit_invalid')
+        try:
+            my_content_release = identity_map.get_content_release(site_code, my_release_uuid)
+            compare_to_content_release = identity_map.get_content_release(
+                site_code, compare_to_release_uuid)
+            my_releases = self.get_compared_releases(my_content_release)
+            compare_to_releases = self.get_compared_releases(compare_to_content_release)
+        except ContentRelease.DoesNotExist:
+            return self.send_response('content_release_does_not_exist')
+
+        comparison = []
+        next_after = None
+        release_documents = iter_comparison(my_releases, compare_to_releases, after)
+        try:
+            for release_document in release_documents:
+                if len(comparison) == limit:
+                    last_release_document = comparison[-1]
+                    next_after = [
+                        last_release_document['content_type'],
+                        last_release_document['document_key'],
+                    ]
+                    break
+                comparison.append(release_document)
+        finally:
+            release_documents.close()
+        return self.send_response('success', {
+            'comparison': comparison,
+            'next': next_after,
+        })
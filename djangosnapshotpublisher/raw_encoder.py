@@ -0,0 +1,52 @@
+"""
+.. module:: djangosnapshotpublisher.raw_encoder
+   :synopsis: encode a response to bytes, splicing already encoded json verbatim
+"""
+
+import json
+import uuid
+
+from .lazy_encoder import LazyEncoder
+
+
+class RawJSON(str):
+    """ RawJSON, a string that already contains json and must not be encoded again """
+
+
+def dumps_raw(obj):
+    """ dumps obj to bytes, RawJSON values are inserted as is instead of being escaped """
+    raw_values = []
+    token = '__raw_json_{}_'.format(uuid.uuid4().hex)
+
+    class RawEncoder(LazyEncoder):
+        """ RawEncoder """
+
+        def encode(self, o):
+            return super(RawEncoder, self).encode(self.replace_raw(o))
+
+        def replace_raw(self, o):
+            """ replace the RawJSON values with a placeholder """
+            if isinstance(o, RawJSON):
+                raw_values.append(o)
+                return '{}{}'.format(token, len(raw_values) - 1)
+            if isinstance(o, dict):
+                return {key: self.replace_raw(value) for key, value in o.items()}
+            if isinstance(o, (list, tuple)):
+                return [self.replace_raw(value) for value in o]
+            return o
+
+    encoded = json.dumps(obj, cls=RawEncoder)
+    if not raw_values:
+        return encoded.encode('utf-8')
+
+    # splice the raw values in place of the quoted placeholders
+    chunks = []
+    position = 0
+    for index, raw_value in enumerate(raw_values):
+        placeholder = '"{}{}"'.format(token, index)
+        start = encoded.index(placeholder, position)
+        chunks.append(encoded[position:start].encode('utf-8'))
+        chunks.append(raw_value.encode('utf-8'))
+        position = start + len(placeholder)
+    chunks.append(encoded[position:].encode('utf-8'))
+    return b''.join(chunks)
@@ -0,0 +1,146 @@
+"""
+.. module:: djangosnapshotpublisher.retention
+   :synopsis: retention policy for archived releases and orphan documents
+"""
+
+import time
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from .cold_storage import delete_bundle
+from .models import ContentRelease, ReleaseDocument, ReleaseDocumentExtraParameter
+
+
+def get_expired_content_releases(keep=None, days=None, site_code=None):
+    """ archived releases that are neither in the last <keep> of their site nor newer than <days> """
+    if keep is None and days is None:
+        return ContentRelease.objects.none()
+
+    archived_content_releases = ContentRelease.objects.filter(
+        status=3,
+        is_live=False,
+        is_stage=False,
+    )
+    if site_code:
+        archived_content_releases = archived_content_releases.filter(site_code=site_code)
+
+    expired_ids = set(archived_content_releases.exclude(
+        # preview and staged releases still need their base release
+        id__in=ContentRelease.objects.filter(
+            base_release__isnull=False,
+            status__in=[0, 1],
+        ).values('base_release'),
+    ).values_list('id', flat=True))
+
+    if keep is not None:
+        site_codes = archived_content_releases.values_list('site_code', flat=True).distinct()
+        for archived_site_code in site_codes:
+            expired_ids -= set(archived_content_releases.filter(
+                site_code=archived_site_code,
+            ).order_by(
+                F('publish_datetime').desc(nulls_last=True), '-id',
+            ).values_list('id', flat=True)[:keep])
+
+    if days is not None:
+        expired_ids -= set(archived_content_releases.exclude(
+            publish_datetime__lt=timezone.now() - timezone.timedelta(days=days),
+        ).values_list('id', flat=True))
+
+    return ContentRelease.objects.filter(id__in=expired_ids)
+
+
+def get_orphan_release_documents(content_releases=None, site_code=None):
+    """ documents that are not in any release, once content_releases are removed, with site_code
+    only the documents of content_releases """
+    retained_content_releases = ContentRelease.objects.all()
+    if content_releases is not None:
+        retained_content_releases = retained_content_releases.exclude(
+            id__in=content_releases.values('id'))
+    release_documents = ReleaseDocument.objects.exclude(
+        id__in=ReleaseDocument.objects.filter(
+            content_releases__in=retained_content_releases,
+        ).values('id'),
+    )
+    if site_code and content_releases is not None:
+        release_documents = release_documents.filter(
+            id__in=ReleaseDocument.objects.filter(
+                content_releases__in=content_releases.values('id'),
+            ).values('id'),
+        )
+    return release_documents
+
+
+def get_orphan_bundles(release_documents):
+    """ cold storage bundles only used by release_documents """
+    bundles = set(release_documents.filter(
+        cold_storage_bundle__isnull=False,
+    ).values_list('cold_storage_bundle', flat=True).distinct())
+    return bundles - set(ReleaseDocument.objects.filter(
+        cold_storage_bundle__in=bundles,
+    ).exclude(
+        id__in=release_documents.values('id'),
+    ).values_list('cold_storage_bundle', flat=True).distinct())
+
+
+def get_reclaimable_bytes(release_documents):
+    """ approximate size of the documents and their extra parameters """
+    document_size = release_documents.aggregate(
+        document_json=Sum(Length('document_json')),
+        document_delta=Sum(Length('document_delta')),
+    )
+    parameter_size = ReleaseDocumentExtraParameter.objects.filter(
+        release_document__in=release_documents.values('id'),
+    ).aggregate(
+        content=Sum(Length('content')),
+    )
+    return sum(size or 0 for size in list(document_size.values()) + [parameter_size['content']])
+
+
+def delete_in_batches(queryset, batch_size, sleep):
+    """ delete queryset by batches of batch_size rows, sleeping between each batch """
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            queryset.model.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+        if sleep:
+            time.sleep(sleep)
+
+
+def apply_retention(keep=None, days=None, site_code=None, batch_size=500, sleep=0,
+                    dry_run=False):
+    """ remove the expired archived releases then the orphan documents """
+    content_releases = get_expired_content_releases(keep, days, site_code)
+    release_documents = get_orphan_release_documents(content_releases, site_code)
+    bundles = get_orphan_bundles(release_documents)
+    report = {
+        'content_releases': content_releases.count(),
+        'release_documents': release_documents.count(),
+        'bundles': len(bundles),
+        'reclaimable_bytes': get_reclaimable_bytes(release_documents),
+    }
+    if not dry_run:
+        # live and archived releases already contain the documents of their base release,
+        # detach them so they are not deleted with it
+        ContentRelease.objects.filter(
+            base_release__in=content_releases.values('id'),
+            status__in=[2, 3],
+        ).update(base_release=None)
+        if site_code:
+            # the documents of the other sites are kept, the documents of content_releases are
+            # deleted while they are still found through content_releases
+            delete_in_batches(release_documents, batch_size, sleep)
+        delete_in_batches(content_releases, batch_size, sleep)
+        if not site_code:
+            delete_in_batches(get_orphan_release_documents(), batch_size, sleep)
+        # the files are deleted once no document refers to them
+        for bundle in bundles - set(ReleaseDocument.objects.filter(
+                cold_storage_bundle__in=bundles).values_list('cold_storage_bundle', flat=True)):
+            delete_bundle(bundle)
+    return report
@@ -0,0 +1,17 @@
+"""
+.. module:: djangosnapshotpublisher.signals
+   :synopsis: djangosnapshotpublisher signals
+"""
+
+from django.dispatch import Signal
+
+
+# sent when a ContentRelease goes live, with content_release and previous_content_release
+content_release_live = Signal()
+
+# sent when changes are recorded in the change feed, with changes (list of dict)
+content_release_changed = Signal()
+
+# sent in each process when the cached data of a ContentRelease must be dropped, with site_code,
+# release_uuid and remote (False for the changes committed by this process)
+content_release_invalidated = Signal()
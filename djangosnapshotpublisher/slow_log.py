@@ -0,0 +1,141 @@
+"""
+.. module:: djangosnapshotpublisher.slow_log
+   :synopsis: log the PublisherAPI calls slower than a threshold with their SQL queries
+"""
+
+from functools import wraps
+import json
+import logging
+import logging.handlers
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .tracing import decorate_methods, site_code_argument
+
+
+logger = logging.getLogger(__name__)
+
+EXPLAIN_PREFIX = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+}
+
+local = threading.local()
+file_loggers = {}
+file_loggers_lock = threading.Lock()
+
+
+def get_threshold():
+    """ SNAPSHOTPUBLISHER_SLOW_LOG_THRESHOLD in seconds, None if the log is disabled """
+    return getattr(settings, 'SNAPSHOTPUBLISHER_SLOW_LOG_THRESHOLD', None)
+
+
+class QueryRecorder:
+    """ QueryRecorder, execute wrapper keeping the sql, params and duration of the queries """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': None if many else params,
+                'duration': time.perf_counter() - start,
+            })
+
+
+def explain(query):
+    """ query plan of a SELECT query, None if it can't be explained on this database, it runs in
+    a savepoint so a failure doesn't break the transaction of the recorded call """
+    prefix = EXPLAIN_PREFIX.get(connection.vendor)
+    if prefix is None or query['params'] is None or \
+            not query['sql'].lstrip().upper().startswith('SELECT'):
+        return None
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(prefix + query['sql'], query['params'])
+            return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+    except Exception:  # pylint: disable=broad-except
+        logger.debug('EXPLAIN failed: %s', query['sql'], exc_info=True)
+        return None
+
+
+def get_file_logger(path):
+    """ logger writing to the rotating file SNAPSHOTPUBLISHER_SLOW_LOG_FILE """
+    with file_loggers_lock:
+        if path not in file_loggers:
+            file_logger = logging.getLogger('{}.file.{}'.format(__name__, len(file_loggers)))
+            file_logger.propagate = False
+            file_logger.setLevel(logging.WARNING)
+            file_logger.addHandler(logging.handlers.RotatingFileHandler(
+                path,
+                maxBytes=getattr(settings, 'SNAPSHOTPUBLISHER_SLOW_LOG_MAX_BYTES', 10485760),
+                backupCount=getattr(settings, 'SNAPSHOTPUBLISHER_SLOW_LOG_BACKUP_COUNT', 5),
+            ))
+            file_loggers[path] = file_logger
+        return file_loggers[path]
+
+
+def write_record(record):
+    """ write a record as one line of json """
+    path = getattr(settings, 'SNAPSHOTPUBLISHER_SLOW_LOG_FILE', None)
+    line = json.dumps(record, default=str)
+    if path is None:
+        logger.warning(line)
+    else:
+        get_file_logger(path).warning(line)
+
+
+def record_slow_operation(name, queries, duration, site_code=None):
+    """ record_slow_operation """
+    if getattr(settings, 'SNAPSHOTPUBLISHER_SLOW_LOG_EXPLAIN', False):
+        for query in queries:
+            query['explain'] = explain(query)
+    write_record({
+        'operation': name,
+        'site_code': site_code,
+        'duration': duration,
+        'query_count': len(queries),
+        'query_duration': sum(query['duration'] for query in queries),
+        'queries': queries,
+    })
+
+
+def recorded(name):
+    """ decorator recording the function in the slow log if it's slower than the threshold """
+    def decorator(function):
+        get_site_code = site_code_argument(function)
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            threshold = get_threshold()
+            # the calls made by a recorded call are part of its record
+            if threshold is None or getattr(local, 'recording', False):
+                return function(*args, **kwargs)
+
+            query_recorder = QueryRecorder()
+            local.recording = True
+            start = time.perf_counter()
+            try:
+                with connection.execute_wrapper(query_recorder):
+                    return function(*args, **kwargs)
+            finally:
+                duration = time.perf_counter() - start
+                local.recording = False
+                if duration >= threshold:
+                    record_slow_operation(name, query_recorder.queries, duration,
+                                          get_site_code(args, kwargs))
+        return wrapper
+    return decorator
+
+
+def record_methods(exclude=()):
+    """ class decorator recording each public method in the slow log as <class>.<method> """
+    return decorate_methods(recorded, exclude)
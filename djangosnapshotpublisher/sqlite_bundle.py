@@ -0,0 +1,167 @@
+"""
+.. module:: djangosnapshotpublisher.sqlite_bundle
+   :synopsis: read-only PublisherAPI serving a release from a SQLite bundle, without the ORM
+"""
+
+import json
+import sqlite3
+
+from .raw_encoder import RawJSON, dumps_raw
+
+
+BUNDLE_FORMAT_VERSION = 1
+API_TYPES = ['django', 'json', 'raw']
+SCHEMA = [
+    'CREATE TABLE content_release (key TEXT PRIMARY KEY, value TEXT)',
+    'CREATE TABLE content_release_parameter (key TEXT PRIMARY KEY, content TEXT)',
+    'CREATE TABLE release_document ('
+    ' content_type TEXT NOT NULL,'
+    ' document_key TEXT NOT NULL,'
+    ' document_json TEXT,'
+    ' deleted INTEGER NOT NULL,'
+    ' document_hash TEXT NOT NULL,'
+    ' PRIMARY KEY (content_type, document_key))',
+    'CREATE TABLE release_document_parameter ('
+    ' content_type TEXT NOT NULL,'
+    ' document_key TEXT NOT NULL,'
+    ' key TEXT NOT NULL,'
+    ' content TEXT,'
+    ' PRIMARY KEY (content_type, document_key, key))',
+    'PRAGMA user_version = {}'.format(BUNDLE_FORMAT_VERSION),
+]
+ERROR_STATUS_CODE = {
+    'wrong_api_type': 'Invalide type, only this api_types are available: {}'.format(
+        ', '.join(API_TYPES)),
+    'content_release_does_not_exist': 'ContentRelease doesn\'t exists',
+    'release_document_does_not_exist': 'ReleaseDocument doesn\'t exist',
+    'content_release_extra_parameter_does_not_exist': 'ContentReleaseExtraParameter doesn\'t exist',
+}
+
+
+class SQLiteBundlePublisherAPI:
+    """ SQLiteBundlePublisherAPI, read-only PublisherAPI for a release exported to SQLite """
+
+    def __init__(self, path, api_type='django'):
+        if api_type not in API_TYPES:
+            raise ValueError(ERROR_STATUS_CODE['wrong_api_type'])
+        self.api_type = api_type
+        self.connection = sqlite3.connect(
+            'file:{}?mode=ro'.format(path), uri=True, check_same_thread=False)
+        self.content_release = {
+            key: json.loads(value)
+            for key, value in self.connection.execute('SELECT key, value FROM content_release')
+        }
+
+    def close(self):
+        """ close """
+        self.connection.close()
+
+    def send_response(self, status_code, data=None):
+        """ send_response """
+        if status_code == 'success':
+            response = {
+                'status': 'success',
+            }
+            if data is not None:
+                response['content'] = data
+        else:
+            response = {
+                'status': 'error',
+                'error_code': status_code,
+                'error_msg': ERROR_STATUS_CODE[status_code],
+            }
+        if self.api_type == 'json':
+            return json.dumps(response)
+        if self.api_type == 'raw':
+            return dumps_raw(response)
+        return response
+
+    def is_content_release(self, site_code, release_uuid):
+        """ check site_code and release_uuid are the ones of the bundle """
+        return self.content_release['site_code'] == site_code and \
+            self.content_release['uuid'] == str(release_uuid)
+
+    def document_to_dict(self, row):
+        """ document_to_dict """
+        document_key, content_type, document_json, deleted = row
+        if self.api_type == 'raw' and document_json is not None:
+            document_json = RawJSON(document_json)
+        return {
+            'document_key': document_key,
+            'content_type': content_type,
+            'document_json': document_json,
+            'deleted': bool(deleted),
+        }
+
+    def get_content_release_details(self, site_code, release_uuid, parameters=None):
+        """ get_content_release_details """
+        if not self.is_content_release(site_code, release_uuid):
+            return self.send_response('content_release_does_not_exist')
+        return self.send_response('success', dict(self.content_release))
+
+    def get_extra_paramater(self, site_code, release_uuid, key):
+        """ get_extra_paramater """
+        row = None
+        if self.is_content_release(site_code, release_uuid):
+            row = self.connection.execute(
+                'SELECT content FROM content_release_parameter WHERE key = ?', [key]).fetchone()
+        if row is None:
+            return self.send_response('content_release_extra_parameter_does_not_exist')
+        return self.send_response('success', row[0])
+
+    def get_extra_paramaters(self, site_code, release_uuid):
+        """ get_extra_paramaters """
+        extra_parameters = []
+        if self.is_content_release(site_code, release_uuid):
+            extra_parameters = [
+                {'key': key, 'content': content, 'content_release_uuid': str(release_uuid)}
+                for key, content in self.connection.execute(
+                    'SELECT key, content FROM content_release_parameter ORDER BY key')
+            ]
+        return self.send_response('success', extra_parameters)
+
+    def get_document_from_content_release(self, site_code, release_uuid, document_key,
+                                          content_type='content'):
+        """ get_document_from_content_release """
+        if not self.is_content_release(site_code, release_uuid):
+            return self.send_response('content_release_does_not_exist')
+        row = self.connection.execute(
+            'SELECT document_key, content_type, document_json, deleted FROM release_document '
+            'WHERE content_type = ? AND document_key = ?',
+            [content_type, document_key],
+        ).fetchone()
+        if row is None:
+            return self.send_response('release_document_does_not_exist')
+        return self.send_response('success', self.document_to_dict(row))
+
+    def get_documents_from_content_release(self, site_code, release_uuid, document_keys,
+                                           content_type='content'):
+        """ get_documents_from_content_release """
+        if not self.is_content_release(site_code, release_uuid):
+            return self.send_response('content_release_does_not_exist')
+        document_keys = list(document_keys)
+        rows = self.connection.execute(
+            'SELECT document_key, content_type, document_json, deleted FROM release_document '
+            'WHERE content_type = ? AND document_key IN ({}) ORDER BY document_key'.format(
+                ', '.join(['?'] * len(document_keys))),
+            [content_type] + document_keys,
+        ) if document_keys else []
+        return self.send_response('success', [self.document_to_dict(row) for row in rows])
+
+    def get_document_extra_from_content_release(self, site_code, release_uuid, document_key,
+                                                content_type='content'):
+        """ get_document_extra_from_content_release """
+        if not self.is_content_release(site_code, release_uuid):
+            return self.send_response('content_release_does_not_exist')
+        if self.connection.execute(
+                'SELECT 1 FROM release_document WHERE content_type = ? AND document_key = ?',
+                [content_type, document_key]).fetchone() is None:
+            return self.send_response('release_document_does_not_exist')
+        return self.send_response('success', [
+            {'key': key, 'content': content}
+            for key, content in self.connection.execute(
+                'SELECT key, content FROM release_document_parameter '
+                'WHERE content_type = ? AND document_key = ? ORDER BY key',
+                [content_type, document_key],
+            )
+        ])
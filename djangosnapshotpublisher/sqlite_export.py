@@ -0,0 +1,141 @@
+"""
+.. module:: djangosnapshotpublisher.sqlite_export
+   :synopsis: export a release to a SQLite bundle read by SQLiteBundlePublisherAPI
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+
+from .lazy_encoder import LazyEncoder
+from .models import (ContentReleaseExtraParameter, ReleaseDocument,
+                     ReleaseDocumentExtraParameter)
+from .sqlite_bundle import BUNDLE_FORMAT_VERSION, SCHEMA
+
+
+PROGRESS_INTERVAL = 1000
+LOAD_BATCH_SIZE = 500
+
+
+def get_document_hash(release_document_id, document_hash, deleted, parameters):
+    """ hash of a document and his extra parameters, used to only write the changed documents,
+    computed from the stored hash of document_json so the unchanged documents aren't loaded
+    (the id is enough for the documents stored before document_hash, they can't change without
+    getting one) """
+    return hashlib.sha1(json.dumps(
+        [release_document_id, document_hash, deleted, sorted(parameters)]).encode('utf-8')
+    ).hexdigest()
+
+
+def open_bundle(path, previous_path=None):
+    """ open a new bundle at path, starting from a copy of previous_path if it exists """
+    if os.path.exists(path):
+        os.remove(path)
+    if previous_path and os.path.exists(previous_path):
+        shutil.copyfile(previous_path, path)
+        connection = sqlite3.connect(path)
+        if connection.execute('PRAGMA user_version').fetchone()[0] == BUNDLE_FORMAT_VERSION:
+            return connection
+        connection.close()
+        os.remove(path)
+    connection = sqlite3.connect(path)
+    for statement in SCHEMA:
+        connection.execute(statement)
+    return connection
+
+
+def export_content_release(content_release, path, previous_path=None, progress=None):
+    """ export content_release to a SQLite bundle, only the changed documents are written,
+    progress(done, total) is called every PROGRESS_INTERVAL documents """
+    tmp_path = '{}.tmp'.format(path)
+    connection = open_bundle(tmp_path, previous_path)
+    report = {'release_documents': 0, 'changed': 0, 'removed': 0}
+    try:
+        # content release and his extra parameters
+        connection.execute('DELETE FROM content_release')
+        connection.executemany(
+            'INSERT INTO content_release (key, value) VALUES (?, ?)',
+            [
+                (key, json.dumps(value, cls=LazyEncoder))
+                for key, value in content_release.to_dict().items()
+            ],
+        )
+        connection.execute('DELETE FROM content_release_parameter')
+        connection.executemany(
+            'INSERT INTO content_release_parameter (key, content) VALUES (?, ?)',
+            ContentReleaseExtraParameter.objects.filter(
+                content_release=content_release).values_list('key', 'content'),
+        )
+
+        # documents
+        document_hashes = {
+            (content_type, document_key): document_hash
+            for content_type, document_key, document_hash in connection.execute(
+                'SELECT content_type, document_key, document_hash FROM release_document')
+        }
+        parameters = {}
+        for release_document_id, key, content in ReleaseDocumentExtraParameter.objects.filter(
+                release_document__content_releases=content_release,
+        ).values_list('release_document_id', 'key', 'content').iterator():
+            parameters.setdefault(release_document_id, []).append((key, content))
+
+        total = content_release.release_documents.count() if progress else None
+        changed_documents = {}
+        for release_document_id, content_type, document_key, document_hash, deleted in \
+                content_release.release_documents.values_list(
+                    'id', 'content_type', 'document_key', 'document_hash', 'deleted',
+                ).iterator():
+            report['release_documents'] += 1
+            if progress and report['release_documents'] % PROGRESS_INTERVAL == 0:
+                progress(report['release_documents'], total)
+            document_hash = get_document_hash(
+                release_document_id, document_hash, deleted,
+                parameters.get(release_document_id, []))
+            if document_hashes.pop((content_type, document_key), None) != document_hash:
+                changed_documents[release_document_id] = document_hash
+
+        # only the changed documents are loaded
+        changed_ids = list(changed_documents)
+        for index in range(0, len(changed_ids), LOAD_BATCH_SIZE):
+            for release_document in ReleaseDocument.objects.filter(
+                    id__in=changed_ids[index:index + LOAD_BATCH_SIZE]):
+                report['changed'] += 1
+                document_id = (release_document.content_type, release_document.document_key)
+                connection.execute(
+                    'INSERT OR REPLACE INTO release_document '
+                    '(content_type, document_key, document_json, deleted, document_hash) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    list(document_id) + [
+                        release_document.get_document_json(),
+                        release_document.deleted,
+                        changed_documents[release_document.id],
+                    ],
+                )
+                connection.execute(
+                    'DELETE FROM release_document_parameter '
+                    'WHERE content_type = ? AND document_key = ?',
+                    document_id,
+                )
+                connection.executemany(
+                    'INSERT INTO release_document_parameter '
+                    '(content_type, document_key, key, content) VALUES (?, ?, ?, ?)',
+                    [document_id + parameter
+                     for parameter in parameters.get(release_document.id, [])],
+                )
+
+        # documents not in the release anymore
+        for document_id in document_hashes:
+            report['removed'] += 1
+            for table in ['release_document', 'release_document_parameter']:
+                connection.execute(
+                    'DELETE FROM {} WHERE content_type = ? AND document_key = ?'.format(table),
+                    document_id,
+                )
+
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(tmp_path, path)
+    return report
@@ -0,0 +1,139 @@
+"""
+.. module:: djangosnapshotpublisher.static_tree
+   :synopsis: write the documents of a live release to a directory tree served by a web server
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import logging
+import os
+import shutil
+
+from django.conf import settings
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import ContentRelease, ReleaseJob
+from .signals import content_release_live
+
+
+logger = logging.getLogger(__name__)
+
+CURRENT_LINK = 'current'
+RELEASES_DIRECTORY = 'releases'
+KEEP_RELEASES = 2
+
+
+def get_document_path(content_type, document_key):
+    """ relative path of a document, raise ValueError if it would go out of the tree """
+    parts = [content_type] + document_key.split('/')
+    if any(part in ['', '.', '..'] or os.sep in part for part in parts):
+        raise ValueError('{} - {}'.format(content_type, document_key))
+    return os.path.join(*parts) + '.json'
+
+
+def write_document(path, content, previous_path, compress):
+    """ write a document, hard link the file of the previous tree if it didn't change """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if previous_path and os.path.isfile(previous_path) and \
+            (not compress or os.path.isfile(previous_path + '.gz')):
+        with open(previous_path, 'rb') as previous_file:
+            if previous_file.read() == content:
+                os.link(previous_path, path)
+                if compress:
+                    os.link(previous_path + '.gz', path + '.gz')
+                return False
+    with open(path, 'wb') as document_file:
+        document_file.write(content)
+    if compress:
+        with open(path + '.gz', 'wb') as document_file:
+            document_file.write(gzip.compress(content, mtime=0))
+    return True
+
+
+def build_static_tree(content_release, root, compress=False, workers=4):
+    """ write the documents of content_release under root and point root/current to them """
+    releases_directory = os.path.join(root, RELEASES_DIRECTORY)
+    directory = os.path.join(releases_directory, '{}-{}'.format(
+        content_release.uuid, timezone.now().strftime('%Y%m%d%H%M%S%f')))
+    os.makedirs(directory)
+
+    current_link = os.path.join(root, CURRENT_LINK)
+    previous_directory = os.path.realpath(current_link) if os.path.islink(current_link) else None
+
+    report = {'release_documents': 0, 'written': 0, 'skipped': 0, 'path': directory}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for release_document in content_release.release_documents.filter(
+                deleted=False).iterator():
+            try:
+                document_path = get_document_path(
+                    release_document.content_type, release_document.document_key)
+            except ValueError:
+                logger.warning('Invalid document path: %s', release_document)
+                report['skipped'] += 1
+                continue
+            document_json = release_document.get_document_json()
+            if document_json is None:
+                continue
+            report['release_documents'] += 1
+            futures.append(executor.submit(
+                write_document,
+                os.path.join(directory, document_path),
+                document_json.encode('utf-8'),
+                os.path.join(previous_directory, document_path) if previous_directory else None,
+                compress,
+            ))
+        report['written'] = sum(future.result() for future in futures)
+
+    # atomically point current to the new tree
+    tmp_link = '{}.tmp'.format(current_link)
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(directory, tmp_link)
+    os.replace(tmp_link, current_link)
+
+    # remove the old trees, the previous one is kept
+    kept_directories = [directory, previous_directory]
+    for name in sorted(os.listdir(releases_directory), key=lambda name: os.path.getmtime(
+            os.path.join(releases_directory, name)), reverse=True)[KEEP_RELEASES:]:
+        old_directory = os.path.join(releases_directory, name)
+        if old_directory not in kept_directories:
+            shutil.rmtree(old_directory)
+
+    return report
+
+
+def build_live_static_tree(site_code, root):
+    """ build the static tree of the current live release of site_code, return the report,
+    None if there is no live release """
+    content_release = ContentRelease.objects.filter(
+        site_code=site_code, status=2, is_live=True).first()
+    if content_release is None:
+        return None
+    report = build_static_tree(
+        content_release,
+        os.path.join(root, site_code),
+        compress=getattr(settings, 'SNAPSHOTPUBLISHER_STATIC_TREE_GZIP', False),
+        workers=getattr(settings, 'SNAPSHOTPUBLISHER_STATIC_TREE_WORKERS', 4),
+    )
+    logger.info(
+        'Static tree %s: %s documents, %s written',
+        report['path'], report['release_documents'], report['written'],
+    )
+    return report
+
+
+@receiver(content_release_live)
+def build_static_tree_on_live(sender, content_release, **kwargs):
+    """ add a static_tree ReleaseJob for the sites in SNAPSHOTPUBLISHER_STATIC_TREE_SITES, the
+    tree is built by the release_jobs worker, a rolled back go-live has no job """
+    root = getattr(settings, 'SNAPSHOTPUBLISHER_STATIC_TREE_ROOT', None)
+    site_codes = getattr(settings, 'SNAPSHOTPUBLISHER_STATIC_TREE_SITES', None)
+    if root is None or (site_codes is not None and content_release.site_code not in site_codes):
+        return
+    ReleaseJob.objects.create(
+        action='static_tree',
+        site_code=content_release.site_code,
+        release_uuid=content_release.uuid,
+    )
@@ -0,0 +1,124 @@
+"""
+.. module:: djangosnapshotpublisher.streaming_compare
+   :synopsis: compare two releases with a merge-join of their sorted documents, in constant memory
+"""
+
+import sys
+
+from django.db.models import Case, F, Func, IntegerField, Q, When, Value as V
+
+from .models import ContentRelease
+
+
+CHUNK_SIZE = 2000
+
+
+class BinaryOrder(Func):
+    """ BinaryOrder, the column compared by code point, the order used by python for str """
+    template = '%(expressions)s'
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        """ as_postgresql """
+        return super(BinaryOrder, self).as_sql(
+            compiler, connection, template='%(expressions)s COLLATE "C"', **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        """ as_mysql """
+        return super(BinaryOrder, self).as_sql(
+            compiler, connection, template='%(expressions)s COLLATE utf8mb4_bin',
+            **extra_context)
+
+
+def get_prefix_end(prefix):
+    """ the smallest string after all the strings starting with prefix by code point, None if
+    there is none, a prefix filter is the range [prefix, end) in the BinaryOrder """
+    for index in range(len(prefix) - 1, -1, -1):
+        code_point = ord(prefix[index]) + 1
+        if 0xD800 <= code_point <= 0xDFFF:
+            # the surrogates can't be encoded
+            code_point = 0xE000
+        if code_point <= sys.maxunicode:
+            return prefix[:index] + chr(code_point)
+    return None
+
+
+def iter_release_documents(releases, after=None):
+    """ (content_type, document_key, id, document_hash, deleted) of the documents of releases
+    sorted by (content_type, document_key), the first release wins over its base release """
+    through = ContentRelease.release_documents.through
+    queryset = through.objects.filter(
+        contentrelease_id__in=[content_release.id for content_release in releases],
+    ).annotate(
+        sort_content_type=BinaryOrder(F('releasedocument__content_type')),
+        sort_document_key=BinaryOrder(F('releasedocument__document_key')),
+        release_order=Case(
+            When(contentrelease_id=releases[0].id, then=V(0)),
+            default=V(1),
+            output_field=IntegerField(),
+        ),
+    )
+    if after is not None:
+        queryset = queryset.filter(
+            Q(sort_content_type__gt=after[0]) |
+            Q(sort_content_type=after[0], sort_document_key__gt=after[1])
+        )
+    queryset = queryset.order_by(
+        'sort_content_type', 'sort_document_key', 'release_order',
+    ).values_list(
+        'releasedocument__content_type',
+        'releasedocument__document_key',
+        'releasedocument_id',
+        'releasedocument__document_hash',
+        'releasedocument__deleted',
+    )
+
+    previous_key = None
+    # server-side cursor on PostgreSQL, the documents are fetched by chunks
+    for release_document in queryset.iterator(chunk_size=CHUNK_SIZE):
+        if release_document[:2] != previous_key:
+            previous_key = release_document[:2]
+            yield release_document
+
+
+def get_diff(my_document, compare_to_document):
+    """ diff of a document in both releases, None if it's the same, like compare_content_releases
+    a document deleted in one of them is 'Removed' """
+    if my_document[4] or compare_to_document[4]:
+        return 'Removed'
+    if my_document[2] == compare_to_document[2]:
+        return None
+    if my_document[3] is None or compare_to_document[3] is None:
+        # published before the hashes, the documents are different rows
+        return 'Changed'
+    return 'Changed' if my_document[3] != compare_to_document[3] else None
+
+
+def iter_comparison(my_releases, compare_to_releases, after=None):
+    """ yield the diff of the documents of my_releases against compare_to_releases,
+    sorted by (content_type, document_key), starting after (content_type, document_key) """
+    my_documents = iter_release_documents(my_releases, after)
+    compare_to_documents = iter_release_documents(compare_to_releases, after)
+    try:
+        my_document = next(my_documents, None)
+        compare_to_document = next(compare_to_documents, None)
+        while my_document is not None or compare_to_document is not None:
+            if compare_to_document is None or \
+                    (my_document is not None and my_document[:2] < compare_to_document[:2]):
+                document, diff = my_document, 'Added'
+                my_document = next(my_documents, None)
+            elif my_document is None or compare_to_document[:2] < my_document[:2]:
+                document, diff = compare_to_document, 'Removed'
+                compare_to_document = next(compare_to_documents, None)
+            else:
+                document, diff = my_document, get_diff(my_document, compare_to_document)
+                my_document = next(my_documents, None)
+                compare_to_document = next(compare_to_documents, None)
+            if diff is not None:
+                yield {
+                    'content_type': document[0],
+                    'document_key': document[1],
+                    'diff': diff,
+                }
+    finally:
+        my_documents.close()
+        compare_to_documents.close()
@@ -0,0 +1,90 @@
+"""
+.. module:: djangosnapshotpublisher.tiering
+   :synopsis: move the documents of old archived releases to cold storage
+"""
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .cold_storage import get_bundle_name, write_bundle
+from .models import ContentRelease, ReleaseDocument
+
+
+UPDATE_BATCH_SIZE = 500
+
+
+def get_cold_content_releases(days, site_code=None):
+    """ archived releases replaced by another release more than <days> days ago """
+    content_releases = ContentRelease.objects.filter(
+        status=3,
+        is_live=False,
+        is_stage=False,
+    ).filter(
+        Exists(ContentRelease.objects.filter(
+            site_code=OuterRef('site_code'),
+            status__in=[2, 3],
+            publish_datetime__gt=OuterRef('publish_datetime'),
+            publish_datetime__lt=timezone.now() - timezone.timedelta(days=days),
+        ))
+    )
+    if site_code:
+        content_releases = content_releases.filter(site_code=site_code)
+    return content_releases
+
+
+def get_cold_release_documents(content_release, cold_content_releases):
+    """ documents of content_release only in cold releases and not in cold storage yet,
+    stored in full or as a patch """
+    return ReleaseDocument.objects.filter(
+        Q(document_json__isnull=False) | Q(delta_base__isnull=False),
+        content_releases=content_release,
+        cold_storage_bundle__isnull=True,
+    ).exclude(
+        id__in=ReleaseDocument.objects.filter(
+            content_releases__in=ContentRelease.objects.exclude(
+                id__in=cold_content_releases.values('id')),
+        ).values('id'),
+    )
+
+
+def archive_content_release(content_release, cold_content_releases):
+    """ move the cold documents of content_release to a bundle, return the number of documents """
+    release_documents = get_cold_release_documents(content_release, cold_content_releases)
+    with transaction.atomic():
+        # the documents stored as a patch are rebuilt, the bundle has the full document_json
+        documents = [
+            (release_document.id, release_document.get_document_json())
+            for release_document in release_documents.only(
+                'id', 'document_json', 'document_delta', 'delta_base').iterator()
+        ]
+        if not documents:
+            return 0
+        name = write_bundle(get_bundle_name(content_release), documents)
+        ids = [document_id for document_id, _ in documents]
+        for i in range(0, len(ids), UPDATE_BATCH_SIZE):
+            ReleaseDocument.objects.filter(
+                id__in=ids[i:i + UPDATE_BATCH_SIZE],
+            ).update(
+                document_json=None,
+                document_delta=None,
+                delta_base=None,
+                delta_depth=0,
+                cold_storage_bundle=name,
+            )
+    return len(documents)
+
+
+def archive_content_releases(days, site_code=None, dry_run=False):
+    """ move the documents of the releases archived for more than <days> days to cold storage """
+    cold_content_releases = get_cold_content_releases(days, site_code)
+    report = {'content_releases': 0, 'release_documents': 0}
+    for content_release in cold_content_releases:
+        if dry_run:
+            count = get_cold_release_documents(content_release, cold_content_releases).count()
+        else:
+            count = archive_content_release(content_release, cold_content_releases)
+        if count:
+            report['content_releases'] += 1
+            report['release_documents'] += count
+    return report
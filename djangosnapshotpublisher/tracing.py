@@ -0,0 +1,174 @@
+"""
+.. module:: djangosnapshotpublisher.tracing
+   :synopsis: optional tracing spans, with OpenTelemetry when it's installed
+"""
+
+from functools import wraps
+import inspect
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+try:
+    from opentelemetry import trace as opentelemetry_trace
+except ImportError:
+    opentelemetry_trace = None
+
+
+OPENTELEMETRY = 'opentelemetry'
+TRACER_NAME = 'djangosnapshotpublisher'
+
+tracers = {}
+tracers_lock = threading.Lock()
+
+
+class NoOpSpan:
+    """ NoOpSpan """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def set_attribute(self, key, value):
+        """ set_attribute """
+
+
+NO_OP_SPAN = NoOpSpan()
+
+
+class NoOpTracer:
+    """ NoOpTracer, used when tracing is disabled """
+
+    def start_as_current_span(self, name, attributes=None):
+        """ start_as_current_span """
+        return NO_OP_SPAN
+
+
+class InMemorySpan:
+    """ InMemorySpan """
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.parent = None
+        self.start = None
+        self.end = None
+
+    def __enter__(self):
+        stack = self.tracer.get_stack()
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.end = time.perf_counter()
+        self.tracer.get_stack().pop()
+        if exc_type is not None:
+            self.attributes['error'] = exc_type.__name__
+        with self.tracer.lock:
+            self.tracer.spans.append(self)
+        return False
+
+    @property
+    def duration(self):
+        """ duration in seconds """
+        return self.end - self.start
+
+    def set_attribute(self, key, value):
+        """ set_attribute """
+        self.attributes[key] = value
+
+
+class InMemoryTracer:
+    """ InMemoryTracer, keeps the finished spans in spans (eg: for the tests) """
+
+    def __init__(self):
+        self.spans = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def get_stack(self):
+        """ the spans in progress in this thread """
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    def start_as_current_span(self, name, attributes=None):
+        """ start_as_current_span """
+        return InMemorySpan(self, name, attributes)
+
+    def clear(self):
+        """ clear """
+        with self.lock:
+            self.spans = []
+
+
+def get_tracer():
+    """ the tracer from SNAPSHOTPUBLISHER_TRACER: None (disabled), 'opentelemetry' or the dotted
+    path of a tracer class """
+    path = getattr(settings, 'SNAPSHOTPUBLISHER_TRACER', None)
+    if path is None:
+        return NoOpTracer()
+    with tracers_lock:
+        if path not in tracers:
+            if path == OPENTELEMETRY:
+                tracers[path] = opentelemetry_trace.get_tracer(TRACER_NAME) \
+                    if opentelemetry_trace else NoOpTracer()
+            else:
+                tracers[path] = import_string(path)()
+        return tracers[path]
+
+
+def span(name, **attributes):
+    """ context manager of a span, the attributes which are None are ignored """
+    return get_tracer().start_as_current_span(name, attributes={
+        key: str(value) for key, value in attributes.items() if value is not None
+    })
+
+
+def site_code_argument(function):
+    """ function returning the site_code argument of a call (args, kwargs) to function, None if
+    it's not given """
+    parameters = list(inspect.signature(function).parameters)
+    site_code_index = parameters.index('site_code') if 'site_code' in parameters else None
+
+    def get_site_code(args, kwargs):
+        site_code = kwargs.get('site_code')
+        if site_code is None and site_code_index is not None and site_code_index < len(args):
+            site_code = args[site_code_index]
+        return site_code
+    return get_site_code
+
+
+def decorate_methods(decorator, exclude=()):
+    """ class decorator applying decorator('<class>.<method>') to each public method """
+    def class_decorator(cls):
+        for name, method in list(vars(cls).items()):
+            if inspect.isfunction(method) and not name.startswith('_') and name not in exclude:
+                setattr(cls, name, decorator('{}.{}'.format(cls.__name__, name))(method))
+        return cls
+    return class_decorator
+
+
+def traced(name):
+    """ decorator running the function in a span, with the site_code argument as attribute """
+    def decorator(function):
+        get_site_code = site_code_argument(function)
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name, site_code=get_site_code(args, kwargs)):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def trace_methods(exclude=()):
+    """ class decorator running each public method in a span named <class>.<method> """
+    return decorate_methods(traced, exclude)
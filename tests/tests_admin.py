@@ -0,0 +1,83 @@
+"""
+.. module:: djangosnapshotpublisher.tests
+   :synopsis: djangosnapshotpublisher unittest
+"""
+
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+
+from djangosnapshotpublisher.admin import EstimatedCountPaginator
+from djangosnapshotpublisher.models import ReleaseDocument
+from djangosnapshotpublisher.publisher_api import PublisherAPI
+
+
+class AdminTestCase(TestCase):
+    """ unittest for the admin of ContentRelease and ReleaseDocument """
+
+    def setUp(self):
+        """ setUp """
+        cache.clear()
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        self.publisher_api = PublisherAPI()
+        self.release_uuids = []
+        for index in range(3):
+            response = self.publisher_api.add_content_release(
+                'site1', 'title{}'.format(index), '0.{}'.format(index + 1))
+            self.release_uuids.append(response['content'].uuid)
+            for document_index in range(5):
+                self.publisher_api.publish_document_to_content_release(
+                    'site1', response['content'].uuid, '{}', 'key{}'.format(document_index),
+                    'type{}'.format(document_index % 2))
+
+    def test_release_document_changelist(self):
+        """ unittest the ReleaseDocument changelist """
+        url = '/admin/djangosnapshotpublisher/releasedocument/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'type1')
+        self.assertContains(response, 'title2')
+        self.assertEqual(response.context['cl'].result_count, 15)
+        self.assertNotIn('document_json', str(response.context['cl'].queryset.query))
+
+        # the content types are cached
+        self.assertEqual(cache.get('djangosnapshotpublisher:admin:content_types'),
+                         ['type0', 'type1'])
+        response = self.client.get(url, {
+            'content_release': self.release_uuids[1],
+            'content_type': 'type0',
+        })
+        self.assertEqual(response.context['cl'].result_count, 3)
+        response = self.client.get(url, {'content_release': 'invalid'})
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    def test_content_release_changelist(self):
+        """ unittest the ContentRelease changelist and change form """
+        response = self.client.get('/admin/djangosnapshotpublisher/contentrelease/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 3)
+        response = self.client.get('/admin/djangosnapshotpublisher/contentrelease/add/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'key4')
+
+    def test_estimated_count(self):
+        """ unittest EstimatedCountPaginator """
+        paginator = EstimatedCountPaginator(ReleaseDocument.objects.order_by('id'), 100)
+        self.assertEqual(paginator.count, 15)
+        paginator = EstimatedCountPaginator(
+            ReleaseDocument.objects.filter(content_type='type0').order_by('id'), 100)
+        self.assertEqual(paginator.count, 9)
+
+        connection = mock.MagicMock(vendor='postgresql')
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = (2000000.0, )
+        with mock.patch.dict('djangosnapshotpublisher.admin.connections', {'default': connection}):
+            paginator = EstimatedCountPaginator(ReleaseDocument.objects.order_by('id'), 100)
+            self.assertEqual(paginator.count, 2000000)
+            cursor.fetchone.return_value = (500.0, )
+            paginator = EstimatedCountPaginator(ReleaseDocument.objects.order_by('id'), 100)
+            with mock.patch('django.core.paginator.Paginator.count', 15):
+                self.assertEqual(paginator.count, 15)
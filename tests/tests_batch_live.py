@@ -0,0 +1,114 @@
+"""
+.. module:: djangosnapshotpublisher.tests
+   :synopsis: djangosnapshotpublisher unittest
+"""
+
+import uuid
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from djangosnapshotpublisher.models import ContentRelease, ReleaseChangeEvent
+from djangosnapshotpublisher.publisher_api import PublisherAPI
+
+
+class BatchLiveTestCase(TestCase):
+    """ unittest for set_live_content_releases """
+
+    def setUp(self):
+        """ setUp """
+        self.publisher_api = PublisherAPI(api_type='django')
+        self.live_uuids = {}
+        self.release_uuids = {}
+        for site_code in ['site1', 'site2', 'site3']:
+            for version, release_uuids in [('0.1', self.live_uuids), ('0.2', self.release_uuids)]:
+                response = self.publisher_api.add_content_release(site_code, 'title', version)
+                release_uuids[site_code] = response['content'].uuid
+                self.publisher_api.set_stage_content_release(site_code, release_uuids[site_code])
+                if release_uuids is self.live_uuids:
+                    self.publisher_api.set_live_content_release(
+                        site_code, release_uuids[site_code])
+
+    def get_outcomes(self, response):
+        """ (site_code, status or error_code) of the releases """
+        self.assertEqual(response['status'], 'success')
+        return [
+            (outcome['site_code'], outcome.get('error_code', outcome['status']))
+            for outcome in response['content']
+        ]
+
+    def test_batch_live(self):
+        """ unittest the releases of all the sites go live together """
+        seq = ReleaseChangeEvent.objects.order_by('seq').last().seq
+        response = self.publisher_api.set_live_content_releases(list(self.release_uuids.items()))
+        self.assertEqual(self.get_outcomes(response), [
+            ('site1', 'success'), ('site2', 'success'), ('site3', 'success')])
+
+        content_releases = ContentRelease.objects.filter(uuid__in=self.release_uuids.values())
+        self.assertEqual({(content_release.status, content_release.is_live)
+                          for content_release in content_releases}, {(2, True)})
+        self.assertEqual(len({
+            content_release.publish_datetime for content_release in content_releases}), 1)
+        self.assertEqual(ContentRelease.objects.filter(
+            uuid__in=self.live_uuids.values(), status=3, is_live=False).count(), 3)
+        self.assertEqual(ReleaseChangeEvent.objects.filter(
+            seq__gt=seq, action='release_live').count(), 3)
+        self.assertEqual(self.publisher_api.get_live_content_release('site2')['content'].uuid,
+                         self.release_uuids['site2'])
+
+    def test_invalid(self):
+        """ unittest the per-site outcomes of an invalid batch """
+        releases = [
+            ('site1', self.release_uuids['site1']),
+            ('site2', self.live_uuids['site2']),
+            ('site3', self.release_uuids['site2']),
+            ('site4', uuid.uuid4()),
+        ]
+        outcomes = [
+            ('site1', 'batch_not_applied'),
+            ('site2', 'content_release_already_live'),
+            ('site3', 'content_release_does_not_exist'),
+            ('site4', 'content_release_does_not_exist'),
+        ]
+        response = self.publisher_api.set_live_content_releases(releases)
+        self.assertEqual(self.get_outcomes(response), outcomes)
+        self.assertFalse(ContentRelease.objects.filter(
+            uuid__in=self.release_uuids.values(), status=2).exists())
+
+        # only the valid releases
+        response = self.publisher_api.set_live_content_releases(releases, all_or_nothing=False)
+        outcomes[0] = ('site1', 'success')
+        self.assertEqual(self.get_outcomes(response), outcomes)
+        self.assertEqual(list(ContentRelease.objects.filter(
+            uuid__in=self.release_uuids.values(), status=2).values_list(
+                'site_code', flat=True)), ['site1'])
+
+        response = self.publisher_api.set_live_content_releases([
+            ('site2', self.release_uuids['site2']), ('site2', self.release_uuids['site2'])])
+        self.assertEqual(self.get_outcomes(response), [
+            ('site2', 'site_code_more_than_once'), ('site2', 'site_code_more_than_once')])
+
+    def test_publish_datetime(self):
+        """ unittest a batch scheduled at publish_datetime """
+        response = self.publisher_api.set_live_content_releases(
+            list(self.release_uuids.items()), timezone.now() - timezone.timedelta(minutes=1))
+        self.assertEqual(response['error_code'], 'publishdatetime_in_past')
+
+        publish_datetime = timezone.now() + timezone.timedelta(minutes=10)
+        self.publisher_api.set_live_content_releases(
+            list(self.release_uuids.items()), publish_datetime)
+        response = self.publisher_api.list_scheduled_content_releases()
+        self.assertEqual({
+            (content_release.uuid, content_release.publish_datetime)
+            for content_release in response['content']
+        }, {(release_uuid, publish_datetime) for release_uuid in self.release_uuids.values()})
+
+        ContentRelease.objects.filter(uuid__in=self.release_uuids.values()).update(
+            publish_datetime=timezone.now() - timezone.timedelta(minutes=1))
+        call_command('release_publisher')
+        self.assertFalse(self.publisher_api.list_scheduled_content_releases()['content'].exists())
+        for site_code, release_uuid in self.release_uuids.items():
+            self.assertEqual(
+                self.publisher_api.get_live_content_release(site_code)['content'].uuid,
+                release_uuid)
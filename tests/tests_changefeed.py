@@ -0,0 +1,119 @@
+"""
+.. module:: djangosnapshotpublisher.tests
+   :synopsis: djangosnapshotpublisher unittest
+"""
+
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import TestCase
+from django.utils import timezone
+
+from djangosnapshotpublisher import changefeed
+from djangosnapshotpublisher.models import ContentRelease, ReleaseChangeEvent
+from djangosnapshotpublisher.publisher_api import PublisherAPI
+
+
+class ChangeFeedTestCase(TestCase):
+    """ unittest for the change feed """
+
+    def setUp(self):
+        """ setUp """
+        self.publisher_api = PublisherAPI(api_type='django')
+
+    def get_actions(self, seq=0, site_code=None):
+        """ get_actions """
+        response = self.publisher_api.changes_since(seq, site_code=site_code)
+        self.assertEqual(response['status'], 'success')
+        return [
+            (event.action, event.document_key) for event in response['content']
+        ]
+
+    def test_changes_since(self):
+        """ unittest changes_since """
+        response = self.publisher_api.add_content_release('site1', 'title1', '0.1')
+        release_uuid = response['content'].uuid
+        self.publisher_api.publish_document_to_content_release(
+            'site1', release_uuid, '{"page": 1}', 'key1')
+        self.publisher_api.delete_document_from_content_release('site1', release_uuid, 'key2')
+        self.publisher_api.unpublish_document_from_content_release('site1', release_uuid, 'key1')
+        self.publisher_api.set_stage_content_release('site1', release_uuid)
+        self.publisher_api.set_live_content_release('site1', release_uuid)
+        self.publisher_api.add_content_release('site2', 'title2', '0.1', {'p1': 'v1'})
+
+        self.assertEqual(self.get_actions(site_code='site1'), [
+            ('release_added', None),
+            ('document_published', 'key1'),
+            ('document_deleted', 'key2'),
+            ('document_unpublished', 'key1'),
+            ('release_staged', None),
+            ('release_live', None),
+        ])
+        self.assertEqual(self.get_actions(site_code='site2'), [
+            ('release_added', None),
+            ('release_parameters_updated', None),
+        ])
+
+        # resume from the last seq seen
+        seq = ReleaseChangeEvent.objects.filter(site_code='site1').order_by('seq')[2].seq
+        self.assertEqual(self.get_actions(seq), [
+            ('document_unpublished', 'key1'),
+            ('release_staged', None),
+            ('release_live', None),
+            ('release_added', None),
+            ('release_parameters_updated', None),
+        ])
+        response = self.publisher_api.changes_since(seq, limit=2)
+        self.assertEqual(len(response['content']), 2)
+
+        # json
+        publisher_api = PublisherAPI(api_type='json')
+        self.assertIn('"action": "release_live"', publisher_api.changes_since(seq))
+
+    def test_release_publisher_go_live(self):
+        """ unittest a release going live from its publish_datetime """
+        response = self.publisher_api.add_content_release('site1', 'title1', '0.1')
+        live_uuid = response['content'].uuid
+        self.publisher_api.set_stage_content_release('site1', live_uuid)
+        self.publisher_api.set_live_content_release('site1', live_uuid)
+        response = self.publisher_api.add_content_release('site1', 'title2', '0.2')
+        release_uuid = response['content'].uuid
+        self.publisher_api.set_stage_content_release('site1', release_uuid)
+        ContentRelease.objects.filter(uuid=release_uuid).update(
+            publish_datetime=timezone.now() - timezone.timedelta(minutes=1))
+        seq = ReleaseChangeEvent.objects.order_by('seq').last().seq
+
+        ContentRelease.objects.live('site1')
+        self.assertEqual(list(ReleaseChangeEvent.objects.filter(seq__gt=seq).values_list(
+            'action', 'release_uuid')), [
+                ('release_live', release_uuid),
+                ('release_archived', live_uuid),
+            ])
+
+    def test_rollback(self):
+        """ unittest the mutation is rolled back if the change can't be recorded """
+        response = self.publisher_api.add_content_release('site1', 'title1', '0.1')
+        release_uuid = response['content'].uuid
+        with mock.patch(
+                'djangosnapshotpublisher.changefeed.ReleaseChangeEvent.objects.bulk_create',
+                side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.publisher_api.publish_document_to_content_release(
+                    'site1', release_uuid, '{"page": 1}', 'key1')
+        response = self.publisher_api.get_document_from_content_release(
+            'site1', release_uuid, 'key1')
+        self.assertEqual(response['error_code'], 'release_document_does_not_exist')
+
+    def test_lock_changes(self):
+        """ unittest the advisory locks of the sites on PostgreSQL """
+        connection = mock.MagicMock(vendor='postgresql')
+        cursor = connection.cursor.return_value.__enter__.return_value
+        changefeed.lock_changes(connection, ['site2', 'site1', 'site2'])
+        self.assertEqual(cursor.execute.call_args_list, [
+            mock.call('SELECT pg_advisory_xact_lock(%s, hashtext(%s))',
+                      [changefeed.CHANGES_LOCK_KEY, site_code])
+            for site_code in ['site1', 'site2']
+        ])
+        connection = mock.MagicMock(vendor='sqlite')
+        changefeed.lock_changes(connection, ['site1'])
+        self.assertFalse(connection.cursor.called)
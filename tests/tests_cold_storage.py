@@ -0,0 +1,188 @@
+"""
+.. module:: djangosnapshotpublisher.tests
+   :synopsis: djangosnapshotpublisher unittest
+"""
+
+import json
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from djangosnapshotpublisher.cold_storage import (clear_cache, get_cold_document_json,
+                                                  get_index_name, get_storage, load_bundle_index,
+                                                  write_bundle)
+from djangosnapshotpublisher.delta import make_patch
+from djangosnapshotpublisher.models import ContentRelease, ReleaseDocument
+from djangosnapshotpublisher.publisher_api import PublisherAPI
+from djangosnapshotpublisher.retention import apply_retention
+
+
+class ColdStorageTestCase(TestCase):
+    """ unittest for release_cold_storage command """
+
+    def setUp(self):
+        """ setUp """
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.publisher_api = PublisherAPI(api_type='django')
+
+        # release1 replaced 8 days ago, release2 replaced 1 day ago, release3 is live
+        self.content_releases = []
+        for i, days in enumerate([10, 8, 1], 1):
+            response = self.publisher_api.add_content_release(
+                'site1', 'title{}'.format(i), '0.{}'.format(i))
+            content_release = response['content']
+            self.publisher_api.publish_document_to_content_release(
+                'site1',
+                content_release.uuid,
+                json.dumps({'title': 'Test{}'.format(i), 'seo': {'title': 'SEO'}}),
+                'key1',
+            )
+            if i == 1:
+                self.publisher_api.publish_document_to_content_release(
+                    'site1', content_release.uuid, json.dumps({'title': 'Shared'}), 'key2')
+            self.publisher_api.set_stage_content_release('site1', content_release.uuid)
+            self.publisher_api.set_live_content_release('site1', content_release.uuid)
+            ContentRelease.objects.filter(id=content_release.id).update(
+                publish_datetime=timezone.now() - timezone.timedelta(days=days))
+            self.content_releases.append(content_release)
+
+    def tearDown(self):
+        """ tearDown """
+        clear_cache()
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def call_command(self, *args):
+        """ call_command """
+        out = StringIO()
+        call_command('release_cold_storage', *args, stdout=out)
+        return out.getvalue()
+
+    def test_cold_storage(self):
+        """ unittest for release_cold_storage """
+
+        self.assertEqual(
+            self.call_command('--days=5', '--dry-run'),
+            'Dry run: 1 ReleaseDocument from 1 ContentRelease\n',
+        )
+        self.assertEqual(
+            self.call_command('--days=5'),
+            'Moved 1 ReleaseDocument from 1 ContentRelease\n',
+        )
+        self.assertEqual(
+            self.call_command('--days=5'),
+            'Moved 0 ReleaseDocument from 0 ContentRelease\n',
+        )
+
+        # only the document of release1 not shared with release2 is moved
+        content_release = self.content_releases[0]
+        release_document = ReleaseDocument.objects.get(
+            document_key='key1', content_releases=content_release)
+        self.assertIsNone(release_document.document_json)
+        self.assertTrue(get_storage().exists(release_document.cold_storage_bundle))
+        self.assertEqual(
+            ReleaseDocument.objects.filter(cold_storage_bundle__isnull=False).count(), 1)
+
+        # documents are read from the bundle
+        response = self.publisher_api.get_document_from_content_release(
+            'site1', content_release.uuid, 'key1')
+        self.assertEqual(
+            json.loads(response['content'].document_json),
+            {'title': 'Test1', 'seo': {'title': 'SEO'}},
+        )
+        response = PublisherAPI(api_type='json').get_document_from_content_release(
+            'site1', content_release.uuid, 'key1')
+        self.assertEqual(
+            json.loads(json.loads(response)['content']['document_json']),
+            {'title': 'Test1', 'seo': {'title': 'SEO'}},
+        )
+        response = self.publisher_api.get_document_fields_from_content_release(
+            'site1', content_release.uuid, 'key1', ['seo.title'])
+        self.assertEqual(response['content'], {'seo.title': 'SEO'})
+
+        # publishing the document again stores it in the table
+        self.publisher_api.publish_document_to_content_release(
+            'site1', content_release.uuid, json.dumps({'title': 'Test4'}), 'key1')
+        release_document.refresh_from_db()
+        self.assertIsNone(release_document.cold_storage_bundle)
+        self.assertEqual(release_document.document_json, json.dumps({'title': 'Test4'}))
+
+    def test_bundle(self):
+        """ unittest a document is read alone from its bundle """
+        name = write_bundle('bundles/test.jsonl.gz', [(1, '{"a": 1}'), (2, None), (3, '[3]')])
+        self.assertEqual(sorted(load_bundle_index(name)), [1, 2, 3])
+        self.assertEqual(get_cold_document_json(ReleaseDocument(id=3, cold_storage_bundle=name)),
+                         '[3]')
+        self.assertIsNone(get_cold_document_json(ReleaseDocument(id=2, cold_storage_bundle=name)))
+
+        with self.assertRaises(KeyError):
+            get_cold_document_json(ReleaseDocument(id=4, cold_storage_bundle=name))
+
+    def test_document_cache(self):
+        """ unittest the documents read from a bundle are kept in memory """
+        name = write_bundle('bundles/test.jsonl.gz', [(1, '{"a": 1}'), (2, '[2]'), (3, '[3]')])
+        storage = get_storage()
+        with self.settings(SNAPSHOTPUBLISHER_COLD_DOCUMENT_CACHE_SIZE=2), \
+                mock.patch.object(storage, 'open', wraps=storage.open) as storage_open, \
+                mock.patch('djangosnapshotpublisher.cold_storage.get_storage',
+                           return_value=storage):
+            for document_id in [1, 2, 1]:
+                get_cold_document_json(ReleaseDocument(id=document_id, cold_storage_bundle=name))
+            # the index and the documents 1 and 2
+            self.assertEqual(storage_open.call_count, 3)
+
+            # 2 is evicted, 1 was read last
+            get_cold_document_json(ReleaseDocument(id=3, cold_storage_bundle=name))
+            self.assertEqual(
+                get_cold_document_json(ReleaseDocument(id=1, cold_storage_bundle=name)),
+                '{"a": 1}')
+            self.assertEqual(storage_open.call_count, 4)
+            get_cold_document_json(ReleaseDocument(id=2, cold_storage_bundle=name))
+            self.assertEqual(storage_open.call_count, 5)
+
+    def test_cold_storage_delta(self):
+        """ unittest a document stored as a patch is moved to cold storage in full """
+        base_release_document = ReleaseDocument.objects.get(
+            document_key='key1', content_releases=self.content_releases[2])
+        release_document = ReleaseDocument.objects.get(
+            document_key='key1', content_releases=self.content_releases[0])
+        document = json.loads(release_document.document_json)
+        ReleaseDocument.objects.filter(id=release_document.id).update(
+            document_json=None,
+            document_delta=json.dumps(make_patch(
+                json.loads(base_release_document.document_json), document)),
+            delta_base=base_release_document,
+            delta_depth=1,
+        )
+
+        self.assertEqual(
+            self.call_command('--days=5'),
+            'Moved 1 ReleaseDocument from 1 ContentRelease\n',
+        )
+        release_document.refresh_from_db()
+        self.assertIsNotNone(release_document.cold_storage_bundle)
+        self.assertIsNone(release_document.delta_base)
+        self.assertIsNone(release_document.document_delta)
+        self.assertEqual(json.loads(release_document.get_document_json()), document)
+
+    def test_retention(self):
+        """ unittest release_retention deletes the bundles no document refers to """
+        self.call_command('--days=5')
+        bundle = ReleaseDocument.objects.get(cold_storage_bundle__isnull=False).cold_storage_bundle
+        self.assertEqual(apply_retention(keep=1, site_code='site1', dry_run=True)['bundles'], 1)
+        self.assertTrue(get_storage().exists(bundle))
+
+        report = apply_retention(keep=1, site_code='site1')
+        self.assertEqual(report['content_releases'], 1)
+        self.assertEqual(report['bundles'], 1)
+        self.assertFalse(ReleaseDocument.objects.filter(cold_storage_bundle=bundle).exists())
+        self.assertFalse(get_storage().exists(bundle))
+        self.assertFalse(get_storage().exists(get_index_name(bundle)))
+
@@ -0,0 +1,106 @@
+"""
+.. module:: djangosnapshotpublisher.tests
+   :synopsis: djangosnapshotpublisher unittest
+"""
+
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+
+from djangosnapshotpublisher import compare_cache
+from djangosnapshotpublisher.models import ContentRelease
+from djangosnapshotpublisher.publisher_api import PublisherAPI
+
+
+class CompareCacheTestCase(TransactionTestCase):
+    """ unittest for the cache of compare_content_releases """
+
+    def setUp(self):
+        """ setUp """
+        compare_cache.clear()
+        self.publisher_api = PublisherAPI(api_type='django')
+        response = self.publisher_api.add_content_release('site1', 'title1', '0.1')
+        self.release_uuid1 = response['content'].uuid
+        response = self.publisher_api.add_content_release('site1', 'title2', '0.2')
+        self.release_uuid2 = response['content'].uuid
+        for release_uuid, document_key in [
+                (self.release_uuid1, 'key1'), (self.release_uuid1, 'key2'),
+                (self.release_uuid2, 'key2'), (self.release_uuid2, 'key3')]:
+            self.publisher_api.publish_document_to_content_release(
+                'site1', release_uuid, '{}', document_key)
+
+    def compare(self, use_cache=True):
+        """ compare """
+        response = self.publisher_api.compare_content_releases(
+            'site1', self.release_uuid2, self.release_uuid1, use_cache)
+        self.assertEqual(response['status'], 'success')
+        return [
+            (release_document['document_key'], release_document['diff'])
+            for release_document in response['content']
+        ]
+
+    def test_compare_cache(self):
+        """ unittest compare_content_releases cached until one of the releases changes """
+        comparison = [('key3', 'Added'), ('key2', 'Changed'), ('key1', 'Removed')]
+        self.assertEqual(self.compare(), comparison)
+        # the releases are the only queries
+        with self.assertNumQueries(2):
+            self.assertEqual(self.compare(), comparison)
+        with self.assertNumQueries(11):
+            self.assertEqual(self.compare(use_cache=False), comparison)
+
+        # the cached result can't be modified by the caller
+        response = self.publisher_api.compare_content_releases(
+            'site1', self.release_uuid2, self.release_uuid1)
+        response['content'].clear()
+
+        self.publisher_api.publish_document_to_content_release(
+            'site1', self.release_uuid1, '{}', 'key3')
+        self.assertEqual(self.compare(), [
+            ('key2', 'Changed'), ('key3', 'Changed'), ('key1', 'Removed')])
+
+    def test_transaction(self):
+        """ unittest the comparisons with the uncommitted changes of a transaction """
+        comparison = [('key3', 'Added'), ('key2', 'Changed'), ('key1', 'Removed')]
+        self.assertEqual(self.compare(), comparison)
+        try:
+            with transaction.atomic():
+                self.publisher_api.publish_document_to_content_release(
+                    'site1', self.release_uuid1, '{}', 'key4')
+                # the comparison done before the change isn't hit
+                self.assertEqual(self.compare(), comparison + [('key4', 'Removed')])
+                raise ValueError
+        except ValueError:
+            pass
+        # the comparison of the rolled back transaction wasn't kept
+        self.assertEqual(compare_cache.comparisons, {})
+        self.assertEqual(self.compare(), comparison)
+
+    def test_change_during_comparison(self):
+        """ unittest a comparison done while one of the releases is changed isn't kept """
+        self.compare()
+        compare_cache.clear()
+        key = compare_cache.get_cache_key(
+            [ContentRelease.objects.get(uuid=self.release_uuid2)],
+            [ContentRelease.objects.get(uuid=self.release_uuid1)],
+        )
+        compare_cache.invalidate(self.release_uuid1)
+        compare_cache.set(key, [])
+        self.assertEqual(compare_cache.comparisons, {})
+
+    def test_eviction(self):
+        """ unittest the least recently used comparisons are evicted """
+        self.compare()
+        # room for one comparison
+        with self.settings(SNAPSHOTPUBLISHER_COMPARE_CACHE_BYTES=compare_cache.comparisons_bytes):
+            self.publisher_api.compare_content_releases(
+                'site1', self.release_uuid1, self.release_uuid2)
+        self.assertEqual(len(compare_cache.comparisons), 1)
+        self.assertEqual(list(compare_cache.comparisons)[0][1][0], str(self.release_uuid1))
+        with self.assertNumQueries(11):
+            self.compare()
+
+    @override_settings(SNAPSHOTPUBLISHER_COMPARE_CACHE_BYTES=0)
+    def test_disabled(self):
+        """ unittest SNAPSHOTPUBLISHER_COMPARE_CACHE_BYTES = 0 """
+        self.compare()
+        self.assertEqual(len(compare_cache.comparisons), 0)
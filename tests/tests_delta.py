@@ -0,0 +1,155 @@
+"""
+.. module:: djangosnapshotpublisher.tests
+   :synopsis: djangosnapshotpublisher unittest
+"""
+
+import hashlib
+import json
+
+from django.test import TestCase, override_settings
+
+from djangosnapshotpublisher.backfill import backfill_document_hash_and_size
+from djangosnapshotpublisher.delta import apply_patch, make_patch
+from djangosnapshotpublisher.models import ReleaseDocument
+from djangosnapshotpublisher.publisher_api import PublisherAPI
+
+
+@override_settings(SNAPSHOTPUBLISHER_DELTA_STORAGE=True, SNAPSHOTPUBLISHER_DELTA_MAX_CHAIN=2)
+class DeltaStorageTestCase(TestCase):
+    """ unittest for the delta storage of ReleaseDocument """
+
+    def setUp(self):
+        """ setUp """
+        self.publisher_api = PublisherAPI(api_type='django')
+        self.document = {
+            'title': 'Test1',
+            'seo': {'title': 'SEO title', 'a/b~c': 1},
+            'items': [{'name': 'item1'}, {'name': 'item2'}],
+            'body': 'x' * 1000,
+        }
+
+    def go_live(self, version, document, base=True):
+        """ create a release with one document based on the live release and set it live """
+        response = self.publisher_api.add_content_release(
+            'site1', 'title{}'.format(version), version, None, None, base)
+        content_release = response['content']
+        self.publisher_api.publish_document_to_content_release(
+            'site1', content_release.uuid, json.dumps(document), 'key1')
+        self.publisher_api.set_stage_content_release('site1', content_release.uuid)
+        self.publisher_api.set_live_content_release('site1', content_release.uuid)
+        return content_release
+
+    def get_release_document(self, content_release):
+        """ get_release_document """
+        return ReleaseDocument.objects.get(
+            document_key='key1', content_releases=content_release.id)
+
+    def test_make_patch(self):
+        """ unittest for make_patch and apply_patch """
+        target = {
+            'title': 'Test2',
+            'seo': {'a/b~c': 2, 'description': None},
+            'items': [{'name': 'item1'}, {'name': 'item3'}],
+            'body': 'x' * 1000,
+        }
+        patch = make_patch(self.document, target)
+        self.assertEqual(apply_patch(json.loads(json.dumps(self.document)), patch), target)
+        self.assertEqual(make_patch(self.document, self.document), [])
+        self.assertEqual(apply_patch({'a': 1}, make_patch({'a': 1}, [1, 2])), [1, 2])
+        self.assertEqual(make_patch({'a': 1}, {'a': True}), [
+            {'op': 'replace', 'path': '/a', 'value': True},
+        ])
+
+    def test_publish_delta(self):
+        """ unittest for publish_document_to_content_release with delta storage """
+        content_release1 = self.go_live('0.1', self.document, False)
+        release_document1 = self.get_release_document(content_release1)
+        self.assertIsNone(release_document1.delta_base)
+
+        # a changed document is stored as a patch against the base release document
+        documents = [self.document]
+        content_releases = [content_release1]
+        for i in range(2, 5):
+            document = dict(documents[-1], title='Test{}'.format(i))
+            content_releases.append(self.go_live('0.{}'.format(i), document))
+            documents.append(document)
+
+        release_documents = [self.get_release_document(r) for r in content_releases]
+        self.assertEqual([r.delta_depth for r in release_documents], [0, 1, 2, 0])
+        self.assertEqual(release_documents[1].delta_base, release_documents[0])
+        self.assertIsNone(release_documents[1].document_json)
+        self.assertIsNone(release_documents[3].delta_base)
+        for release_document, document in zip(release_documents, documents):
+            self.assertEqual(json.loads(release_document.get_document_json()), document)
+
+        # reads are transparent
+        response = self.publisher_api.get_document_from_content_release(
+            'site1', content_releases[2].uuid, 'key1')
+        self.assertEqual(json.loads(response['content'].document_json), documents[2])
+        self.assertEqual(json.loads(response['content'].to_dict()['document_json']), documents[2])
+        response = self.publisher_api.get_documents_from_content_release(
+            'site1', content_releases[2].uuid, ['key1'])
+        self.assertEqual(json.loads(response['content'][0].document_json), documents[2])
+        response = self.publisher_api.get_document_fields_from_content_release(
+            'site1', content_releases[2].uuid, 'key1', ['title', 'seo.title'])
+        self.assertEqual(response['content'], {'title': 'Test3', 'seo.title': 'SEO title'})
+        response = PublisherAPI(api_type='json').get_document_from_content_release(
+            'site1', content_releases[2].uuid, 'key1')
+        self.assertEqual(
+            json.loads(json.loads(response)['content']['document_json']), documents[2])
+
+        # updating or deleting a base document keeps the patches readable
+        release_documents[0].delete()
+        release_documents[1].refresh_from_db()
+        self.assertIsNone(release_documents[1].delta_base)
+        self.assertEqual(json.loads(release_documents[1].document_json), documents[1])
+        self.publisher_api.publish_document_to_content_release(
+            'site1', content_releases[1].uuid, json.dumps({'title': 'Test'}), 'key1')
+        release_documents[2].refresh_from_db()
+        self.assertIsNone(release_documents[2].delta_base)
+        self.assertEqual(json.loads(release_documents[2].get_document_json()), documents[2])
+
+    def test_backfill(self):
+        """ unittest the document_hash and document_size of the patches set by the backfill """
+        content_releases = [self.go_live('0.1', self.document, False)]
+        content_releases.append(self.go_live('0.2', dict(self.document, title='Test2')))
+        release_document = self.get_release_document(content_releases[1])
+        self.assertIsNotNone(release_document.delta_base)
+        ReleaseDocument.objects.update(document_hash=None, document_size=None)
+
+        self.assertEqual(backfill_document_hash_and_size(), 2)
+        for content_release in content_releases:
+            release_document = self.get_release_document(content_release)
+            document_bytes = release_document.get_document_json().encode('utf-8')
+            self.assertEqual(release_document.document_hash,
+                             hashlib.sha1(document_bytes).hexdigest())
+            self.assertEqual(release_document.document_size, len(document_bytes))
+
+    def test_publish_without_delta(self):
+        """ unittest for documents that are not stored as a patch """
+        content_release1 = self.go_live('0.1', self.document, False)
+
+        # small document, the patch isn't smaller than the document
+        response = self.publisher_api.add_content_release('site1', 'title2', '0.2', None, None, True)
+        content_release2 = response['content']
+        self.publisher_api.publish_document_to_content_release(
+            'site1', content_release2.uuid, json.dumps({'title': 'Test2'}), 'key1')
+        self.assertIsNone(self.get_release_document(content_release2).delta_base)
+
+        # document_json that can't be rebuilt exactly
+        document_json = json.dumps(dict(self.document, title='Test3'), indent=2)
+        self.publisher_api.publish_document_to_content_release(
+            'site1', content_release2.uuid, document_json, 'key1')
+        self.assertEqual(self.get_release_document(content_release2).document_json, document_json)
+
+        # deleted document
+        self.publisher_api.publish_document_to_content_release(
+            'site1', content_release2.uuid, json.dumps(dict(self.document, title='Test4')), 'key1')
+        self.assertIsNotNone(self.get_release_document(content_release2).delta_base)
+        self.publisher_api.delete_document_from_content_release(
+            'site1', content_release2.uuid, 'key1')
+        release_document = self.get_release_document(content_release2)
+        self.assertIsNone(release_document.delta_base)
+        self.assertIsNone(release_document.get_document_json())
+        self.assertEqual(
+            json.loads(self.get_release_document(content_release1).document_json), self.document)
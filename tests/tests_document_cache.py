@@ -0,0 +1,116 @@
+"""
+.. module:: djangosnapshotpublisher.tests
+   :synopsis: djangosnapshotpublisher unittest
+"""
+
+from io import StringIO
+import json
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+
+from djangosnapshotpublisher import document_cache, jobs
+from djangosnapshotpublisher.models import ReleaseJob
+from djangosnapshotpublisher.publisher_api import PublisherAPI
+
+
+@override_settings(SNAPSHOTPUBLISHER_DOCUMENT_CACHE='default')
+class DocumentCacheTestCase(TransactionTestCase):
+    """ unittest for the document cache and its warm up, done by threads once the documents are
+    committed """
+
+    def setUp(self):
+        """ setUp """
+        cache.clear()
+        document_cache.access_counters.clear()
+        self.publisher_api = PublisherAPI(api_type='django')
+
+    def add_content_release(self, version, document_keys):
+        """ add a staged release with documents """
+        response = self.publisher_api.add_content_release(
+            'site1', 'title{}'.format(version), version)
+        content_release = response['content']
+        for document_key in document_keys:
+            self.publisher_api.publish_document_to_content_release(
+                'site1', content_release.uuid, '{{"key": "{}"}}'.format(document_key),
+                document_key)
+        self.publisher_api.set_stage_content_release('site1', content_release.uuid)
+        return content_release
+
+    def get_document(self, content_release, document_key):
+        """ get_document """
+        response = self.publisher_api.get_document_from_content_release(
+            'site1', content_release.uuid, document_key)
+        self.assertEqual(response['status'], 'success')
+        return response['content'].document_json
+
+    def test_cache(self):
+        """ unittest documents read from the cache and invalidated """
+        content_release = self.add_content_release('0.1', ['key1'])
+        self.assertEqual(self.get_document(content_release, 'key1'), '{"key": "key1"}')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_document(content_release, 'key1'), '{"key": "key1"}')
+
+        self.publisher_api.publish_document_to_content_release(
+            'site1', content_release.uuid, '{"key": "new"}', 'key1')
+        self.assertEqual(self.get_document(content_release, 'key1'), '{"key": "new"}')
+
+        self.publisher_api.unpublish_document_from_content_release(
+            'site1', content_release.uuid, 'key1')
+        response = self.publisher_api.get_document_from_content_release(
+            'site1', content_release.uuid, 'key1')
+        self.assertEqual(response['error_code'], 'release_document_does_not_exist')
+
+    def test_warm_up_on_stage(self):
+        """ unittest the cache warmed up by a job when a release is staged, before it goes live """
+        with transaction.atomic():
+            content_release = self.add_content_release('0.1', ['key1', 'key2', 'key3'])
+            # nothing is read by the request
+            self.assertIsNone(document_cache.get_document(
+                'site1', content_release.uuid, 'content', 'key1'))
+        job = ReleaseJob.objects.get(action='warm_up')
+        self.assertEqual((job.site_code, job.release_uuid), ('site1', content_release.uuid))
+
+        self.assertEqual(jobs.run_worker(once=True), 1)
+        job.refresh_from_db()
+        self.assertEqual(json.loads(job.result)['warmed'], 3)
+        self.publisher_api.set_live_content_release('site1', content_release.uuid)
+        with self.assertNumQueries(0):
+            for document_key in ['key1', 'key2', 'key3']:
+                self.assertEqual(
+                    self.get_document(content_release, document_key),
+                    '{{"key": "{}"}}'.format(document_key),
+                )
+
+        # a rolled back staging has no job
+        try:
+            with transaction.atomic():
+                self.add_content_release('0.2', ['key1'])
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(ReleaseJob.objects.filter(action='warm_up').count(), 1)
+
+    @override_settings(SNAPSHOTPUBLISHER_DOCUMENT_CACHE_WARM_UP=False)
+    def test_warm_up_top(self):
+        """ unittest the warm up of the most read documents """
+        content_release = self.add_content_release('0.1', ['key1', 'key2', 'key3'])
+        for document_key in ['key1', 'key3', 'key3', 'key2', 'key3', 'key2']:
+            self.get_document(content_release, document_key)
+        cache.clear()
+
+        report = document_cache.warm_up_content_release(content_release, top=2, batch_size=1)
+        self.assertEqual(report['release_documents'], 3)
+        self.assertEqual(report['warmed'], 2)
+        self.assertAlmostEqual(report['coverage'], 2 / 3)
+        with self.assertNumQueries(0):
+            self.get_document(content_release, 'key3')
+            self.get_document(content_release, 'key2')
+        with self.assertNumQueries(2):
+            self.get_document(content_release, 'key1')
+
+        out = StringIO()
+        call_command('release_warm_up_cache', 'site1', '--stage', stdout=out)
+        self.assertIn('Warmed up 3/3 ReleaseDocument (100%)', out.getvalue())
@@ -0,0 +1,73 @@
+"""
+.. module:: djangosnapshotpublisher.tests
+   :synopsis: djangosnapshotpublisher unittest
+"""
+
+import uuid
+
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+
+from djangosnapshotpublisher.identity_map import get_scope, release_scope
+from djangosnapshotpublisher.middleware import IdentityMapMiddleware
+from djangosnapshotpublisher.publisher_api import PublisherAPI
+
+
+class IdentityMapTestCase(TestCase):
+    """ unittest for the ContentRelease lookups memoized in a scope """
+
+    def setUp(self):
+        """ setUp """
+        self.publisher_api = PublisherAPI(api_type='django')
+        response = self.publisher_api.add_content_release('site1', 'title1', '0.1')
+        self.release_uuid = response['content'].uuid
+        for document_key in ['key1', 'key2']:
+            self.publisher_api.publish_document_to_content_release(
+                'site1', self.release_uuid, '{}', document_key)
+        self.publisher_api.set_stage_content_release('site1', self.release_uuid)
+        self.publisher_api.set_live_content_release('site1', self.release_uuid)
+
+    def test_release_scope(self):
+        """ unittest release_scope """
+        with self.assertNumQueries(4):
+            for document_key in ['key1', 'key2']:
+                self.publisher_api.get_document_from_content_release(
+                    'site1', self.release_uuid, document_key)
+
+        with release_scope():
+            with self.assertNumQueries(3):
+                for document_key in ['key1', 'key2']:
+                    self.publisher_api.get_document_from_content_release(
+                        'site1', self.release_uuid, document_key)
+            self.publisher_api.get_live_content_release('site1')
+            with self.assertNumQueries(0):
+                self.publisher_api.get_live_content_release('site1')
+            unknown_uuid = uuid.uuid4()
+            with self.assertNumQueries(1):
+                for _ in range(2):
+                    response = self.publisher_api.get_content_release_details(
+                        'site1', unknown_uuid)
+                    self.assertEqual(response['error_code'], 'content_release_does_not_exist')
+
+            # invalidated on write
+            self.publisher_api.update_content_release('site1', self.release_uuid, 'title2')
+            response = self.publisher_api.get_content_release_details('site1', self.release_uuid)
+            self.assertEqual(response['content'].title, 'title2')
+
+            with release_scope() as scope:
+                self.assertIs(scope, get_scope())
+            self.assertIsNotNone(get_scope())
+        self.assertIsNone(get_scope())
+
+    def test_middleware(self):
+        """ unittest IdentityMapMiddleware """
+        def view(request):
+            """ view """
+            for document_key in ['key1', 'key2']:
+                self.publisher_api.get_document_from_content_release(
+                    'site1', self.release_uuid, document_key)
+            return HttpResponse()
+
+        with self.assertNumQueries(3):
+            IdentityMapMiddleware(view)(RequestFactory().get('/'))
+        self.assertIsNone(get_scope())
@@ -0,0 +1,89 @@
+"""
+.. module:: djangosnapshotpublisher.tests
+   :synopsis: djangosnapshotpublisher unittest
+"""
+
+import uuid
+
+from django.test import TestCase
+
+from djangosnapshotpublisher.models import ReleaseChangeEvent
+from djangosnapshotpublisher.publisher_api import PublisherAPI
+
+
+class IncrementalCompareTestCase(TestCase):
+    """ unittest for compare_content_releases from a previous comparison token """
+
+    def setUp(self):
+        """ setUp """
+        self.publisher_api = PublisherAPI(api_type='django')
+        response = self.publisher_api.add_content_release('site1', 'title1', '0.1')
+        self.release_uuid1 = response['content'].uuid
+        response = self.publisher_api.add_content_release('site1', 'title2', '0.2')
+        self.release_uuid2 = response['content'].uuid
+        for release_uuid, document_key in [
+                (self.release_uuid1, 'key1'), (self.release_uuid1, 'key2'),
+                (self.release_uuid2, 'key2'), (self.release_uuid2, 'key3')]:
+            self.publisher_api.publish_document_to_content_release(
+                'site1', release_uuid, '{}', document_key)
+
+    def compare(self, token=None):
+        """ compare """
+        response = self.publisher_api.compare_content_releases(
+            'site1', self.release_uuid2, self.release_uuid1, incremental=True, token=token)
+        self.assertEqual(response['status'], 'success')
+        return response['content']['token'], response['content']['incremental'], [
+            (release_document['document_key'], release_document['diff'])
+            for release_document in response['content']['comparison']
+        ]
+
+    def test_incremental_compare(self):
+        """ unittest compare_content_releases with incremental=True """
+        token, incremental, comparison = self.compare()
+        self.assertFalse(incremental)
+        self.assertEqual(comparison, [('key3', 'Added'), ('key2', 'Changed'), ('key1', 'Removed')])
+
+        # nothing changed
+        token, incremental, comparison = self.compare(token)
+        self.assertTrue(incremental)
+        self.assertEqual(comparison, [])
+
+        self.publisher_api.publish_document_to_content_release(
+            'site1', self.release_uuid2, '{}', 'key1')
+        self.publisher_api.publish_document_to_content_release(
+            'site1', self.release_uuid1, '{}', 'key4')
+        self.publisher_api.unpublish_document_from_content_release(
+            'site1', self.release_uuid2, 'key3')
+        token, incremental, comparison = self.compare(token)
+        self.assertTrue(incremental)
+        self.assertEqual(comparison, [
+            ('key1', 'Changed'), ('key4', 'Removed'), ('key3', 'Unchanged')])
+
+        # a token of other releases, or an invalid token, gives the full comparison
+        response = self.publisher_api.compare_content_releases(
+            'site1', self.release_uuid1, self.release_uuid2, incremental=True, token=token)
+        self.assertFalse(response['content']['incremental'])
+        self.assertFalse(self.compare('invalid')[1])
+
+        # the documents of the release are replaced when it's staged
+        self.publisher_api.set_stage_content_release('site1', self.release_uuid2)
+        self.assertFalse(self.compare(token)[1])
+
+    def test_late_change(self):
+        """ unittest a change committed after the token with a lower seq than the token """
+        # seq taken by a transaction committed after the comparison
+        late_seq = ReleaseChangeEvent.objects.create(
+            site_code='site2', release_uuid=uuid.uuid4(), action='release_added').seq
+        token, incremental, comparison = self.compare()
+        self.assertFalse(incremental)
+
+        ReleaseChangeEvent.objects.filter(seq=late_seq).delete()
+        self.publisher_api.unpublish_document_from_content_release(
+            'site1', self.release_uuid2, 'key3')
+        ReleaseChangeEvent.objects.filter(seq=ReleaseChangeEvent.objects.order_by(
+            'seq').last().seq).update(seq=late_seq)
+        token, incremental, comparison = self.compare(token)
+        self.assertFalse(incremental)
+        self.assertEqual(comparison, [('key2', 'Changed'), ('key1', 'Removed')])
+        self.assertTrue(self.compare(token)[1])
+
@@ -0,0 +1,139 @@
+"""
+.. module:: djangosnapshotpublisher.tests
+   :synopsis: djangosnapshotpublisher unittest
+"""
+
+from io import StringIO
+import json
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from djangosnapshotpublisher.ingest import CopyStream, to_copy_line
+from djangosnapshotpublisher.models import ContentRelease, ReleaseChangeEvent, ReleaseDocument
+from djangosnapshotpublisher.publisher_api import PublisherAPI
+
+
+class IngestTestCase(TestCase):
+    """ unittest for ingest_documents_to_content_release """
+
+    def setUp(self):
+        """ setUp """
+        self.publisher_api = PublisherAPI(api_type='django')
+        response = self.publisher_api.add_content_release('site1', 'title1', '0.1')
+        self.release_uuid = response['content'].uuid
+        self.publisher_api.publish_document_to_content_release(
+            'site1', self.release_uuid, '{"old": true}', 'key1', parameters={'p1': 'old'})
+
+    def test_ingest(self):
+        """ unittest the documents and parameters are added to the release """
+        documents = [
+            {'document_key': 'key{}'.format(index), 'document_json': json.dumps({'i': index}),
+             'parameters': {'p1': str(index)}}
+            for index in range(5)
+        ]
+        documents.append({'document_key': 'key4', 'content_type': 'page', 'document_json': '{}'})
+        documents.append({'document_key': 'key3', 'document_json': '{"last": true}'})
+        response = self.publisher_api.ingest_documents_to_content_release(
+            'site1', self.release_uuid, iter(documents))
+        self.assertEqual(response['status'], 'success')
+        self.assertEqual(response['content']['method'],
+                         'copy' if connection.vendor == 'postgresql' else 'bulk_create')
+        self.assertEqual(response['content']['documents'], 6)
+        self.assertEqual(response['content']['parameters'], 4)
+
+        content_release = ContentRelease.objects.get(uuid=self.release_uuid)
+        self.assertEqual(content_release.release_documents.count(), 6)
+        # replaced
+        response = self.publisher_api.get_document_from_content_release(
+            'site1', self.release_uuid, 'key1')
+        self.assertEqual(json.loads(response['content'].document_json), {'i': 1})
+        self.assertEqual(response['content'].site_code, 'site1')
+        response = self.publisher_api.get_document_extra_from_content_release(
+            'site1', self.release_uuid, 'key1')
+        self.assertEqual(list(response['content'].values_list('key', 'content')), [('p1', '1')])
+        # the last document wins, without the parameters of the first one
+        response = self.publisher_api.get_document_extra_from_content_release(
+            'site1', self.release_uuid, 'key3')
+        self.assertFalse(response['content'].exists())
+        response = self.publisher_api.get_document_from_content_release(
+            'site1', self.release_uuid, 'key4', 'page')
+        self.assertEqual(response['content'].document_json, '{}')
+        self.assertEqual(response['content'].document_size, 2)
+        self.assertEqual(ReleaseChangeEvent.objects.order_by('seq').last().action,
+                         'release_documents_ingested')
+
+    def test_replaced(self):
+        """ unittest the replaced documents are deleted unless they are in another release """
+        old_document = ReleaseDocument.objects.get(document_key='key1')
+        response = self.publisher_api.copy_content_release('site1', self.release_uuid)
+        copy_uuid = response['content'].uuid
+        self.publisher_api.ingest_documents_to_content_release(
+            'site1', self.release_uuid, [{'document_key': 'key1', 'document_json': '{}'}])
+        # still in the copy
+        self.assertTrue(ReleaseDocument.objects.filter(id=old_document.id).exists())
+
+        self.publisher_api.ingest_documents_to_content_release(
+            'site1', copy_uuid, [{'document_key': 'key1', 'document_json': '{"copy": true}'}])
+        self.assertFalse(ReleaseDocument.objects.filter(id=old_document.id).exists())
+        self.assertFalse(ReleaseDocument.objects.filter(content_releases__isnull=True).exists())
+        self.assertEqual(ReleaseDocument.objects.filter(document_key='key1').count(), 2)
+
+    @skipUnless(connection.vendor == 'postgresql', 'COPY is only available on PostgreSQL')
+    def test_copy(self):
+        """ unittest the COPY ingest, twice in the same transaction """
+        old_document = ReleaseDocument.objects.get(document_key='key1')
+        for index in range(2):
+            response = self.publisher_api.ingest_documents_to_content_release(
+                'site1', self.release_uuid, iter([
+                    {'document_key': 'key1', 'document_json': '{"first": true}',
+                     'parameters': {'p1': 'first'}},
+                    {'document_key': 'key2', 'document_json': '{}'},
+                    {'document_key': 'key1', 'document_json': json.dumps({'i': index}),
+                     'parameters': {'p1': str(index), 'p2': 'tab\tnew\nline'}},
+                ]), method='copy')
+            self.assertEqual(response['content']['method'], 'copy')
+            self.assertEqual(response['content']['documents'], 2)
+            self.assertEqual(response['content']['parameters'], 2)
+
+        self.assertFalse(ReleaseDocument.objects.filter(id=old_document.id).exists())
+        self.assertEqual(ReleaseDocument.objects.count(), 2)
+        response = self.publisher_api.get_document_from_content_release(
+            'site1', self.release_uuid, 'key1')
+        self.assertEqual(json.loads(response['content'].document_json), {'i': 1})
+        response = self.publisher_api.get_document_extra_from_content_release(
+            'site1', self.release_uuid, 'key1')
+        self.assertEqual(sorted(response['content'].values_list('key', 'content')),
+                         [('p1', '1'), ('p2', 'tab\tnew\nline')])
+
+    def test_errors(self):
+        """ unittest an unknown release or method """
+        response = self.publisher_api.ingest_documents_to_content_release(
+            'site2', self.release_uuid, [])
+        self.assertEqual(response['error_code'], 'content_release_does_not_exist')
+        with self.assertRaises(ValueError):
+            self.publisher_api.ingest_documents_to_content_release(
+                'site1', self.release_uuid, [], method='unknown')
+        if connection.vendor != 'postgresql':
+            with self.assertRaises(ValueError):
+                self.publisher_api.ingest_documents_to_content_release(
+                    'site1', self.release_uuid, [], method='copy')
+
+    def test_copy_stream(self):
+        """ unittest the COPY text format """
+        self.assertEqual(to_copy_line([1, None, 'a\tb\\c\nd']), '1\t\\N\ta\\tb\\\\c\\nd\n')
+        stream = CopyStream([[index, 'key'] for index in range(3)])
+        self.assertEqual(stream.read(3), b'0\tk')
+        self.assertEqual(stream.read(), b'ey\n1\tkey\n2\tkey\n')
+        self.assertEqual(stream.read(10), b'')
+
+    def test_benchmark(self):
+        """ unittest the release_ingest_benchmark command """
+        stdout = StringIO()
+        call_command('release_ingest_benchmark', '--documents', '20', '--batch-size', '7',
+                     stdout=stdout)
+        self.assertIn('bulk_create: 20 documents, 40 parameters', stdout.getvalue())
+        self.assertFalse(ContentRelease.objects.filter(site_code='benchmark').exists())
+        self.assertFalse(ReleaseDocument.objects.filter(content_type='benchmark').exists())
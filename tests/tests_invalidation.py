@@ -0,0 +1,150 @@
+"""
+.. module:: djangosnapshotpublisher.tests
+   :synopsis: djangosnapshotpublisher unittest
+"""
+
+from unittest import mock
+import uuid
+
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+
+from djangosnapshotpublisher import compare_cache, document_cache, invalidation
+from djangosnapshotpublisher.invalidation import DatabaseTransport, get_transport
+from djangosnapshotpublisher.models import ReleaseCacheVersion
+from djangosnapshotpublisher.publisher_api import PublisherAPI
+from djangosnapshotpublisher.signals import content_release_invalidated
+
+
+class InvalidationTestCase(TransactionTestCase):
+    """ unittest for the invalidation broadcast """
+
+    def setUp(self):
+        """ setUp """
+        invalidation.transports.clear()
+        self.publisher_api = PublisherAPI(api_type='django')
+        self.invalidated = []
+        content_release_invalidated.connect(self.on_invalidated)
+
+    def tearDown(self):
+        """ tearDown """
+        content_release_invalidated.disconnect(self.on_invalidated)
+
+    def on_invalidated(self, sender, site_code, release_uuid, **kwargs):
+        """ on_invalidated """
+        self.invalidated.append((site_code, release_uuid))
+
+    def add_content_release(self, site_code='site1'):
+        """ add_content_release """
+        response = self.publisher_api.add_content_release(site_code, 'title1', '0.1')
+        return response['content'].uuid
+
+    def test_coalesce(self):
+        """ unittest a bulk publish broadcasts once per release """
+        release_uuid = self.add_content_release()
+        other_release_uuid = self.add_content_release('site2')
+        self.invalidated.clear()
+
+        with mock.patch.object(get_transport(), 'publish') as publish:
+            with transaction.atomic():
+                for index in range(3):
+                    self.publisher_api.publish_document_to_content_release(
+                        'site1', release_uuid, '{}', 'key{}'.format(index))
+                    self.publisher_api.publish_document_to_content_release(
+                        'site2', other_release_uuid, '{}', 'key{}'.format(index))
+                self.assertEqual(self.invalidated, [])
+
+        self.assertEqual(self.invalidated, [('site1', release_uuid), ('site2', other_release_uuid)])
+        publish.assert_called_once_with(self.invalidated)
+
+    def test_rollback(self):
+        """ unittest a rolled back change isn't lost for the next transaction """
+        release_uuid = self.add_content_release()
+        self.invalidated.clear()
+        try:
+            with transaction.atomic():
+                self.publisher_api.publish_document_to_content_release(
+                    'site1', release_uuid, '{}', 'key1')
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(self.invalidated, [])
+
+        self.publisher_api.publish_document_to_content_release(
+            'site1', release_uuid, '{}', 'key1')
+        self.assertEqual(self.invalidated, [('site1', release_uuid)])
+
+    @override_settings(
+        SNAPSHOTPUBLISHER_INVALIDATION_TRANSPORT='djangosnapshotpublisher.invalidation.'
+                                                 'DatabaseTransport',
+        SNAPSHOTPUBLISHER_INVALIDATION_POLL_INTERVAL=0,
+    )
+    def test_database_transport(self):
+        """ unittest the processes polling the version table """
+        other_process_transport = DatabaseTransport()
+        self.assertEqual(other_process_transport.poll(), [])
+        # nothing is cached before the first poll
+        invalidation.poll()
+
+        release_uuid = self.add_content_release()
+        self.publisher_api.publish_document_to_content_release(
+            'site1', release_uuid, '{}', 'key1')
+        self.publisher_api.publish_document_to_content_release(
+            'site1', release_uuid, '{}', 'key2')
+        self.assertEqual(other_process_transport.poll(), [('site1', release_uuid)])
+        self.assertEqual(other_process_transport.poll(), [])
+
+        # this process receives its own changes when they are committed, not by polling
+        self.invalidated.clear()
+        invalidation.poll()
+        self.assertEqual(self.invalidated, [])
+
+        # the changes of the other process are received once
+        other_process_transport.publish([('site1', release_uuid)])
+        invalidation.poll()
+        invalidation.poll()
+        self.assertEqual(self.invalidated, [('site1', release_uuid)])
+        self.assertEqual(other_process_transport.poll(), [])
+
+    @override_settings(SNAPSHOTPUBLISHER_INVALIDATION_POLL_INTERVAL=0)
+    def test_database_transport_order(self):
+        """ unittest a version committed after a higher version isn't skipped """
+        release_uuids = [uuid.uuid4() for index in range(3)]
+        transport = DatabaseTransport()
+        self.assertEqual(transport.poll(), [])
+        ReleaseCacheVersion.objects.create(id=2, site_code='site1', release_uuid=release_uuids[0])
+        self.assertEqual(transport.poll(), [('site1', release_uuids[0])])
+        ReleaseCacheVersion.objects.create(id=1, site_code='site1', release_uuid=release_uuids[1])
+        self.assertEqual(transport.poll(), [('site1', release_uuids[1])])
+        self.assertEqual(transport.poll(), [])
+
+        # after the lag, the versions are only read after the last one
+        with override_settings(SNAPSHOTPUBLISHER_INVALIDATION_LAG=0):
+            self.assertEqual(transport.poll(), [])
+        self.assertEqual((transport.last_version, transport.received_versions), (2, {}))
+        ReleaseCacheVersion.objects.create(id=3, site_code='site1', release_uuid=release_uuids[2])
+        self.assertEqual(transport.poll(), [('site1', release_uuids[2])])
+
+    @override_settings(SNAPSHOTPUBLISHER_DOCUMENT_CACHE='default')
+    def test_caches(self):
+        """ unittest the document and compare caches dropped by the changes of another process """
+        compare_cache.clear()
+        release_uuid = self.add_content_release()
+        other_release_uuid = self.publisher_api.add_content_release(
+            'site1', 'title2', '0.2')['content'].uuid
+        self.publisher_api.publish_document_to_content_release(
+            'site1', release_uuid, '{}', 'key1')
+        self.publisher_api.get_document_from_content_release('site1', release_uuid, 'key1')
+        self.assertIsNotNone(document_cache.get_document('site1', release_uuid, 'content', 'key1'))
+        self.publisher_api.compare_content_releases('site1', release_uuid, other_release_uuid)
+        self.assertEqual(len(compare_cache.comparisons), 1)
+
+        # the changes of this process invalidated what they changed
+        invalidation.receive([('site1', release_uuid)], remote=False)
+        self.assertIsNotNone(document_cache.get_document('site1', release_uuid, 'content', 'key1'))
+        self.assertEqual(len(compare_cache.comparisons), 0)
+
+        self.publisher_api.compare_content_releases('site1', release_uuid, other_release_uuid)
+        invalidation.receive([('site1', release_uuid)])
+        self.assertIsNone(document_cache.get_document('site1', release_uuid, 'content', 'key1'))
+        self.assertEqual(len(compare_cache.comparisons), 0)
@@ -0,0 +1,166 @@
+"""
+.. module:: djangosnapshotpublisher.tests
+   :synopsis: djangosnapshotpublisher unittest
+"""
+
+from datetime import timedelta
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from djangosnapshotpublisher import jobs
+from djangosnapshotpublisher.models import ContentRelease, ReleaseJob
+from djangosnapshotpublisher.publisher_api import PublisherAPI
+
+
+class ReleaseJobTestCase(TestCase):
+    """ unittest for the ContentRelease operations run in the background """
+
+    def setUp(self):
+        """ setUp """
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        self.publisher_api = PublisherAPI(api_type='django')
+        response = self.publisher_api.add_content_release('site1', 'title1', '0.1')
+        self.release_uuid = response['content'].uuid
+        for document_key in ['key1', 'key2']:
+            self.publisher_api.publish_document_to_content_release(
+                'site1', self.release_uuid, '{}', document_key)
+
+    def enqueue(self, action):
+        """ enqueue a job with the admin action """
+        content_release = ContentRelease.objects.get(uuid=self.release_uuid)
+        response = self.client.post('/admin/djangosnapshotpublisher/contentrelease/', {
+            'action': 'enqueue_{}_jobs'.format(action),
+            '_selected_action': [content_release.id],
+        }, follow=True)
+        self.assertContains(response, '1 job(s) enqueued')
+        return ReleaseJob.objects.latest('id')
+
+    def test_jobs(self):
+        """ unittest the admin actions run by the release_jobs command """
+        job = self.enqueue('copy')
+        self.assertEqual(job.status, 0)
+        self.assertEqual(job.created_by, 'admin')
+        self.enqueue('stage')
+        self.enqueue('live')
+        # the release is staged by the worker, not by the request
+        self.assertEqual(ContentRelease.objects.get(uuid=self.release_uuid).status, 0)
+
+        self.assertEqual(jobs.run_worker(once=True), 3)
+        self.assertEqual(ContentRelease.objects.get(uuid=self.release_uuid).status, 2)
+        self.assertEqual(list(ReleaseJob.objects.values_list('status', 'progress')),
+                         [(2, 100), (2, 100), (2, 100)])
+        job.refresh_from_db()
+        copy_uuid = json.loads(job.result)['release_uuid']
+        self.assertTrue(ContentRelease.objects.filter(uuid=copy_uuid, status=0).exists())
+
+        # a failed job keeps the error
+        job = self.enqueue('unstage')
+        call_command('release_jobs', '--once', stdout=open(os.devnull, 'w'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 3)
+        self.assertEqual(job.error, 'No Stage Content Release')
+        response = self.client.get(
+            '/admin/djangosnapshotpublisher/releasejob/{}/change/'.format(job.id))
+        self.assertContains(response, 'No Stage Content Release')
+
+        # the copy of the live release gets the next version
+        job = self.enqueue('copy')
+        jobs.run_worker(once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 2)
+        self.assertEqual(ContentRelease.objects.get(
+            uuid=json.loads(job.result)['release_uuid']).version, '0.2')
+
+        response = self.client.get('/admin/djangosnapshotpublisher/releasejob/')
+        self.assertEqual(response.context['cl'].result_count, 5)
+
+    def test_copy_live(self):
+        """ unittest a copy job of the live release, without version """
+        self.publisher_api.set_stage_content_release('site1', self.release_uuid)
+        self.publisher_api.set_live_content_release('site1', self.release_uuid)
+        self.publisher_api.add_content_release('site1', 'title2', '0.3')
+        self.publisher_api.set_stage_content_release(
+            'site1', ContentRelease.objects.get(title='title2').uuid)
+
+        job = self.enqueue('copy')
+        job = jobs.run_job(jobs.claim_job())
+        self.assertEqual(job.status, 2)
+        result = json.loads(job.result)
+        self.assertEqual(result['version'], '0.4')
+        content_release = ContentRelease.objects.get(uuid=result['release_uuid'])
+        self.assertEqual((content_release.status, content_release.version), (0, '0.4'))
+        self.assertEqual(content_release.release_documents.count(), 2)
+
+        # with the version of the arguments
+        job = jobs.run_job(jobs.enqueue('copy', 'site1', self.release_uuid, version='1.0'))
+        self.assertEqual(json.loads(job.result)['version'], '1.0')
+        job = jobs.run_job(jobs.enqueue('copy', 'site1', self.release_uuid, version='0.2'))
+        self.assertEqual(job.status, 3)
+
+    def test_compare(self):
+        """ unittest a compare job, to the live release """
+        response = self.publisher_api.add_content_release('site1', 'title2', '0.2')
+        self.publisher_api.publish_document_to_content_release(
+            'site1', response['content'].uuid, '{}', 'key1')
+        self.publisher_api.set_stage_content_release('site1', response['content'].uuid)
+        self.publisher_api.set_live_content_release('site1', response['content'].uuid)
+
+        job = self.enqueue('compare')
+        job = jobs.run_job(jobs.claim_job())
+        self.assertIsNone(jobs.claim_job())
+        result = json.loads(job.result)
+        self.assertEqual(result['compare_to_release_uuid'], str(response['content'].uuid))
+        self.assertEqual([
+            (release_document['document_key'], release_document['diff'])
+            for release_document in result['comparison']
+        ], [('key2', 'Added'), ('key1', 'Changed')])
+
+    def test_stale_job(self):
+        """ unittest a running job without heartbeat is failed by the next worker """
+        job = self.enqueue('stage')
+        other_job = self.enqueue('live')
+        self.assertEqual(jobs.claim_job().id, job.id)
+        self.assertEqual(jobs.claim_job().id, other_job.id)
+        ReleaseJob.objects.filter(id=job.id).update(
+            heartbeat_datetime=timezone.now() - timedelta(seconds=301))
+
+        self.assertIsNone(jobs.claim_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 3)
+        self.assertEqual(job.error, 'The worker stopped before the end of the job')
+        # the heartbeat of the other job is recent
+        other_job.refresh_from_db()
+        self.assertEqual(other_job.status, 1)
+
+    def test_export(self):
+        """ unittest an export job """
+        job = self.enqueue('export')
+        jobs.run_worker(once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 3)
+        self.assertEqual(job.error, 'SNAPSHOTPUBLISHER_JOB_EXPORT_ROOT is not defined')
+
+        directory = tempfile.mkdtemp()
+        try:
+            with override_settings(SNAPSHOTPUBLISHER_JOB_EXPORT_ROOT=directory):
+                job = jobs.enqueue('export', 'site1', self.release_uuid)
+                jobs.run_worker(once=True)
+            job.refresh_from_db()
+            self.assertEqual(job.status, 2)
+            path = os.path.join(directory, 'site1', '{}.sqlite'.format(self.release_uuid))
+            self.assertEqual(json.loads(job.result)['path'], path)
+            connection = sqlite3.connect(path)
+            self.assertEqual(
+                connection.execute('SELECT COUNT(*) FROM release_document').fetchone()[0], 2)
+            connection.close()
+        finally:
+            shutil.rmtree(directory)
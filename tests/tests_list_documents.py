@@ -0,0 +1,121 @@
+"""
+.. module:: djangosnapshotpublisher.tests
+   :synopsis: djangosnapshotpublisher unittest
+"""
+
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from djangosnapshotpublisher.models import ReleaseDocument
+from djangosnapshotpublisher.publisher_api import PublisherAPI
+from djangosnapshotpublisher.streaming_compare import get_prefix_end
+
+
+class ListDocumentsTestCase(TestCase):
+    """ unittest for list_documents_in_content_release """
+
+    def setUp(self):
+        """ setUp """
+        self.publisher_api = PublisherAPI(api_type='django')
+        response = self.publisher_api.add_content_release('site1', 'title1', '0.1')
+        self.release_uuid = response['content'].uuid
+        for document_key in ['news/b', 'news/a', 'about', 'news/c']:
+            self.publisher_api.publish_document_to_content_release(
+                'site1', self.release_uuid, '{"key": "é"}', document_key)
+        self.publisher_api.publish_document_to_content_release(
+            'site1', self.release_uuid, '{}', 'news/a', 'page')
+        self.publisher_api.delete_document_from_content_release(
+            'site1', self.release_uuid, 'news/d')
+
+        # other release
+        response = self.publisher_api.add_content_release('site1', 'title2', '0.2')
+        self.publisher_api.publish_document_to_content_release(
+            'site1', response['content'].uuid, '{}', 'news/e')
+
+    def list_keys(self, **kwargs):
+        """ (content_type, document_key) of all the pages """
+        keys = []
+        cursor = None
+        while True:
+            response = self.publisher_api.list_documents_in_content_release(
+                'site1', self.release_uuid, cursor=cursor, **kwargs)
+            self.assertEqual(response['status'], 'success')
+            keys.append([
+                (document['content_type'], document['document_key'])
+                for document in response['content']['documents']
+            ])
+            cursor = response['content']['next']
+            if cursor is None:
+                return keys
+
+    def test_list(self):
+        """ unittest the metadata and the pages """
+        response = self.publisher_api.list_documents_in_content_release(
+            'site1', self.release_uuid, limit=1)
+        self.assertEqual(response['content'], {
+            'documents': [{
+                'document_key': 'about',
+                'content_type': 'content',
+                'deleted': False,
+                'document_hash': ReleaseDocument.objects.get(document_key='about').document_hash,
+                'document_size': 13,
+            }],
+            'next': ['content', 'about'],
+        })
+
+        self.assertEqual(self.list_keys(limit=2), [
+            [('content', 'about'), ('content', 'news/a')],
+            [('content', 'news/b'), ('content', 'news/c')],
+            [('content', 'news/d'), ('page', 'news/a')],
+        ])
+        self.assertEqual(self.list_keys(limit=3, content_type='content', key_prefix='news/'), [
+            [('content', 'news/a'), ('content', 'news/b'), ('content', 'news/c')],
+            [('content', 'news/d')],
+        ])
+        self.assertEqual(self.list_keys(content_type='page'), [[('page', 'news/a')]])
+        self.assertEqual(self.list_keys(key_prefix='news/z'), [[]])
+
+        response = self.publisher_api.list_documents_in_content_release(
+            'site1', self.release_uuid, key_prefix='news/d')
+        self.assertEqual(response['content']['documents'][0]['deleted'], True)
+        self.assertIsNone(response['content']['documents'][0]['document_size'])
+
+    def test_prefix(self):
+        """ unittest the key prefix as a range of the keys by code point """
+        self.assertEqual(get_prefix_end('news/'), 'news0')
+        self.assertEqual(get_prefix_end('a\ud7ff'), 'a\ue000')
+        self.assertEqual(get_prefix_end('a\U0010ffff'), 'b')
+        self.assertIsNone(get_prefix_end('\U0010ffff'))
+        for document_key in ['news0', 'news/\U0010ffff', 'new']:
+            self.publisher_api.publish_document_to_content_release(
+                'site1', self.release_uuid, '{}', document_key)
+        self.assertEqual(self.list_keys(content_type='content', key_prefix='news/'), [[
+            ('content', 'news/a'), ('content', 'news/b'), ('content', 'news/c'),
+            ('content', 'news/d'), ('content', 'news/\U0010ffff'),
+        ]])
+
+    def test_backfill(self):
+        """ unittest the document_hash and document_size set by release_backfill_documents """
+        release_document = ReleaseDocument.objects.get(document_key='about')
+        ReleaseDocument.objects.update(document_hash=None, document_size=None)
+        stdout = StringIO()
+        call_command('release_backfill_documents', '--batch-size', '2', stdout=stdout)
+        self.assertEqual(stdout.getvalue().strip(),
+                         'Set the document_hash and document_size of 6 ReleaseDocument')
+        self.assertEqual(ReleaseDocument.objects.get(id=release_document.id).document_size, 13)
+        self.assertEqual(ReleaseDocument.objects.get(id=release_document.id).document_hash,
+                         release_document.document_hash)
+        self.assertEqual(list(ReleaseDocument.objects.filter(document_hash=None).values_list(
+            'document_key', flat=True)), ['news/d'])
+
+    def test_errors(self):
+        """ unittest a release of another site """
+        response = self.publisher_api.list_documents_in_content_release(
+            'site2', self.release_uuid)
+        self.assertEqual(response['error_code'], 'content_release_does_not_exist')
+        for limit in [0, -1, '10']:
+            response = self.publisher_api.list_documents_in_content_release(
+                'site1', self.release_uuid, limit=limit)
+            self.assertEqual(response['error_code'], 'limit_invalid')
@@ -91,6 +91,21 @@ class ContentReleaseTestCase(TestCase):
         except ValidationError as v_e:
             self.assertEqual('version_conflict_live_releases', v_e.code)
 
+        # versions are compared as numbers
+        content_release3 = ContentRelease(
+            version='10.0',
+            title='test3',
+            site_code='site1',
+        )
+        with self.assertNumQueries(2):
+            content_release3.save()
+        self.assertEqual(content_release3.version_key, '{}.{}'.format('10'.zfill(20), '0' * 20))
+        content_release3.version = '1.10'
+        content_release3.save()
+        content_release3.version = '1.2.1'
+        with self.assertRaises(ValidationError):
+            content_release3.save()
+
     def test_base_release(self):
         """ unittest for base_release attribute validation """
         # use_current_live_as_base_release True
@@ -0,0 +1,164 @@
+"""
+.. module:: djangosnapshotpublisher.tests
+   :synopsis: djangosnapshotpublisher unittest
+"""
+
+import os
+from unittest import skipUnless
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+
+from djangosnapshotpublisher import partitioning
+from djangosnapshotpublisher.models import ContentRelease, ReleaseDocument
+from djangosnapshotpublisher.publisher_api import PublisherAPI
+
+
+class PartitioningTestCase(TestCase):
+    """ unittest for the partitioning of ReleaseDocument by site_code """
+
+    def setUp(self):
+        """ setUp """
+        partitioning.partitions.clear()
+        partitioning.backfilled_databases.clear()
+        self.publisher_api = PublisherAPI(api_type='django')
+        self.release_uuids = {}
+        for site_code in ['site1', 'site-2']:
+            response = self.publisher_api.add_content_release(site_code, 'title1', '0.1')
+            self.release_uuids[site_code] = response['content'].uuid
+            self.publisher_api.publish_document_to_content_release(
+                site_code, self.release_uuids[site_code], '{}', 'key1')
+        self.publisher_api.delete_document_from_content_release(
+            'site1', self.release_uuids['site1'], 'key2')
+
+    def tearDown(self):
+        """ tearDown """
+        partitioning.partitions.clear()
+        partitioning.backfilled_databases.clear()
+
+    def test_site_code(self):
+        """ unittest the site_code of the documents """
+        self.assertEqual(list(ReleaseDocument.objects.order_by('id').values_list(
+            'document_key', 'site_code')), [
+                ('key1', 'site1'), ('key1', 'site-2'), ('key2', 'site1')])
+
+        # documents published before the site_code
+        ReleaseDocument.objects.update(site_code='')
+        self.assertEqual(partitioning.backfill_site_code(batch_size=2), 3)
+        self.assertEqual(ReleaseDocument.objects.filter(site_code='site-2').count(), 1)
+
+        with override_settings(SNAPSHOTPUBLISHER_DOCUMENT_PARTITIONS=True):
+            response = self.publisher_api.get_document_from_content_release(
+                'site-2', self.release_uuids['site-2'], 'key1')
+            self.assertEqual(response['status'], 'success')
+            response = self.publisher_api.get_documents_from_content_release(
+                'site1', self.release_uuids['site1'], ['key1', 'key2'])
+            self.assertIn('"site_code" = site1', str(response['content'].query).split('WHERE')[1])
+        response = self.publisher_api.get_documents_from_content_release(
+            'site1', self.release_uuids['site1'], ['key1', 'key2'])
+        self.assertNotIn('site_code', str(response['content'].query).split('WHERE')[1])
+
+    @override_settings(SNAPSHOTPUBLISHER_DOCUMENT_PARTITIONS=True)
+    def test_not_backfilled(self):
+        """ unittest the partitioning can't be enabled before the backfill """
+        ReleaseDocument.objects.filter(site_code='site-2').update(site_code='')
+        with self.assertRaises(ImproperlyConfigured):
+            self.publisher_api.get_document_from_content_release(
+                'site1', self.release_uuids['site1'], 'key1')
+        partitioning.backfill_site_code()
+        for method in ['get_document_from_content_release',
+                       'get_document_extra_from_content_release',
+                       'unpublish_document_from_content_release']:
+            response = getattr(self.publisher_api, method)(
+                'site-2', self.release_uuids['site-2'], 'key1')
+            self.assertEqual(response['status'], 'success')
+        response = self.publisher_api.delete_document_from_content_release(
+            'site1', self.release_uuids['site1'], 'key2')
+        self.assertEqual(response['status'], 'success')
+        self.assertEqual(ReleaseDocument.objects.filter(document_key='key2').count(), 1)
+
+    def test_partition_sql(self):
+        """ unittest the statements partitioning the table """
+        statements = partitioning.get_partition_table_sql(connection, ['site1', 'site-2'])
+        sql = '\n'.join(statement for statement, _ in statements)
+        self.assertIn('PARTITION BY LIST (site_code)', sql)
+        self.assertIn('PRIMARY KEY (id, site_code)', sql)
+        self.assertIn('DEFAULT', sql)
+        self.assertIn((
+            'CREATE TABLE IF NOT EXISTS "{}" '
+            'PARTITION OF "djangosnapshotpublisher_releasedocument" FOR VALUES IN (%s)'.format(
+                partitioning.get_partition_name('site-2')),
+            ['site-2'],
+        ), statements)
+        self.assertEqual(partitioning.get_partition_name('site-2')[:-9],
+                         'djangosnapshotpublisher_releasedocument_site_2')
+        self.assertLessEqual(len(partitioning.get_partition_name('a' * 100)), 63)
+
+    def test_command(self):
+        """ unittest the release_partition command """
+        ReleaseDocument.objects.update(site_code='')
+        with open(os.devnull, 'w') as stdout:
+            call_command('release_partition', '--backfill-only', stdout=stdout)
+            self.assertFalse(ReleaseDocument.objects.filter(site_code='').exists())
+            if connection.vendor != 'postgresql':
+                with self.assertRaises(CommandError):
+                    call_command('release_partition', stdout=stdout)
+
+        # no partition outside of PostgreSQL
+        with override_settings(SNAPSHOTPUBLISHER_DOCUMENT_PARTITIONS=True):
+            response = self.publisher_api.add_content_release('site3', 'title1', '0.1')
+            self.assertEqual(response['status'], 'success')
+            self.assertNotIn('site3', partitioning.partitions)
+
+    @skipUnless(connection.vendor == 'postgresql', 'PostgreSQL partitioning')
+    def test_partition_table(self):
+        """ unittest the partitioning of the table and the partitions of the new sites """
+        self.assertEqual(partitioning.partition_table(['site1']), ['site1'])
+        self.assertTrue(partitioning.is_partitioned(connection))
+        partition_names = partitioning.get_partition_names(connection)
+        self.assertIn(partitioning.get_partition_name('site1'), partition_names)
+        self.assertIn('djangosnapshotpublisher_releasedocument_default', partition_names)
+        self.assertEqual(ReleaseDocument.objects.count(), 3)
+
+        # the documents of site-2 are moved from the default partition
+        self.assertEqual(partitioning.partition_table(['site1', 'site-2']), ['site-2'])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT document_key FROM {}'.format(
+                connection.ops.quote_name(partitioning.get_partition_name('site-2'))))
+            self.assertEqual(cursor.fetchall(), [('key1',)])
+
+        self.assertTrue(partitioning.create_partition('site3'))
+        self.assertFalse(partitioning.create_partition('site3'))
+        self.assertIn(partitioning.get_partition_name('site3'),
+                      partitioning.get_partition_names(connection))
+        with override_settings(SNAPSHOTPUBLISHER_DOCUMENT_PARTITIONS=True):
+            response = self.publisher_api.add_content_release('site3', 'title1', '0.1')
+            release_uuid = response['content'].uuid
+            self.publisher_api.publish_document_to_content_release(
+                'site3', release_uuid, '{}', 'key1')
+            response = self.publisher_api.get_document_from_content_release(
+                'site3', release_uuid, 'key1')
+            self.assertEqual(response['content'].site_code, 'site3')
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT document_key FROM {}'.format(
+                connection.ops.quote_name(partitioning.get_partition_name('site3'))))
+            self.assertEqual(cursor.fetchall(), [('key1',)])
+
+        # the foreign keys are checked by constraint triggers
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            ContentRelease.release_documents.through.objects.create(
+                contentrelease=ContentRelease.objects.get(uuid=release_uuid),
+                releasedocument_id=0,
+            )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+                # without the cascades of django
+                cursor.execute('DELETE FROM {} WHERE document_key = %s'.format(
+                    connection.ops.quote_name(partitioning.get_table())), ['key2'])
+
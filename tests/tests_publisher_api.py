@@ -5,6 +5,7 @@
 
 import json
 import uuid
+from unittest import mock
 
 from django.core.management import call_command
 from django.db.models.query import QuerySet
@@ -110,6 +111,84 @@ class PublisherAPITestCase(TestCase):
         self.assertFalse(ContentReleaseExtraParameter.objects.filter(
             content_release=content_release).exists())
 
+    def test_copy_content_release(self):
+        """ unittest for copy_content_release """
+
+        #  Try to copy a ContentRelease that doesn't exist
+        response = self.publisher_api.copy_content_release('site1', uuid.uuid4())
+        self.assertEqual(response['status'], 'error')
+        self.assertEqual(response['error_code'], 'content_release_does_not_exist')
+
+        #  Copy a live ContentRelease, the copy is a preview release
+        response = self.publisher_api.add_content_release(
+            'site1', 'title1', '0.0.1', {'p1': 'test1', 'p2': 'test2'})
+        content_release = response['content']
+        for i in range(20):
+            self.publisher_api.publish_document_to_content_release(
+                'site1', content_release.uuid, json.dumps({'title': i}), 'key{}'.format(i))
+        self.publisher_api.set_stage_content_release('site1', content_release.uuid)
+        self.publisher_api.set_live_content_release('site1', content_release.uuid)
+
+        # the number of queries doesn't depend on the number of documents
+        with self.assertNumQueries(11):
+            response = self.publisher_api.copy_content_release(
+                'site1', content_release.uuid, 'title2', '0.0.2')
+        self.assertEqual(response['status'], 'success')
+        new_content_release = response['content']
+        self.assertEqual(new_content_release.title, 'title2')
+        self.assertEqual(new_content_release.version, '0.0.2')
+        self.assertEqual(new_content_release.status, 0)
+        self.assertFalse(new_content_release.is_live)
+        self.assertIsNone(new_content_release.publish_datetime)
+        self.assertEqual(
+            list(new_content_release.release_documents.order_by('id')),
+            list(content_release.release_documents.order_by('id')),
+        )
+        self.assertEqual(new_content_release.release_documents.count(), 20)
+        self.assertEqual(
+            dict(new_content_release.parameters.values_list('key', 'content')),
+            {'p1': 'test1', 'p2': 'test2'},
+        )
+
+        #  Copy the live ContentRelease without a version, the next version is used
+        response = self.publisher_api.copy_content_release('site1', content_release.uuid)
+        self.assertEqual(response['status'], 'success')
+        self.assertEqual(response['content'].version, '0.0.2')
+
+        #  Copy the live ContentRelease with a smaller version
+        response = self.publisher_api.copy_content_release(
+            'site1', content_release.uuid, version='0.0.0.5')
+        self.assertEqual(response['status'], 'error')
+        self.assertEqual(response['error_code'], 'content_release_copy_invalid')
+
+        #  Copy a staged ContentRelease based on the current live release
+        response = self.publisher_api.add_content_release(
+            'site1', 'title3', '0.1', None, None, True)
+        staged_content_release = response['content']
+        self.publisher_api.publish_document_to_content_release(
+            'site1', staged_content_release.uuid, json.dumps({'title': 'new'}), 'key_new')
+        self.publisher_api.set_stage_content_release('site1', staged_content_release.uuid)
+        staged_content_release.refresh_from_db()
+        self.assertEqual(staged_content_release.base_release, content_release)
+
+        response = self.publisher_api.copy_content_release(
+            'site1', staged_content_release.uuid, version='3.0')
+        self.assertEqual(response['status'], 'success')
+        new_content_release = response['content']
+        self.assertEqual(new_content_release.version, '3.0')
+        self.assertEqual(new_content_release.status, 0)
+        self.assertFalse(new_content_release.is_stage)
+        self.assertTrue(new_content_release.use_current_live_as_base_release)
+        self.assertIsNone(new_content_release.base_release)
+        self.assertEqual(
+            new_content_release.release_documents.count(),
+            staged_content_release.release_documents.count(),
+        )
+
+        response = self.publisher_api.copy_content_release('site1', staged_content_release.uuid)
+        self.assertEqual(response['status'], 'success')
+        self.assertEqual(response['content'].version, '0.2')
+
     def test_update_content_release(self):
         """ unittest for update_content_release """
 
@@ -580,6 +659,65 @@ class PublisherAPITestCase(TestCase):
         self.assertEqual(response['content'], release_document)
         self.assertEqual(str(release_document), 'page - key1')
 
+    def test_get_document_fields_from_content_release(self):
+        """ unittest for get_document_fields_from_content_release """
+
+        #  No paths / wrong path
+        response = self.publisher_api.get_document_fields_from_content_release(
+            'site1', uuid.uuid4(), 'key1', [])
+        self.assertEqual(response['error_code'], 'parameters_missing')
+        response = self.publisher_api.get_document_fields_from_content_release(
+            'site1', uuid.uuid4(), 'key1', ['seo..title'])
+        self.assertEqual(response['error_code'], 'json_path_invalid')
+
+        #  No ContentRelease
+        response = self.publisher_api.get_document_fields_from_content_release(
+            'site1', uuid.uuid4(), 'key1', 'title')
+        self.assertEqual(response['error_code'], 'content_release_does_not_exist')
+
+        #  No ReleaseDocument
+        response = self.publisher_api.add_content_release('site1', 'title1', '0.0.1')
+        content_release = response['content']
+        response = self.publisher_api.get_document_fields_from_content_release(
+            'site1', content_release.uuid, 'key1', 'title')
+        self.assertEqual(response['error_code'], 'release_document_does_not_exist')
+
+        #  Get fragments, in the database and with the python fallback
+        document_json = json.dumps({
+            'title': 'Test1',
+            'seo': {'title': 'SEO title', 'keywords': ['k1', 'k2']},
+            'items': {'0': 'zero', '1': ['a', 'b']},
+            'body': 'x' * 1000,
+            '0': 'key zero',
+        })
+        self.publisher_api.publish_document_to_content_release(
+            'site1', content_release.uuid, document_json, 'key1')
+        paths = ['title', 'seo', 'seo.keywords.1', 'missing', 'title.missing', 'items.0',
+                 'items.1.1', 'items.2', 'seo.keywords.5', '0']
+        expected_fields = {
+            'title': 'Test1',
+            'seo': {'title': 'SEO title', 'keywords': ['k1', 'k2']},
+            'seo.keywords.1': 'k2',
+            'missing': None,
+            'title.missing': None,
+            # an index matches the key of an object
+            'items.0': 'zero',
+            'items.1.1': 'b',
+            'items.2': None,
+            'seo.keywords.5': None,
+            '0': 'key zero',
+        }
+        response = self.publisher_api.get_document_fields_from_content_release(
+            'site1', content_release.uuid, 'key1', paths)
+        self.assertEqual(response['status'], 'success')
+        self.assertEqual(response['content'], expected_fields)
+        with mock.patch('djangosnapshotpublisher.publisher_api.supports_json_path',
+                        return_value=False):
+            response = self.publisher_api.get_document_fields_from_content_release(
+                'site1', content_release.uuid, 'key1', paths)
+        self.assertEqual(response['status'], 'success')
+        self.assertEqual(response['content'], expected_fields)
+
     def test_publish_document_to_content_release(self):
         """ unittest for publish_document_to_content_release """
 
@@ -1340,6 +1478,55 @@ class PublisherAPIJsonTestCase(TestCase):
         ])
 
 
+class PublisherAPIRawTestCase(TestCase):
+    """ unittest for PublisherAPIRawTest with api_type=raw """
+
+    def setUp(self):
+        """ setUp """
+        self.publisher_api = PublisherAPI(api_type='raw')
+
+    def test_get_document_from_content_release(self):
+        """ unittest for get_document_from_content_release """
+
+        response_raw = self.publisher_api.add_content_release('site1', 'title1', '0.0.1')
+        self.assertIsInstance(response_raw, bytes)
+        response = json.loads(response_raw)
+        self.assertEqual(response['status'], 'success')
+        self.assertEqual(response['content']['title'], 'title1')
+        content_release_uuid = response['content']['uuid']
+
+        #  document_json is spliced as is in the response
+        document_json = '{"page_title": "Test \\"raw\\" \u00e9", "items": [1, 2]}'
+        self.publisher_api.publish_document_to_content_release(
+            'site1', content_release_uuid, document_json, 'key1')
+        response_raw = self.publisher_api.get_document_from_content_release(
+            'site1', content_release_uuid, 'key1')
+        self.assertIsInstance(response_raw, bytes)
+        self.assertIn(document_json.encode('utf-8'), response_raw)
+        response = json.loads(response_raw)
+        self.assertEqual(response['status'], 'success')
+        self.assertEqual(response['content'], {
+            'document_key': 'key1',
+            'document_json': json.loads(document_json),
+            'content_type': 'content',
+            'deleted': False,
+        })
+
+        #  deleted document
+        self.publisher_api.delete_document_from_content_release(
+            'site1', content_release_uuid, 'key2')
+        response = json.loads(self.publisher_api.get_document_from_content_release(
+            'site1', content_release_uuid, 'key2'))
+        self.assertEqual(response['content']['document_json'], None)
+        self.assertEqual(response['content']['deleted'], True)
+
+        #  error
+        response = json.loads(self.publisher_api.get_document_from_content_release(
+            'site1', content_release_uuid, 'key3'))
+        self.assertEqual(response['status'], 'error')
+        self.assertEqual(response['error_code'], 'release_document_does_not_exist')
+
+
 class PublisherScriptTestCase(TestCase):
     """ unittest for PublisherScriptTest with api_type=django """
 
@@ -0,0 +1,111 @@
+"""
+.. module:: djangosnapshotpublisher.tests
+   :synopsis: djangosnapshotpublisher unittest
+"""
+
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils import timezone
+
+from djangosnapshotpublisher.models import (ContentRelease, ReleaseDocument,
+                                            ReleaseDocumentExtraParameter)
+from djangosnapshotpublisher.publisher_api import PublisherAPI
+
+
+class RetentionTestCase(TestCase):
+    """ unittest for release_retention command """
+
+    def setUp(self):
+        """ setUp """
+        self.publisher_api = PublisherAPI(api_type='django')
+
+        # 4 releases per site, the last one is live and the other are archived
+        self.content_releases = {}
+        for site_code in ['site1', 'site2']:
+            self.content_releases[site_code] = []
+            for i in range(1, 5):
+                response = self.publisher_api.add_content_release(
+                    site_code, 'title{}'.format(i), '0.{}'.format(i))
+                content_release = response['content']
+                self.publisher_api.publish_document_to_content_release(
+                    site_code,
+                    content_release.uuid,
+                    json.dumps({'title': 'Test{}'.format(i)}),
+                    'key1',
+                    parameters={'p1': 'test{}'.format(i)},
+                )
+                self.publisher_api.set_stage_content_release(site_code, content_release.uuid)
+                self.publisher_api.set_live_content_release(site_code, content_release.uuid)
+                ContentRelease.objects.filter(id=content_release.id).update(
+                    publish_datetime=timezone.now() - timezone.timedelta(days=10 - i))
+                self.content_releases[site_code].append(content_release)
+
+        # orphan document
+        ReleaseDocument(document_key='orphan', document_json=json.dumps({'title': 'x'})).save()
+
+    def call_command(self, *args):
+        """ call_command """
+        out = StringIO()
+        call_command('release_retention', *args, '--sleep=0', stdout=out)
+        return out.getvalue()
+
+    def test_retention_keep(self):
+        """ unittest for release_retention --keep """
+
+        with self.assertRaises(CommandError):
+            self.call_command()
+
+        # dry run
+        self.assertEqual(
+            self.call_command('--keep=1', '--dry-run'),
+            'Dry run: 4 ContentRelease, 5 ReleaseDocument, 106 bytes reclaimable\n',
+        )
+        self.assertEqual(ContentRelease.objects.count(), 8)
+        self.assertEqual(ReleaseDocument.objects.count(), 9)
+
+        # keep the last archived release for each site
+        self.assertEqual(
+            self.call_command('--keep=1', '--batch-size=1'),
+            'Removed 4 ContentRelease, 5 ReleaseDocument, 106 bytes reclaimable\n',
+        )
+        for site_code in ['site1', 'site2']:
+            self.assertEqual(
+                list(ContentRelease.objects.filter(site_code=site_code).order_by(
+                    'title').values_list('title', flat=True)),
+                ['title3', 'title4'],
+            )
+        self.assertEqual(
+            sorted(ReleaseDocument.objects.values_list('document_json', flat=True)),
+            [json.dumps({'title': 'Test3'})] * 2 + [json.dumps({'title': 'Test4'})] * 2,
+        )
+        self.assertIsNone(ContentRelease.objects.get(
+            id=self.content_releases['site1'][2].id).base_release)
+        self.assertEqual(ReleaseDocumentExtraParameter.objects.count(), 4)
+
+    def test_retention_days(self):
+        """ unittest for release_retention --days --site-code """
+
+        # keep the archived releases newer than 7 days or in the last 2
+        self.assertEqual(
+            self.call_command('--keep=2', '--days=7', '--site-code=site1'),
+            'Removed 1 ContentRelease, 1 ReleaseDocument, 23 bytes reclaimable\n',
+        )
+        self.assertEqual(ContentRelease.objects.filter(site_code='site1').count(), 3)
+        # the orphan document is not in a release of site1
+        self.assertTrue(ReleaseDocument.objects.filter(document_key='orphan').exists())
+        self.assertEqual(ContentRelease.objects.filter(site_code='site2').count(), 4)
+
+        # base releases of preview releases are not removed
+        content_release = self.content_releases['site2'][0]
+        self.publisher_api.add_content_release(
+            'site2', 'title5', '0.5', None, content_release.uuid)
+        self.call_command('--days=7')
+        self.assertEqual(
+            list(ContentRelease.objects.filter(site_code='site2').order_by(
+                'title').values_list('title', flat=True)),
+            ['title1', 'title4', 'title5'],
+        )
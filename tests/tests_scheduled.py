@@ -0,0 +1,96 @@
+"""
+.. module:: djangosnapshotpublisher.tests
+   :synopsis: djangosnapshotpublisher unittest
+"""
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from djangosnapshotpublisher.models import ContentRelease
+from djangosnapshotpublisher.publisher_api import PublisherAPI
+
+
+class ScheduledContentReleaseTestCase(TestCase):
+    """ unittest for list_scheduled_content_releases """
+
+    def setUp(self):
+        """ setUp """
+        self.publisher_api = PublisherAPI(api_type='django')
+        self.release_uuids = {}
+        for site_code, minutes in [('site1', 30), ('site2', 10), ('site3', -1)]:
+            response = self.publisher_api.add_content_release(site_code, 'title1', '0.1')
+            release_uuid = response['content'].uuid
+            self.publisher_api.set_stage_content_release(site_code, release_uuid)
+            ContentRelease.objects.filter(uuid=release_uuid).update(
+                publish_datetime=timezone.now() + timezone.timedelta(minutes=minutes))
+            self.release_uuids[site_code] = release_uuid
+        # a staged release without publish_datetime
+        response = self.publisher_api.add_content_release('site4', 'title1', '0.1')
+        self.publisher_api.set_stage_content_release('site4', response['content'].uuid)
+
+    def test_scheduled(self):
+        """ unittest the next releases to go live """
+        with self.assertNumQueries(1):
+            response = self.publisher_api.list_scheduled_content_releases()
+            self.assertEqual([
+                content_release.site_code for content_release in response['content']
+            ], ['site3', 'site2', 'site1'])
+        response = self.publisher_api.list_scheduled_content_releases(limit=1)
+        self.assertEqual(len(response['content']), 1)
+        response = self.publisher_api.list_scheduled_content_releases('site2')
+        self.assertEqual([content_release.uuid for content_release in response['content']],
+                         [self.release_uuids['site2']])
+
+        response = PublisherAPI(api_type='json').list_scheduled_content_releases('site1')
+        self.assertIn(str(self.release_uuids['site1']), response)
+
+    def test_index(self):
+        """ unittest the partial indexes are used """
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite query plan')
+        for site_code, index in [(None, 'content_release_scheduled'),
+                                 ('site1', 'content_release_site_scheduled')]:
+            query = ContentRelease.objects.scheduled(site_code)[:10].query
+            sql, params = query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN {}'.format(sql), params)
+                plan = ' '.join(str(row) for row in cursor.fetchall())
+            self.assertIn(index, plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_release_publisher(self):
+        """ unittest release_publisher only sets live the due releases """
+        call_command('release_publisher')
+        self.assertEqual(list(ContentRelease.objects.filter(status=2).values_list(
+            'site_code', flat=True)), ['site3'])
+
+    def test_set_live_scheduled(self):
+        """ unittest a release scheduled by set_live_content_release goes live when its
+        publish_datetime is passed """
+        live_release_uuid = self.release_uuids['site3']
+        call_command('release_publisher')
+        response = self.publisher_api.add_content_release('site3', 'title2', '0.2')
+        release_uuid = response['content'].uuid
+        self.publisher_api.set_stage_content_release('site3', release_uuid)
+        response = self.publisher_api.set_live_content_release(
+            'site3', release_uuid, timezone.now() + timezone.timedelta(minutes=10))
+        self.assertEqual(response['status'], 'success')
+
+        # the live release stays live until then
+        response = self.publisher_api.list_scheduled_content_releases('site3')
+        self.assertEqual([content_release.uuid for content_release in response['content']],
+                         [release_uuid])
+        call_command('release_publisher')
+        self.assertEqual(self.publisher_api.get_live_content_release('site3')['content'].uuid,
+                         live_release_uuid)
+
+        ContentRelease.objects.filter(uuid=release_uuid).update(
+            publish_datetime=timezone.now() - timezone.timedelta(minutes=1))
+        call_command('release_publisher')
+        self.assertEqual(ContentRelease.objects.get(uuid=live_release_uuid).status, 3)
+        self.assertEqual(self.publisher_api.get_live_content_release('site3')['content'].uuid,
+                         release_uuid)
+        response = self.publisher_api.list_scheduled_content_releases('site3')
+        self.assertFalse(response['content'].exists())
@@ -0,0 +1,79 @@
+"""
+.. module:: djangosnapshotpublisher.tests
+   :synopsis: djangosnapshotpublisher unittest
+"""
+
+import json
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+
+from djangosnapshotpublisher.models import ContentRelease
+from djangosnapshotpublisher.publisher_api import PublisherAPI
+from djangosnapshotpublisher.slow_log import explain
+
+
+class SlowLogTestCase(TestCase):
+    """ unittest for the slow operation log """
+
+    def setUp(self):
+        """ setUp """
+        self.publisher_api = PublisherAPI(api_type='django')
+        response = self.publisher_api.add_content_release('site1', 'title1', '0.1')
+        self.release_uuid = response['content'].uuid
+
+    def get_records(self, logs):
+        """ get_records """
+        return [json.loads(line.split(':', 2)[2]) for line in logs.output]
+
+    @override_settings(SNAPSHOTPUBLISHER_SLOW_LOG_THRESHOLD=0,
+                       SNAPSHOTPUBLISHER_SLOW_LOG_EXPLAIN=True)
+    def test_slow_log(self):
+        """ unittest the record of a slow call """
+        with self.assertLogs('djangosnapshotpublisher.slow_log', 'WARNING') as logs:
+            self.publisher_api.add_content_release('site1', 'title2', '0.2', {'p1': 'v1'})
+            self.publisher_api.get_document_from_content_release(
+                'site1', self.release_uuid, 'key1')
+
+        # the nested call to update_content_release_parameters is in the first record
+        records = self.get_records(logs)
+        self.assertEqual([record['operation'] for record in records], [
+            'PublisherAPI.add_content_release',
+            'PublisherAPI.get_document_from_content_release',
+        ])
+        record = records[1]
+        self.assertEqual(record['site_code'], 'site1')
+        self.assertEqual(record['query_count'], 2)
+        self.assertEqual(len(record['queries']), 2)
+        self.assertIn('djangosnapshotpublisher_releasedocument', record['queries'][1]['sql'])
+        self.assertTrue(record['queries'][1]['explain'])
+        self.assertIn('contentreleaseextraparameter', json.dumps(records[0]['queries']))
+
+    def test_explain_error(self):
+        """ unittest a failed EXPLAIN doesn't break the transaction """
+        self.assertIsNone(explain({'sql': 'SELECT * FROM missing_table', 'params': ()}))
+        self.assertEqual(ContentRelease.objects.count(), 1)
+
+    @override_settings(SNAPSHOTPUBLISHER_SLOW_LOG_THRESHOLD=60)
+    def test_fast_call(self):
+        """ unittest a call faster than the threshold isn't recorded """
+        with self.assertRaises(AssertionError):
+            with self.assertLogs('djangosnapshotpublisher.slow_log', 'WARNING'):
+                self.publisher_api.get_content_release_details('site1', self.release_uuid)
+
+    def test_file(self):
+        """ unittest the records written to SNAPSHOTPUBLISHER_SLOW_LOG_FILE """
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'slow.log')
+        try:
+            with override_settings(SNAPSHOTPUBLISHER_SLOW_LOG_THRESHOLD=0,
+                                   SNAPSHOTPUBLISHER_SLOW_LOG_FILE=path):
+                self.publisher_api.get_content_release_details('site1', self.release_uuid)
+            with open(path) as log_file:
+                record = json.loads(log_file.readline())
+            self.assertEqual(record['operation'], 'PublisherAPI.get_content_release_details')
+            self.assertNotIn('explain', record['queries'][0])
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,133 @@
+"""
+.. module:: djangosnapshotpublisher.tests
+   :synopsis: djangosnapshotpublisher unittest
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import uuid
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from djangosnapshotpublisher.publisher_api import PublisherAPI
+from djangosnapshotpublisher.sqlite_bundle import SQLiteBundlePublisherAPI
+
+
+class SQLiteBundleTestCase(TestCase):
+    """ unittest for release_export_sqlite and SQLiteBundlePublisherAPI """
+
+    def setUp(self):
+        """ setUp """
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'site1.sqlite3')
+        self.publisher_api = PublisherAPI(api_type='django')
+        response = self.publisher_api.add_content_release(
+            'site1', 'title1', '0.1', {'p1': 'test1'})
+        self.content_release = response['content']
+        for i in range(1, 4):
+            self.publisher_api.publish_document_to_content_release(
+                'site1',
+                self.content_release.uuid,
+                json.dumps({'title': 'Test{}'.format(i)}),
+                'key{}'.format(i),
+                parameters={'p1': 'test{}'.format(i)},
+            )
+        self.publisher_api.set_stage_content_release('site1', self.content_release.uuid)
+        self.publisher_api.set_live_content_release('site1', self.content_release.uuid)
+
+    def tearDown(self):
+        """ tearDown """
+        shutil.rmtree(self.tmp_dir)
+
+    def call_command(self, *args):
+        """ call_command """
+        out = StringIO()
+        call_command('release_export_sqlite', 'site1', self.path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_export(self):
+        """ unittest for release_export_sqlite """
+
+        with self.assertRaises(CommandError):
+            self.call_command('--release-uuid={}'.format(uuid.uuid4()))
+
+        self.assertEqual(
+            self.call_command(), 'Exported 3 ReleaseDocument (3 changed, 0 removed)\n')
+
+        # only the changed documents are written
+        self.publisher_api.publish_document_to_content_release(
+            'site1', self.content_release.uuid, json.dumps({'title': 'Test4'}), 'key1')
+        self.publisher_api.unpublish_document_from_content_release(
+            'site1', self.content_release.uuid, 'key2')
+        self.assertEqual(
+            self.call_command(), 'Exported 2 ReleaseDocument (1 changed, 1 removed)\n')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(
+                self.call_command('--release-uuid={}'.format(self.content_release.uuid)),
+                'Exported 2 ReleaseDocument (0 changed, 0 removed)\n',
+            )
+        # the unchanged documents are not loaded
+        self.assertFalse([query for query in queries if 'document_json' in query['sql']])
+
+        publisher_api = SQLiteBundlePublisherAPI(self.path)
+        release_uuid = self.content_release.uuid
+        response = publisher_api.get_document_from_content_release('site1', release_uuid, 'key1')
+        self.assertEqual(response['content'], {
+            'document_key': 'key1',
+            'content_type': 'content',
+            'document_json': json.dumps({'title': 'Test4'}),
+            'deleted': False,
+        })
+        response = publisher_api.get_document_from_content_release('site1', release_uuid, 'key2')
+        self.assertEqual(response['error_code'], 'release_document_does_not_exist')
+        response = publisher_api.get_document_extra_from_content_release(
+            'site1', release_uuid, 'key3')
+        self.assertEqual(response['content'], [{'key': 'p1', 'content': 'test3'}])
+        response = publisher_api.get_extra_paramater('site1', release_uuid, 'p1')
+        self.assertEqual(response['content'], 'test1')
+        response = publisher_api.get_content_release_details('site1', release_uuid)
+        self.assertEqual(response['content']['status'], 'LIVE')
+        response = publisher_api.get_document_from_content_release('site2', release_uuid, 'key1')
+        self.assertEqual(response['error_code'], 'content_release_does_not_exist')
+        publisher_api.close()
+
+        # same responses as PublisherAPI
+        for api_type in ['json', 'raw']:
+            publisher_api = SQLiteBundlePublisherAPI(self.path, api_type)
+            self.assertEqual(
+                publisher_api.get_documents_from_content_release(
+                    'site1', release_uuid, ['key1', 'key2', 'key3']),
+                PublisherAPI(api_type).get_documents_from_content_release(
+                    'site1', release_uuid, ['key1', 'key2', 'key3']),
+            )
+            self.assertEqual(
+                publisher_api.get_extra_paramaters('site1', release_uuid),
+                PublisherAPI(api_type).get_extra_paramaters('site1', release_uuid),
+            )
+            publisher_api.close()
+
+    def test_reader_without_django(self):
+        """ unittest for SQLiteBundlePublisherAPI without django settings """
+        self.call_command()
+        env = dict(os.environ)
+        env.pop('DJANGO_SETTINGS_MODULE', None)
+        output = subprocess.check_output([
+            sys.executable, '-c',
+            'import sys, djangosnapshotpublisher.sqlite_bundle as b; '
+            'print(b.SQLiteBundlePublisherAPI(sys.argv[1], "json")'
+            '.get_document_from_content_release("site1", sys.argv[2], "key1")); '
+            'print("djangosnapshotpublisher.models" in sys.modules)',
+            self.path, str(self.content_release.uuid),
+        ], env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        response, models_imported = output.decode('utf-8').splitlines()
+        self.assertEqual(json.loads(response)['content']['document_key'], 'key1')
+        self.assertEqual(models_imported, 'False')
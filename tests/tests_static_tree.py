@@ -0,0 +1,126 @@
+"""
+.. module:: djangosnapshotpublisher.tests
+   :synopsis: djangosnapshotpublisher unittest
+"""
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from djangosnapshotpublisher import jobs
+from djangosnapshotpublisher.models import ContentRelease
+from djangosnapshotpublisher.publisher_api import PublisherAPI
+
+
+class StaticTreeTestCase(TransactionTestCase):
+    """ unittest for the static tree of the live release, built by a job once the go-live is
+    committed """
+
+    def setUp(self):
+        """ setUp """
+        self.root = tempfile.mkdtemp()
+        self.publisher_api = PublisherAPI(api_type='django')
+
+    def tearDown(self):
+        """ tearDown """
+        shutil.rmtree(self.root)
+
+    def add_content_release(self, version, documents):
+        """ add a staged release with documents """
+        response = self.publisher_api.add_content_release(
+            'site1', 'title{}'.format(version), version)
+        content_release = response['content']
+        for document_key, document in documents.items():
+            self.publisher_api.publish_document_to_content_release(
+                'site1', content_release.uuid, json.dumps(document), document_key, 'page')
+        self.publisher_api.set_stage_content_release('site1', content_release.uuid)
+        return content_release
+
+    def read(self, path):
+        """ read a file of the live tree """
+        with open(os.path.join(self.root, 'site1', 'current', path), 'rb') as tree_file:
+            return tree_file.read()
+
+    def test_build_on_live(self):
+        """ unittest for the static tree built when a release goes live """
+        with override_settings(SNAPSHOTPUBLISHER_STATIC_TREE_ROOT=self.root,
+                               SNAPSHOTPUBLISHER_STATIC_TREE_GZIP=True):
+            content_release = self.add_content_release('0.1', {
+                'key1': {'title': 'Test1'},
+                'dir/key2': {'title': 'Test2'},
+                '../key3': {'title': 'Test3'},
+            })
+            self.publisher_api.set_live_content_release('site1', content_release.uuid)
+            # built by the release_jobs worker, not by the request
+            self.assertFalse(os.path.exists(os.path.join(self.root, 'site1')))
+            self.assertEqual(jobs.run_worker(once=True), 1)
+            self.assertEqual(json.loads(self.read('page/key1.json')), {'title': 'Test1'})
+            self.assertEqual(
+                json.loads(gzip.decompress(self.read('page/dir/key2.json.gz'))),
+                {'title': 'Test2'},
+            )
+            self.assertFalse(os.path.exists(os.path.join(self.root, 'site1', 'key3.json')))
+            unchanged_inode = os.stat(
+                os.path.join(self.root, 'site1', 'current', 'page/dir/key2.json')).st_ino
+
+            # the scheduled release goes live with release_publisher
+            content_release = self.add_content_release('0.2', {'key1': {'title': 'Test4'}})
+            ContentRelease.objects.filter(id=content_release.id).update(
+                publish_datetime=timezone.now() - timezone.timedelta(minutes=1))
+            call_command('release_publisher')
+            job = jobs.run_job(jobs.claim_job())
+
+        self.assertEqual(ContentRelease.objects.get(id=content_release.id).status, 2)
+        self.assertEqual(job.status, 2)
+        self.assertEqual(json.loads(job.result)['written'], 1)
+        self.assertEqual(json.loads(self.read('page/key1.json')), {'title': 'Test4'})
+        self.assertEqual(
+            os.stat(os.path.join(self.root, 'site1', 'current', 'page/dir/key2.json')).st_ino,
+            unchanged_inode,
+        )
+        self.assertEqual(len(os.listdir(os.path.join(self.root, 'site1', 'releases'))), 2)
+
+        # not built if the setting is not defined
+        content_release = self.add_content_release('0.3', {'key1': {'title': 'Test5'}})
+        self.publisher_api.set_live_content_release('site1', content_release.uuid)
+        self.assertIsNone(jobs.claim_job())
+        self.assertEqual(json.loads(self.read('page/key1.json')), {'title': 'Test4'})
+
+    def test_rolled_back_live(self):
+        """ unittest the tree doesn't change when the go-live is rolled back """
+        with override_settings(SNAPSHOTPUBLISHER_STATIC_TREE_ROOT=self.root):
+            content_release = self.add_content_release('0.1', {'key1': {'title': 'Test1'}})
+            self.publisher_api.set_live_content_release('site1', content_release.uuid)
+            jobs.run_worker(once=True)
+            content_release = self.add_content_release('0.2', {'key1': {'title': 'Test2'}})
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    self.publisher_api.set_live_content_release('site1', content_release.uuid)
+                    raise RuntimeError
+            # no job for the rolled back go-live
+            self.assertEqual(jobs.run_worker(once=True), 0)
+        self.assertEqual(json.loads(self.read('page/key1.json')), {'title': 'Test1'})
+        self.assertEqual(len(os.listdir(os.path.join(self.root, 'site1', 'releases'))), 1)
+
+    def test_command(self):
+        """ unittest for release_build_static_tree """
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('release_build_static_tree', 'site1', self.root, stdout=out)
+        for version, title in [('0.1', 'Test1'), ('0.2', 'Test2'), ('0.3', 'Test3')]:
+            content_release = self.add_content_release(version, {'key1': {'title': title}})
+            self.publisher_api.set_live_content_release('site1', content_release.uuid)
+            call_command(
+                'release_build_static_tree', 'site1', os.path.join(self.root, 'site1'),
+                '--workers=2', stdout=out)
+        self.assertEqual(json.loads(self.read('page/key1.json')), {'title': 'Test3'})
+        self.assertEqual(len(os.listdir(os.path.join(self.root, 'site1', 'releases'))), 2)
@@ -0,0 +1,122 @@
+"""
+.. module:: djangosnapshotpublisher.tests
+   :synopsis: djangosnapshotpublisher unittest
+"""
+
+from itertools import permutations
+
+from django.test import TestCase
+
+from djangosnapshotpublisher.models import ReleaseDocument
+from djangosnapshotpublisher.publisher_api import PublisherAPI
+
+
+class StreamingCompareTestCase(TestCase):
+    """ unittest for compare_content_releases_page """
+
+    def setUp(self):
+        """ setUp """
+        self.publisher_api = PublisherAPI(api_type='django')
+        response = self.publisher_api.add_content_release('site1', 'title1', '0.1')
+        self.release_uuid1 = response['content'].uuid
+        response = self.publisher_api.add_content_release('site1', 'title2', '0.2')
+        self.release_uuid2 = response['content'].uuid
+        for release_uuid, document_key, document_json in [
+                (self.release_uuid1, 'key1', '{}'), (self.release_uuid1, 'key2', '{}'),
+                (self.release_uuid1, 'Key5', '{}'), (self.release_uuid1, 'key6', '{}'),
+                (self.release_uuid2, 'key2', '{"a": 1}'), (self.release_uuid2, 'key3', '{}'),
+                (self.release_uuid2, 'Key5', '{}'), (self.release_uuid2, 'key6', '{}')]:
+            self.publisher_api.publish_document_to_content_release(
+                'site1', release_uuid, document_json, document_key)
+        self.publisher_api.delete_document_from_content_release(
+            'site1', self.release_uuid2, 'key6')
+
+    def compare(self, my_release_uuid, compare_to_release_uuid, limit=100):
+        """ all the pages of compare_content_releases_page """
+        comparison = []
+        after = None
+        while True:
+            response = self.publisher_api.compare_content_releases_page(
+                'site1', my_release_uuid, compare_to_release_uuid, after, limit)
+            self.assertEqual(response['status'], 'success')
+            self.assertLessEqual(len(response['content']['comparison']), limit)
+            comparison += [
+                (release_document['document_key'], release_document['diff'])
+                for release_document in response['content']['comparison']
+            ]
+            after = response['content']['next']
+            if after is None:
+                return comparison
+
+    def test_compare_page(self):
+        """ unittest compare_content_releases_page """
+        # the documents are compared by hash, Key5 is the same in both releases
+        comparison = [('key2', 'Changed'), ('key3', 'Added'), ('key1', 'Removed'),
+                      ('key6', 'Removed')]
+        self.assertEqual(sorted(self.compare(self.release_uuid2, self.release_uuid1)),
+                         sorted(comparison))
+        # sorted by code point, 'Key5' before 'key1'
+        self.assertEqual(self.compare(self.release_uuid2, self.release_uuid1, limit=1),
+                         [('key1', 'Removed'), ('key2', 'Changed'), ('key3', 'Added'),
+                          ('key6', 'Removed')])
+        # key6 is deleted in one of the releases
+        self.assertEqual(self.compare(self.release_uuid1, self.release_uuid2), [
+            ('key1', 'Added'), ('key2', 'Changed'), ('key3', 'Removed'), ('key6', 'Removed')])
+
+        # the documents published before the hashes are compared by row
+        ReleaseDocument.objects.update(document_hash=None)
+        self.assertIn(('Key5', 'Changed'), self.compare(self.release_uuid2, self.release_uuid1))
+
+        response = self.publisher_api.compare_content_releases_page(
+            'site1', self.release_uuid1, 'e2bd1a9f-8d5d-4b6f-a1a1-7b7bd1b0ef7c')
+        self.assertEqual(response['error_code'], 'content_release_does_not_exist')
+        for limit in [0, -1, '10']:
+            response = self.publisher_api.compare_content_releases_page(
+                'site1', self.release_uuid1, self.release_uuid2, limit=limit)
+            self.assertEqual(response['error_code'], 'limit_invalid')
+
+    def test_base_release(self):
+        """ unittest the documents of the base release """
+        self.publisher_api.set_stage_content_release('site1', self.release_uuid1)
+        self.publisher_api.set_live_content_release('site1', self.release_uuid1)
+        response = self.publisher_api.add_content_release(
+            'site1', 'title3', '0.3', use_current_live_as_base_release=True)
+        release_uuid3 = response['content'].uuid
+        self.publisher_api.publish_document_to_content_release(
+            'site1', release_uuid3, '{"a": 2}', 'key1')
+        self.publisher_api.publish_document_to_content_release(
+            'site1', release_uuid3, '{}', 'key7')
+
+        self.assertEqual(self.compare(release_uuid3, self.release_uuid1), [
+            ('key1', 'Changed'), ('key7', 'Added')])
+
+    def test_same_as_compare_content_releases(self):
+        """ unittest compare_content_releases_page gives the same diffs as compare_content_releases
+        when the unchanged documents are the same rows """
+        self.publisher_api.set_stage_content_release('site1', self.release_uuid1)
+        self.publisher_api.set_live_content_release('site1', self.release_uuid1)
+        response = self.publisher_api.copy_content_release('site1', self.release_uuid1)
+        release_uuid3 = response['content'].uuid
+        self.publisher_api.publish_document_to_content_release(
+            'site1', release_uuid3, '{"a": 3}', 'key2')
+        self.publisher_api.publish_document_to_content_release(
+            'site1', release_uuid3, '{}', 'key7')
+        self.publisher_api.delete_document_from_content_release('site1', release_uuid3, 'key1')
+        self.publisher_api.unpublish_document_from_content_release('site1', release_uuid3, 'Key5')
+        response = self.publisher_api.add_content_release(
+            'site1', 'title4', '0.4', use_current_live_as_base_release=True)
+        release_uuid4 = response['content'].uuid
+        self.publisher_api.publish_document_to_content_release(
+            'site1', release_uuid4, '{"a": 4}', 'key1')
+        self.publisher_api.delete_document_from_content_release('site1', release_uuid4, 'key6')
+
+        release_uuids = [self.release_uuid1, release_uuid3, release_uuid4]
+        for my_release_uuid, compare_to_release_uuid in permutations(release_uuids, 2):
+            with self.subTest(my_release_uuid=my_release_uuid,
+                              compare_to_release_uuid=compare_to_release_uuid):
+                response = self.publisher_api.compare_content_releases(
+                    'site1', my_release_uuid, compare_to_release_uuid, use_cache=False)
+                self.assertEqual(sorted(self.compare(my_release_uuid, compare_to_release_uuid)),
+                                 sorted((release_document['document_key'],
+                                         release_document['diff'])
+                                        for release_document in response['content']))
@@ -0,0 +1,75 @@
+"""
+.. module:: djangosnapshotpublisher.tests
+   :synopsis: djangosnapshotpublisher unittest
+"""
+
+from django.test import TestCase, override_settings
+
+from djangosnapshotpublisher.publisher_api import PublisherAPI
+from djangosnapshotpublisher.tracing import NoOpTracer, get_tracer, span
+
+
+@override_settings(SNAPSHOTPUBLISHER_TRACER='djangosnapshotpublisher.tracing.InMemoryTracer')
+class TracingTestCase(TestCase):
+    """ unittest for the tracing spans """
+
+    def setUp(self):
+        """ setUp """
+        self.publisher_api = PublisherAPI(api_type='json')
+        self.tracer = get_tracer()
+        self.tracer.clear()
+
+    def get_spans(self):
+        """ (name, parent) of the finished spans """
+        return [(finished_span.name, finished_span.parent) for finished_span in self.tracer.spans]
+
+    def test_spans(self):
+        """ unittest the spans of an api call """
+        response = PublisherAPI().add_content_release('site1', 'title1', '0.1')
+        release_uuid = response['content'].uuid
+        self.tracer.clear()
+
+        self.publisher_api.get_content_release_details('site1', release_uuid)
+        self.assertEqual(self.get_spans(), [
+            ('release_lookup', 'PublisherAPI.get_content_release_details'),
+            ('serialization', 'PublisherAPI.get_content_release_details'),
+            ('PublisherAPI.get_content_release_details', None),
+        ])
+        self.assertEqual(self.tracer.spans[-1].attributes, {'site_code': 'site1'})
+        self.assertGreaterEqual(self.tracer.spans[-1].duration, 0)
+
+    def test_stage(self):
+        """ unittest the spans of set_stage_content_release and get_document """
+        publisher_api = PublisherAPI(api_type='django')
+        response = publisher_api.add_content_release('site1', 'title2', '0.2')
+        release_uuid = response['content'].uuid
+        publisher_api.publish_document_to_content_release('site1', release_uuid, '{}', 'key1')
+        self.tracer.clear()
+
+        publisher_api.set_stage_content_release('site1', release_uuid)
+        spans = self.get_spans()
+        self.assertIn((
+            'ContentRelease.copy_document_release_ref_from_baserelease',
+            'PublisherAPI.set_stage_content_release',
+        ), spans)
+        self.assertIn(('ContentReleaseManager.live', 'PublisherAPI.set_stage_content_release'),
+                      spans)
+        self.assertEqual(spans[-1], ('PublisherAPI.set_stage_content_release', None))
+
+        self.tracer.clear()
+        self.publisher_api.get_document_from_content_release('site1', release_uuid, 'key1')
+        self.assertIn(('document_resolution', 'serialization'), self.get_spans())
+
+    def test_error(self):
+        """ unittest a span ended by an exception """
+        with self.assertRaises(ValueError):
+            with span('phase'):
+                raise ValueError
+        self.assertEqual(self.tracer.spans[-1].attributes, {'error': 'ValueError'})
+
+    @override_settings(SNAPSHOTPUBLISHER_TRACER=None)
+    def test_disabled(self):
+        """ unittest tracing disabled """
+        self.assertIsInstance(get_tracer(), NoOpTracer)
+        self.publisher_api.list_content_releases('site1')
+        self.assertEqual(self.tracer.spans, [])